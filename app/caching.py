@@ -0,0 +1,349 @@
+"""HTTP conditional caching of the read endpoints, keyed on dataset_version.
+
+The data only changes when an ingest refreshes the summaries, which bumps
+dataset_version (scripts/summaries.py). The API routers depend on
+conditional_get, which reads the version row before the endpoint runs and:
+
+- answers 304 Not Modified, without running the endpoint's queries, when
+  the request's If-None-Match holds the current ETag or, without
+  If-None-Match, its If-Modified-Since is not older than the last bump;
+- otherwise lets the endpoint run, and CacheHeadersMiddleware adds ETag,
+  Last-Modified and Cache-Control to its response.
+
+The ETag is W/"<version>". It is weak because a representation may still
+vary within a version (planner count estimates), although its data does not.
+
+ResponseCache keeps the serialized bodies of the endpoints decorated with
+response_cache.cached, so clients without a cached copy of their own are
+answered without querying either. Entries are keyed by route and the
+endpoint's parsed query parameters, dropped as soon as a request sees a newer
+dataset_version, and otherwise live for at most `ttl` seconds; the least
+recently used is evicted beyond `maxsize` entries. Concurrent misses of
+the same entry are coalesced: one request runs the endpoint, the others
+await its result, and `coalesced` counts them. Reads of the version row
+are coalesced the same way, so a burst of requests holds few connections.
+"""
+
+import asyncio
+import functools
+import inspect
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import TypeVar
+
+from fastapi import Depends, HTTPException, Request, params
+from fastapi.responses import Response
+from pydantic_core import to_json
+from sqlalchemy import Result, select
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import Settings, get_settings
+from app.db import get_db_session, get_db_session_factory
+from app.models.schemas import DatasetVersionModel
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls of run() with the same key share one computation.
+
+    The first caller starts compute() as a task; callers arriving while it
+    runs await that task instead, and `coalesced` counts them. The task is
+    shielded, so a caller giving up does not cancel it for the others.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.coalesced = 0
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        task = self._tasks.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(compute())
+            if self.enabled:
+                self._tasks[key] = task
+                task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return await asyncio.shield(task)
+
+
+@dataclass(frozen=True)
+class DatasetStamp:
+    """dataset_version and the time of its last bump; (0, None) before the first ingest."""
+
+    version: int
+    updated_at: datetime | None
+
+
+# SQLSTATE undefined_table
+UNDEFINED_TABLE = "42P01"
+
+
+async def _select_version(session: AsyncSession, *columns) -> Result | None:
+    """Selects `columns` of the version row; None if the table does not exist yet.
+
+    Databases populated before dataset_version existed lack the table until
+    an ingest or `python -m scripts.summaries` creates it. They read as
+    version 0 rather than failing every request.
+    """
+    try:
+        return await session.execute(select(*columns))
+    except ProgrammingError as exc:
+        if getattr(exc.orig, "sqlstate", None) != UNDEFINED_TABLE:
+            raise
+        await session.rollback()
+        return None
+
+
+async def dataset_version(session: AsyncSession) -> int:
+    """Returns the current dataset_version, 0 before the first ingest."""
+    result = await _select_version(session, DatasetVersionModel.version)
+    return (result.scalar() if result is not None else None) or 0
+
+
+async def _read_stamp(sessions: async_sessionmaker[AsyncSession]) -> DatasetStamp:
+    # The session is closed, and its connection returned to the pool, before
+    # the endpoint runs or awaits another request's result
+    async with sessions() as session:
+        result = await _select_version(
+            session, DatasetVersionModel.version, DatasetVersionModel.updated_at
+        )
+        row = result.first() if result is not None else None
+    return DatasetStamp(*row) if row else DatasetStamp(0, None)
+
+
+# A burst of requests reads the version row once, on a session of the read's own
+stamp_reads = SingleFlight()
+
+
+async def get_dataset_stamp(
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_db_session_factory),
+) -> DatasetStamp:
+    return await stamp_reads.run("stamp", lambda: _read_stamp(sessions))
+
+
+def etag(stamp: DatasetStamp) -> str:
+    return f'W/"{stamp.version}"'
+
+
+def not_modified(headers: Headers, stamp: DatasetStamp) -> bool:
+    """True if the client's copy, per its conditional headers, is still current."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: W/"1" matches "1"
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag(stamp).removeprefix("W/") in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or stamp.updated_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole seconds
+    return stamp.updated_at.replace(microsecond=0) <= since
+
+
+async def conditional_get(
+    request: Request,
+    stamp: DatasetStamp = Depends(get_dataset_stamp),
+    settings: Settings = Depends(get_settings),
+) -> DatasetStamp:
+    """Router dependency: 304 if the client's copy is current, else cache headers.
+
+    Raises:
+        HTTPException: 304, before the endpoint runs.
+    """
+    headers = {
+        "ETag": etag(stamp),
+        "Cache-Control": f"public, max-age={settings.http_cache_max_age}, must-revalidate",
+    }
+    if stamp.updated_at is not None:
+        headers["Last-Modified"] = format_datetime(
+            stamp.updated_at.astimezone(timezone.utc), usegmt=True
+        )
+    request.state.cache_headers = headers
+    if not_modified(request.headers, stamp):
+        raise HTTPException(status_code=304)
+    return stamp
+
+
+class CacheHeadersMiddleware:
+    """Adds the headers conditional_get prepared to 200 and 304 responses.
+
+    A dependency cannot set headers on the Response objects endpoints return
+    themselves (e.g. FastJSONResponse), so they are added on the way out.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] in (200, 304):
+                cache_headers = scope.get("state", {}).get("cache_headers")
+                if cache_headers:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in cache_headers.items():
+                        headers[name] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class ResponseCache:
+    """Bounded LRU of route key -> (expiry, JSON body), for one dataset_version at a time."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0, coalesce: bool = True) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.flights = SingleFlight(enabled=coalesce)
+        self.hits = self.misses = self.evictions = 0
+        self._version: int | None = None
+        self._bodies: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+
+    def _current(self, version: int) -> bool:
+        """Drops every entry when `version` is newer; False if it is older."""
+        if self._version is None or version > self._version:
+            self._bodies.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, key: tuple, version: int) -> bytes | None:
+        """Returns the body cached for `key` at `version`, if any and not expired."""
+        if self._current(version):
+            cached = self._bodies.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, version: int, body: bytes) -> None:
+        if not self._current(version):
+            return  # computed from data that is already outdated
+        self._bodies[key] = (time.monotonic() + self.ttl, body)
+        self._bodies.move_to_end(key)
+        while len(self._bodies) > self.maxsize:
+            self._bodies.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            coalesced=self.flights.coalesced,
+            size=len(self._bodies),
+        )
+
+    def clear(self) -> None:
+        self._bodies.clear()
+        self._version = None
+        self.hits = self.misses = self.evictions = self.flights.coalesced = 0
+
+    def cached(self, endpoint: Callable[..., Awaitable]) -> Callable[..., Awaitable[Response]]:
+        """Decorates an endpoint to answer from the cache.
+
+        On a miss, concurrent identical requests share one call of the
+        endpoint (see SingleFlight) rather than each running its queries.
+        The call gets a session of its own for the endpoint's
+        get_db_session parameters, so the request that started it ending
+        early does not close the session under the others.
+
+        The key is the route path and the endpoint's query parameters as
+        FastAPI parsed them (unset ones omitted), so equivalent query
+        strings share an entry. The endpoint's result is stored as JSON:
+        the body of the Response it returns, or its return value serialized.
+        Apply below the router decorator.
+        """
+        signature = inspect.signature(endpoint)
+        names = [
+            name for name, parameter in signature.parameters.items()
+            if not isinstance(parameter.default, params.Depends)
+        ]
+        session_names = [
+            name for name, parameter in signature.parameters.items()
+            if isinstance(parameter.default, params.Depends)
+            and parameter.default.dependency is get_db_session
+        ]
+
+        async def compute(key: tuple, version: int, sessions, args, kwargs) -> bytes | Response:
+            if session_names:
+                async with sessions() as session:
+                    kwargs = {**kwargs, **dict.fromkeys(session_names, session)}
+                    result = await endpoint(*args, **kwargs)
+            else:
+                result = await endpoint(*args, **kwargs)
+            if isinstance(result, Response):
+                if result.status_code != 200:
+                    return result
+                body = result.body
+            else:
+                body = to_json(result)
+            self.put(key, version, body)
+            return body
+
+        @functools.wraps(endpoint)
+        async def wrapper(
+            *args,
+            cache_request: Request,
+            cache_stamp: DatasetStamp,
+            cache_sessions: async_sessionmaker[AsyncSession] | None = None,
+            **kwargs,
+        ):
+            key = (cache_request.url.path, *(
+                (name, kwargs[name]) for name in names if kwargs.get(name) is not None
+            ))
+            body = self.get(key, cache_stamp.version)
+            if body is None:
+                body = await self.flights.run(
+                    (key, cache_stamp.version),
+                    lambda: compute(key, cache_stamp.version, cache_sessions, args, kwargs),
+                )
+                if isinstance(body, Response):
+                    return body
+            return Response(body, media_type="application/json")
+
+        # FastAPI reads the wrapper's parameters: the endpoint's but its
+        # sessions, plus the request, the stamp conditional_get already read
+        # for it and the factory of the shared call's session
+        wrapper.__signature__ = signature.replace(parameters=[
+            *(
+                parameter for name, parameter in signature.parameters.items()
+                if name not in session_names
+            ),
+            inspect.Parameter("cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            inspect.Parameter(
+                "cache_stamp", inspect.Parameter.KEYWORD_ONLY,
+                annotation=DatasetStamp, default=Depends(conditional_get),
+            ),
+            inspect.Parameter(
+                "cache_sessions", inspect.Parameter.KEYWORD_ONLY,
+                annotation=async_sessionmaker[AsyncSession],
+                default=Depends(get_db_session_factory),
+            ),
+        ])
+        return wrapper
+
+
+response_cache = ResponseCache(
+    maxsize=get_settings().response_cache_size, ttl=get_settings().response_cache_ttl
+)
@@ -0,0 +1,181 @@
+"""Precomputed marker clusters behind GET /api/warehouses/clusters.
+
+ClusterPyramid aggregates warehouse coordinates into the cells of the Web
+Mercator grid the map draws, at every zoom level up to MAX_CLUSTER_ZOOM.
+A cell covers 64 px on screen at its zoom (a quarter of a map tile's
+width), so a viewport holds a bounded number of cells whatever the table size.
+Per cell it keeps the count, the coordinate sums behind the centroid, and
+the price per m2 sum and count as the analytics summaries define them.
+
+cluster_pyramid holds the pyramid of the current dataset_version, rebuilt
+after an ingest like the spatial index behind /nearby.
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.schemas import Cluster, WarehouseModel
+from app.spatial import VersionedIndex
+
+# Above this zoom the endpoint returns individual warehouses
+MAX_CLUSTER_ZOOM = 12
+
+# 256 px tiles split into 4 x 4 cells of 64 px
+CELLS_PER_TILE_BITS = 2
+
+# Most warehouses returned above MAX_CLUSTER_ZOOM
+MAX_POINTS = 1000
+
+# A 4K viewport spans about 60 x 34 cells; larger boxes are refused
+MAX_CELLS = 4096
+
+# Web Mercator stops at +/-85.0511 degrees of latitude
+MAX_LATITUDE = math.degrees(math.atan(math.sinh(math.pi)))
+
+
+def parse_bbox(bbox: str) -> tuple[float, float, float, float]:
+    """Returns (west, south, east, north) of a "west,south,east,north" string.
+
+    This is the order of Leaflet's LatLngBounds.toBBoxString().
+
+    Raises:
+        ValueError: the box is malformed or out of range.
+    """
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(","))
+    except ValueError as exc:
+        raise ValueError(f"Invalid bbox: {bbox!r}") from exc
+    if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError(f"Invalid bbox: {bbox!r}")
+    return west, south, east, north
+
+
+def mercator(lats, lngs):
+    """Returns Web Mercator (x, y) in [0, 1] of the coordinates; y grows southwards."""
+    lats = np.radians(np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lngs, dtype=np.float64) + 180) / 360
+    y = 0.5 - np.arcsinh(np.tan(lats)) / (2 * math.pi)
+    return x, y
+
+
+def cell_range(
+    bbox: tuple[float, float, float, float], zoom: int
+) -> tuple[int, int, int, int]:
+    """Returns (x_min, x_max, y_min, y_max) of the cells a (west, south, east, north) box covers."""
+    west, south, east, north = bbox
+    scale = 1 << (zoom + CELLS_PER_TILE_BITS)
+    (x_west, x_east), (y_south, y_north) = mercator(
+        np.array([south, north]), np.array([west, east])
+    )
+
+    def cell(position: float) -> int:
+        return min(max(math.floor(position * scale), 0), scale - 1)
+
+    return cell(x_west), cell(x_east), cell(y_north), cell(y_south)
+
+
+@dataclass
+class Level:
+    """The occupied cells of one zoom level, as parallel arrays."""
+
+    x: np.ndarray
+    y: np.ndarray
+    count: np.ndarray
+    lat_sum: np.ndarray
+    lng_sum: np.ndarray
+    price_per_m2_sum: np.ndarray
+    price_per_m2_count: np.ndarray
+
+
+class ClusterPyramid:
+    """Cells of every zoom level from 0 to MAX_CLUSTER_ZOOM."""
+
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray, price_per_m2: np.ndarray) -> None:
+        """price_per_m2 is NaN for the warehouses it does not count."""
+        self.size = len(lats)
+        x, y = mercator(lats, lngs)
+        counted = ~np.isnan(price_per_m2)
+        price_per_m2 = np.where(counted, price_per_m2, 0)
+        self.levels = []
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            scale = 1 << (zoom + CELLS_PER_TILE_BITS)
+            cell_x = np.clip(np.floor(x * scale), 0, scale - 1).astype(np.int64)
+            cell_y = np.clip(np.floor(y * scale), 0, scale - 1).astype(np.int64)
+            keys, cells = np.unique(cell_x * scale + cell_y, return_inverse=True)
+            self.levels.append(Level(
+                x=keys // scale,
+                y=keys % scale,
+                count=np.bincount(cells, minlength=len(keys)),
+                lat_sum=np.bincount(cells, weights=lats, minlength=len(keys)),
+                lng_sum=np.bincount(cells, weights=lngs, minlength=len(keys)),
+                price_per_m2_sum=np.bincount(cells, weights=price_per_m2, minlength=len(keys)),
+                price_per_m2_count=np.bincount(cells, weights=counted, minlength=len(keys)),
+            ))
+
+    def clusters(self, bbox: tuple[float, float, float, float], zoom: int) -> list[Cluster]:
+        """Returns the clusters of the cells overlapping bbox at zoom.
+
+        Raises:
+            ValueError: the box spans more than MAX_CELLS cells at this zoom.
+        """
+        x_min, x_max, y_min, y_max = cell_range(bbox, zoom)
+        if (x_max - x_min + 1) * (y_max - y_min + 1) > MAX_CELLS:
+            raise ValueError(f"bbox spans more than {MAX_CELLS} cells at zoom {zoom}")
+        level = self.levels[zoom]
+        selected = np.flatnonzero(
+            (level.x >= x_min) & (level.x <= x_max) & (level.y >= y_min) & (level.y <= y_max)
+        )
+        count = level.count[selected]
+        priced = level.price_per_m2_count[selected]
+        avg_price_per_m2 = np.divide(
+            level.price_per_m2_sum[selected], priced,
+            out=np.full(len(selected), np.nan), where=priced > 0,
+        )
+        return [
+            Cluster(
+                count=n,
+                latitude=lat_sum / n,
+                longitude=lng_sum / n,
+                avg_price_per_m2=None if math.isnan(price) else round(price, 2),
+            )
+            for n, lat_sum, lng_sum, price in zip(
+                count.tolist(),
+                level.lat_sum[selected].tolist(),
+                level.lng_sum[selected].tolist(),
+                avg_price_per_m2.tolist(),
+            )
+        ]
+
+
+async def query_pyramid(session: AsyncSession) -> list[tuple]:
+    result = await session.execute(
+        select(
+            WarehouseModel.latitude,
+            WarehouseModel.longitude,
+            WarehouseModel.price_eur,
+            WarehouseModel.surface_m2,
+        )
+        .where(WarehouseModel.latitude.isnot(None), WarehouseModel.longitude.isnot(None))
+    )
+    return result.all()
+
+
+def build_pyramid(rows: list[tuple]) -> ClusterPyramid:
+    """Builds the pyramid of (latitude, longitude, price_eur, surface_m2) rows."""
+    # Column by column: numpy converts sequences of floats far faster than Rows
+    lats, lngs, prices, surfaces = (
+        np.array(column, dtype=np.float64)  # None -> NaN
+        for column in (zip(*rows) if rows else ((),) * 4)
+    )
+    # Counted like scripts/summaries.py: a non-zero price and a positive surface
+    counted = (prices != 0) & ~np.isnan(prices) & (surfaces > 0)
+    price_per_m2 = np.full(len(rows), np.nan)
+    np.divide(prices, surfaces, out=price_per_m2, where=counted)
+    return ClusterPyramid(lats, lngs, price_per_m2)
+
+
+cluster_pyramid = VersionedIndex(query_pyramid, build_pyramid)
@@ -1,11 +1,21 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
 
     database_url: str = ""
+    # How GET /api/warehouses computes `total`, see app/counting.py
+    count_strategy: Literal["exact", "window", "estimated", "cached"] = "exact"
+    # With count_strategy=estimated, planner estimates below this are counted exactly
+    count_estimate_threshold: int = 10_000
+    # Seconds clients may reuse a read response before revalidating it, see app/caching.py
+    http_cache_max_age: int = 0
+    # Responses kept in process by app/caching.py's response_cache, and for how many seconds
+    response_cache_size: int = 256
+    response_cache_ttl: float = 300.0
 
     @property
     def async_database_url(self) -> str:
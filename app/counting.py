@@ -0,0 +1,115 @@
+"""How GET /api/warehouses computes `total`.
+
+Settings.count_strategy picks one of:
+
+    exact      a separate COUNT(*) with the page's filters (the default)
+    window     count(*) OVER () added to the page query: one query
+               instead of two, still exact
+    estimated  the planner's row estimate for the filters. It is returned
+               as-is when at least count_estimate_threshold, i.e. for the
+               broad filters where counting costs most, and replaced by an
+               exact count below that
+    cached     exact counts kept in process, keyed by the normalized
+               filters and dropped whenever dataset_version changes
+
+Cursor pages cannot use window, since their query skips earlier rows, so
+they count exactly instead.
+"""
+
+import json
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.caching import dataset_version
+from app.models.schemas import WarehouseModel
+
+
+def filters_key(**filters) -> tuple:
+    """Returns a hashable key of the filters that are set.
+
+    commune is matched with ILIKE, so its case does not change the count.
+    """
+    if filters.get("commune"):
+        filters["commune"] = filters["commune"].lower()
+    return tuple(sorted((name, value) for name, value in filters.items() if value is not None))
+
+
+class CountCache:
+    """Bounded map of filters key -> (dataset version, total).
+
+    The least recently used key is dropped once `maxsize` keys are held.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._totals: OrderedDict[tuple, tuple[int, int]] = OrderedDict()
+
+    def get(self, key: tuple, version: int) -> int | None:
+        """Returns the total cached for `key` at `version`, if any."""
+        cached = self._totals.get(key)
+        if cached is None or cached[0] != version:
+            return None
+        self._totals.move_to_end(key)
+        return cached[1]
+
+    def put(self, key: tuple, version: int, total: int) -> None:
+        self._totals[key] = (version, total)
+        self._totals.move_to_end(key)
+        while len(self._totals) > self.maxsize:
+            self._totals.popitem(last=False)
+
+    def clear(self) -> None:
+        self._totals.clear()
+
+
+count_cache = CountCache()
+
+
+async def exact_count(session: AsyncSession, conditions: list) -> int:
+    result = await session.execute(
+        select(func.count()).select_from(WarehouseModel).where(*conditions)
+    )
+    return result.scalar() or 0
+
+
+async def estimated_count(session: AsyncSession, conditions: list) -> int:
+    """Returns the planner's estimate of the rows matching `conditions`."""
+    conn = await session.connection()
+    compiled = select(WarehouseModel.id).where(*conditions).compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_total(
+    session: AsyncSession,
+    strategy: str,
+    conditions: list,
+    filters: dict,
+    estimate_threshold: int,
+) -> tuple[int, bool]:
+    """Counts the rows matching `conditions` with a strategy other than window.
+
+    window falls back to exact here; the caller handles it on the page query.
+
+    Returns:
+        (total, True if exact, False if a planner estimate)
+    """
+    if strategy == "estimated":
+        estimate = await estimated_count(session, conditions)
+        if estimate >= estimate_threshold:
+            return estimate, False
+    elif strategy == "cached":
+        key = filters_key(**filters)
+        version = await dataset_version(session)
+        total = count_cache.get(key, version)
+        if total is None:
+            total = await exact_count(session, conditions)
+            count_cache.put(key, version, total)
+        return total, True
+    return await exact_count(session, conditions), True
@@ -24,3 +24,12 @@ def get_session_factory() -> async_sessionmaker[AsyncSession]:
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     async with get_session_factory()() as session:
         yield session
+
+
+async def get_db_session_factory() -> async_sessionmaker[AsyncSession]:
+    """For work that may outlive the request, e.g. shared by coalesced requests.
+
+    Such work opens and closes its own sessions: a request's session is
+    closed when that request ends, even if others still await the work.
+    """
+    return get_session_factory()
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.caching import CacheHeadersMiddleware, response_cache, stamp_reads
 from app.routers import warehouses, analytics
 
 app = FastAPI(
@@ -16,6 +17,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CacheHeadersMiddleware)
 
 # Include routers
 app.include_router(warehouses.router)
@@ -25,3 +27,12 @@ app.include_router(analytics.router)
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """In-process cache and coalescing counters, since the last restart."""
+    return {
+        "response_cache": response_cache.stats(),
+        "version_reads": {"coalesced": stamp_reads.coalesced},
+    }
@@ -4,7 +4,10 @@ from typing import Optional
 from datetime import date
 from uuid import UUID
 
-from sqlalchemy import Column, String, Float, Date, Uuid
+from sqlalchemy import (
+    BigInteger, Column, DateTime, String, Float, Date, Index, SmallInteger, Uuid,
+    UniqueConstraint, text,
+)
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -16,19 +19,128 @@ class Base(DeclarativeBase):
 
 class WarehouseModel(Base):
     __tablename__ = "warehouses"
+    # Range-partitioned by year (see scripts/partitions.py). PostgreSQL
+    # requires the partition key in every unique constraint, hence the
+    # composite primary key and mutation-id constraint.
+    __table_args__ = (
+        UniqueConstraint("dvf_mutation_id", "transaction_date"),
+        {"postgresql_partition_by": "RANGE (transaction_date)"},
+    )
 
     id = Column(Uuid, primary_key=True, default=uuid.uuid4)
-    dvf_mutation_id = Column(String, unique=True, nullable=False)
+    dvf_mutation_id = Column(String, nullable=False)
     address = Column(String)
     postal_code = Column(String)
     commune = Column(String)
     department = Column(String)
     surface_m2 = Column(Float)
     price_eur = Column(Float)
-    transaction_date = Column(Date)
+    transaction_date = Column(Date, primary_key=True)
     latitude = Column(Float)
     longitude = Column(Float)
     property_type = Column(String)
+    # Hash of the parsed DVF fields, set by the ingest to detect corrections
+    content_hash = Column(String)
+
+
+def _extension_installed(name: str):
+    """ddl_if condition: emit the DDL only if extension `name` is installed."""
+    def installed(ddl, target, bind, **kw) -> bool:
+        return bind is not None and bind.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = :name"), {"name": name}
+        ).first() is not None
+
+    return installed
+
+
+# Managed index set of warehouses: every index named ix_warehouses_*.
+# create_all builds them with the table; existing databases catch up
+# through scripts/indexes.py, which also drops managed indexes removed
+# from this list.
+WAREHOUSE_INDEXES = (
+    # Department filter in list order, and per-department summary refreshes
+    Index(
+        "ix_warehouses_department_date",
+        WarehouseModel.department,
+        WarehouseModel.transaction_date.desc().nulls_last(),
+        WarehouseModel.id.desc(),
+    ),
+    # Keyset pagination of /api/warehouses, in the endpoint's sort order
+    Index(
+        "ix_warehouses_transaction_date_id",
+        WarehouseModel.transaction_date.desc().nulls_last(),
+        WarehouseModel.id.desc(),
+    ),
+    # Date range counts; rows are loaded roughly in date order per year
+    Index(
+        "ix_warehouses_transaction_date_brin",
+        WarehouseModel.transaction_date,
+        postgresql_using="brin",
+    ),
+    Index("ix_warehouses_price", WarehouseModel.price_eur),
+    Index("ix_warehouses_surface", WarehouseModel.surface_m2),
+    # Bounding box of /api/warehouses/nearby
+    Index("ix_warehouses_lat_lng", WarehouseModel.latitude, WarehouseModel.longitude),
+    # commune ILIKE '%x%'; needs the pg_trgm extension
+    Index(
+        "ix_warehouses_commune_trgm",
+        WarehouseModel.commune,
+        postgresql_using="gin",
+        postgresql_ops={"commune": "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql", callable_=_extension_installed("pg_trgm")),
+)
+
+
+class SummaryColumns:
+    """Additive aggregates shared by the summary tables (scripts/summaries.py).
+
+    Averages are derived at read time: avg price = price_sum / price_count.
+    A price counts when non-zero, a surface when non-zero, and a price per
+    m2 when the price counts and the surface is positive.
+    """
+
+    row_count = Column(BigInteger, nullable=False)
+    price_count = Column(BigInteger, nullable=False)
+    price_sum = Column(Float, nullable=False)
+    surface_count = Column(BigInteger, nullable=False)
+    surface_sum = Column(Float, nullable=False)
+    price_per_m2_count = Column(BigInteger, nullable=False)
+    price_per_m2_sum = Column(Float, nullable=False)
+
+
+class DepartmentSummaryModel(SummaryColumns, Base):
+    __tablename__ = "department_summary"
+
+    department = Column(String, primary_key=True)
+
+
+class CommuneSummaryModel(SummaryColumns, Base):
+    __tablename__ = "commune_summary"
+
+    department = Column(String, primary_key=True)
+    commune = Column(String, primary_key=True)
+
+
+class MonthlySummaryModel(SummaryColumns, Base):
+    __tablename__ = "monthly_summary"
+
+    department = Column(String, primary_key=True)
+    # First day of the month
+    month = Column(Date, primary_key=True)
+
+
+class DatasetVersionModel(Base):
+    """Single row counting the ingest writes that changed warehouses.
+
+    Bumped with every summary refresh (scripts/summaries.py); the API
+    compares it to drop cached results computed from older data.
+    """
+
+    __tablename__ = "dataset_version"
+
+    id = Column(SmallInteger, primary_key=True, default=1)
+    version = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
 
 
 # --- Pydantic response schemas ---
@@ -48,6 +160,10 @@ class Warehouse(BaseModel):
     longitude: Optional[float] = None
 
 
+# Core projection of the Warehouse fields, for read paths that skip the ORM
+WAREHOUSE_COLUMNS = tuple(WarehouseModel.__table__.c[name] for name in Warehouse.model_fields)
+
+
 class NearbyWarehouse(Warehouse):
     distance_km: float
 
@@ -57,6 +173,10 @@ class WarehouseListResponse(BaseModel):
     total: int
     limit: int
     offset: int
+    # Pass as `cursor` to get the page after this one; None on the last page
+    next_cursor: Optional[str] = None
+    # False when `total` is a planner estimate (count_strategy=estimated)
+    total_exact: bool = True
 
 
 class NearbyWarehouseListResponse(BaseModel):
@@ -65,6 +185,25 @@ class NearbyWarehouseListResponse(BaseModel):
     center_lat: float
     center_lng: float
     radius_km: float
+    # Paginated mode (limit/cursor): pass as `cursor` for the next page
+    next_cursor: Optional[str] = None
+
+
+class Cluster(BaseModel):
+    count: int
+    # Centroid of the clustered warehouses
+    latitude: float
+    longitude: float
+    avg_price_per_m2: Optional[float] = None
+
+
+class ClusterListResponse(BaseModel):
+    zoom: int
+    # Filled up to MAX_CLUSTER_ZOOM (app/clusters.py), points above it
+    clusters: list[Cluster]
+    points: list[Warehouse]
+    # True when the box holds more warehouses than the points returned
+    truncated: bool = False
 
 
 class StatsResponse(BaseModel):
@@ -1,15 +1,26 @@
 import math
-from collections import defaultdict
+from datetime import date
+from typing import Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import BigInteger, cast, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.caching import conditional_get, response_cache
 from app.db import get_db_session
-from app.models.schemas import DepartmentStat, DepartmentStatsResponse, WarehouseModel
+from app.models.schemas import (
+    CommuneSummaryModel,
+    DepartmentStat,
+    DepartmentStatsResponse,
+    DepartmentSummaryModel,
+    MonthlySummaryModel,
+    WarehouseModel,
+)
 
-router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+router = APIRouter(
+    prefix="/api/analytics", tags=["analytics"], dependencies=[Depends(conditional_get)]
+)
 
 
 class HistogramBucket(BaseModel):
@@ -60,6 +71,7 @@ class TopCommunesResponse(BaseModel):
 
 
 @router.get("/price-per-m2", response_model=PricePerM2Response)
+@response_cache.cached
 async def price_per_m2(session: AsyncSession = Depends(get_db_session)):
     """Return price per m2 distribution as histogram buckets."""
     result = await session.execute(
@@ -105,38 +117,25 @@ async def price_per_m2(session: AsyncSession = Depends(get_db_session)):
 
 
 @router.get("/by-department", response_model=ByDepartmentResponse)
+@response_cache.cached
 async def by_department(session: AsyncSession = Depends(get_db_session)):
     """Return avg price, avg surface, count grouped by department."""
     result = await session.execute(
-        select(
-            WarehouseModel.department,
-            WarehouseModel.price_eur,
-            WarehouseModel.surface_m2,
-        ).where(WarehouseModel.department.isnot(None))
+        select(DepartmentSummaryModel).order_by(DepartmentSummaryModel.department)
     )
 
-    groups: dict[str, dict] = defaultdict(lambda: {"prices": [], "surfaces": [], "count": 0})
-    for dept, price, surface in result.all():
-        if not dept:
-            continue
-        groups[dept]["count"] += 1
-        if price:
-            groups[dept]["prices"].append(price)
-        if surface:
-            groups[dept]["surfaces"].append(surface)
-
     departments = []
-    for dept, g in sorted(groups.items()):
-        avg_price = sum(g["prices"]) / len(g["prices"]) if g["prices"] else 0
-        avg_surface = sum(g["surfaces"]) / len(g["surfaces"]) if g["surfaces"] else 0
+    for summary in result.scalars().all():
+        avg_price = summary.price_sum / summary.price_count if summary.price_count else 0
+        avg_surface = summary.surface_sum / summary.surface_count if summary.surface_count else 0
         avg_ppm2 = (avg_price / avg_surface) if avg_surface > 0 else 0
         departments.append(
             DepartmentStats(
-                department=dept,
+                department=summary.department,
                 avg_price=round(avg_price, 2),
                 avg_surface=round(avg_surface, 2),
                 avg_price_per_m2=round(avg_ppm2, 2),
-                count=g["count"],
+                count=summary.row_count,
             )
         )
 
@@ -144,42 +143,46 @@ async def by_department(session: AsyncSession = Depends(get_db_session)):
 
 
 @router.get("/price-trends", response_model=PriceTrendsResponse)
-async def price_trends(session: AsyncSession = Depends(get_db_session)):
-    """Return avg price by month/year over time."""
-    result = await session.execute(
+@response_cache.cached
+async def price_trends(
+    date_from: Optional[date] = Query(default=None),
+    date_to: Optional[date] = Query(default=None),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """Return avg price by month/year over time.
+
+    Reads the monthly summaries, so date_from/date_to select whole months:
+    every month they overlap is included.
+    """
+    # sum() of a bigint is a numeric; cast it back so counts stay ints
+    price_count = cast(func.sum(MonthlySummaryModel.price_count), BigInteger)
+    query = (
         select(
-            WarehouseModel.transaction_date,
-            WarehouseModel.price_eur,
-            WarehouseModel.surface_m2,
+            MonthlySummaryModel.month,
+            price_count,
+            func.sum(MonthlySummaryModel.price_sum),
+            cast(func.sum(MonthlySummaryModel.price_per_m2_count), BigInteger),
+            func.sum(MonthlySummaryModel.price_per_m2_sum),
         )
-        .where(
-            WarehouseModel.transaction_date.isnot(None),
-            WarehouseModel.price_eur.isnot(None),
-        )
-        .order_by(WarehouseModel.transaction_date.asc())
+        .group_by(MonthlySummaryModel.month)
+        .having(price_count > 0)
+        .order_by(MonthlySummaryModel.month.asc())
     )
-
-    groups: dict[str, dict] = defaultdict(lambda: {"prices": [], "ppm2": [], "count": 0})
-    for txn_date, price, surface in result.all():
-        if not txn_date or not price:
-            continue
-        period = txn_date.strftime("%Y-%m")
-        groups[period]["prices"].append(price)
-        groups[period]["count"] += 1
-        if surface and surface > 0:
-            groups[period]["ppm2"].append(price / surface)
+    if date_from:
+        query = query.where(MonthlySummaryModel.month >= date_from.replace(day=1))
+    if date_to:
+        query = query.where(MonthlySummaryModel.month <= date_to)
+    result = await session.execute(query)
 
     trends = []
-    for period in sorted(groups.keys()):
-        g = groups[period]
-        avg_price = sum(g["prices"]) / len(g["prices"]) if g["prices"] else 0
-        avg_ppm2 = sum(g["ppm2"]) / len(g["ppm2"]) if g["ppm2"] else 0
+    for month, count, price_sum, ppm2_count, ppm2_sum in result.all():
+        avg_ppm2 = ppm2_sum / ppm2_count if ppm2_count else 0
         trends.append(
             PriceTrendPoint(
-                period=period,
-                avg_price=round(avg_price, 2),
+                period=month.strftime("%Y-%m"),
+                avg_price=round(price_sum / count, 2),
                 avg_price_per_m2=round(avg_ppm2, 2),
-                count=g["count"],
+                count=count,
             )
         )
 
@@ -187,85 +190,53 @@ async def price_trends(session: AsyncSession = Depends(get_db_session)):
 
 
 @router.get("/top-communes", response_model=TopCommunesResponse)
+@response_cache.cached
 async def top_communes(session: AsyncSession = Depends(get_db_session)):
     """Return top 10 most expensive and cheapest communes by avg price per m2."""
-    result = await session.execute(
-        select(
-            WarehouseModel.commune,
-            WarehouseModel.department,
-            WarehouseModel.price_eur,
-            WarehouseModel.surface_m2,
-        ).where(
-            WarehouseModel.commune.isnot(None),
-            WarehouseModel.price_eur.isnot(None),
-            WarehouseModel.surface_m2.isnot(None),
-            WarehouseModel.surface_m2 > 0,
-        )
+    avg_ppm2 = CommuneSummaryModel.price_per_m2_sum / CommuneSummaryModel.price_per_m2_count
+    query = (
+        select(CommuneSummaryModel)
+        .where(CommuneSummaryModel.price_per_m2_count > 0)
+        .limit(10)
+    )
+    most_expensive = await session.execute(
+        query.order_by(avg_ppm2.desc(), CommuneSummaryModel.commune)
+    )
+    cheapest = await session.execute(
+        query.order_by(avg_ppm2.asc(), CommuneSummaryModel.commune)
     )
 
-    groups: dict[str, dict] = defaultdict(lambda: {"department": "", "ppm2_values": []})
-    for commune, department, price, surface in result.all():
-        if not commune or not price or not surface or surface <= 0:
-            continue
-        groups[commune]["department"] = department or ""
-        groups[commune]["ppm2_values"].append(price / surface)
-
-    commune_stats = []
-    for commune, g in groups.items():
-        if len(g["ppm2_values"]) == 0:
-            continue
-        avg_ppm2 = sum(g["ppm2_values"]) / len(g["ppm2_values"])
-        commune_stats.append(
-            CommuneStats(
-                commune=commune,
-                department=g["department"],
-                avg_price_per_m2=round(avg_ppm2, 2),
-                count=len(g["ppm2_values"]),
-            )
+    def commune_stats(summary: CommuneSummaryModel) -> CommuneStats:
+        return CommuneStats(
+            commune=summary.commune,
+            department=summary.department,
+            avg_price_per_m2=round(summary.price_per_m2_sum / summary.price_per_m2_count, 2),
+            count=summary.price_per_m2_count,
         )
 
-    commune_stats.sort(key=lambda x: x.avg_price_per_m2, reverse=True)
-    most_expensive = commune_stats[:10]
-    cheapest = list(reversed(commune_stats[-10:])) if len(commune_stats) >= 10 else list(reversed(commune_stats))
-
     return TopCommunesResponse(
-        most_expensive=most_expensive,
-        cheapest=cheapest,
+        most_expensive=[commune_stats(s) for s in most_expensive.scalars().all()],
+        cheapest=[commune_stats(s) for s in cheapest.scalars().all()],
     )
 
 
 @router.get("/department-stats", response_model=DepartmentStatsResponse)
+@response_cache.cached
 async def department_stats(session: AsyncSession = Depends(get_db_session)):
     """Return avg price per m2 and warehouse count per department (for heatmap)."""
     result = await session.execute(
-        select(
-            WarehouseModel.department,
-            WarehouseModel.price_eur,
-            WarehouseModel.surface_m2,
-        ).where(
-            WarehouseModel.department.isnot(None),
-            WarehouseModel.price_eur.isnot(None),
-            WarehouseModel.surface_m2.isnot(None),
-            WarehouseModel.surface_m2 > 0,
-        )
+        select(DepartmentSummaryModel)
+        .where(DepartmentSummaryModel.price_per_m2_count > 0)
+        .order_by(DepartmentSummaryModel.department)
     )
 
-    dept_map: dict[str, dict] = {}
-    for dept, price, surface in result.all():
-        if not dept or not price or not surface or surface == 0:
-            continue
-        if dept not in dept_map:
-            dept_map[dept] = {"total_price_per_m2": 0.0, "count": 0}
-        dept_map[dept]["total_price_per_m2"] += price / surface
-        dept_map[dept]["count"] += 1
-
     items = [
         DepartmentStat(
-            department=dept,
-            avg_price_per_m2=round(data["total_price_per_m2"] / data["count"], 2),
-            total_count=data["count"],
+            department=summary.department,
+            avg_price_per_m2=round(summary.price_per_m2_sum / summary.price_per_m2_count, 2),
+            total_count=summary.price_per_m2_count,
         )
-        for dept, data in sorted(dept_map.items())
+        for summary in result.scalars().all()
     ]
 
     return DepartmentStatsResponse(items=items)
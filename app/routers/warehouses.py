@@ -1,57 +1,131 @@
-import math
+import base64
 
 from datetime import date
+from uuid import UUID
 
-from fastapi import APIRouter, Query, Depends
-from typing import Optional
-from sqlalchemy import select, func
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional
+from sqlalchemy import ARRAY, Uuid, any_, bindparam, select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.db import get_db_session
+from app.caching import DatasetStamp, conditional_get, response_cache
+from app.config import Settings, get_settings
+from app.counting import count_total, exact_count
+from app.db import get_db_session, get_db_session_factory
+from app.clusters import MAX_CLUSTER_ZOOM, MAX_POINTS, cluster_pyramid, parse_bbox
 from app.models.schemas import (
-    Warehouse,
+    WAREHOUSE_COLUMNS,
+    ClusterListResponse,
     WarehouseListResponse,
     WarehouseModel,
-    NearbyWarehouse,
     NearbyWarehouseListResponse,
     StatsResponse,
 )
+from app.responses import EXPORT_FORMATS, FastJSONResponse, export_chunks, row_dicts
+from app.spatial import bounding_box, haversine_sql, spatial_index
 
-EARTH_RADIUS_KM = 6371.0
 
+def warehouse_filters(
+    department: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_surface: Optional[float] = None,
+    max_surface: Optional[float] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    commune: Optional[str] = None,
+) -> list:
+    """Return the WHERE conditions for the list filters that are set.
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate the great-circle distance between two points in km."""
-    lat1_r, lat2_r = math.radians(lat1), math.radians(lat2)
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
+    Bounds on transaction_date let PostgreSQL prune the yearly partitions.
+    """
+    conditions = []
+    if department:
+        conditions.append(WarehouseModel.department == department)
+    if min_price is not None:
+        conditions.append(WarehouseModel.price_eur >= min_price)
+    if max_price is not None:
+        conditions.append(WarehouseModel.price_eur <= max_price)
+    if min_surface is not None:
+        conditions.append(WarehouseModel.surface_m2 >= min_surface)
+    if max_surface is not None:
+        conditions.append(WarehouseModel.surface_m2 <= max_surface)
+    if date_from:
+        conditions.append(WarehouseModel.transaction_date >= date_from)
+    if date_to:
+        conditions.append(WarehouseModel.transaction_date <= date_to)
+    if commune:
+        conditions.append(WarehouseModel.commune.ilike(f"%{commune}%"))
+    return conditions
 
-    a = (
-        math.sin(dlat / 2) ** 2
-        + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(dlon / 2) ** 2
-    )
-    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-
-def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float, float]:
-    """Return (lat_min, lat_max, lng_min, lng_max) for a bounding box around the point."""
-    delta_lat = radius_km / 111.0
-    delta_lng = radius_km / (111.0 * max(math.cos(math.radians(lat)), 1e-10))
-    return (
-        lat - delta_lat,
-        lat + delta_lat,
-        lng - delta_lng,
-        lng + delta_lng,
-    )
 
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b"=").decode()
+
+
+def _decode(cursor: str) -> str:
+    return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+
+
+def encode_cursor(transaction_date: date, warehouse_id: UUID) -> str:
+    """Return the opaque cursor of the list page that follows the given row."""
+    return _encode(f"{transaction_date.isoformat()}|{warehouse_id}")
+
+
+def decode_cursor(cursor: str) -> tuple[date, UUID]:
+    """Return the (transaction_date, id) a cursor from encode_cursor points after.
+
+    Raises:
+        ValueError: the cursor is malformed.
+    """
+    try:
+        day, warehouse_id = _decode(cursor).split("|")
+        return date.fromisoformat(day), UUID(warehouse_id)
+    except ValueError as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def encode_distance_cursor(distance_km: float, warehouse_id: UUID) -> str:
+    """Return the opaque cursor of the nearby page that follows the given row.
+
+    repr() keeps every digit of the distance, so the next page resumes
+    exactly after it.
+    """
+    return _encode(f"{distance_km!r}|{warehouse_id}")
+
+
+def decode_distance_cursor(cursor: str) -> tuple[float, UUID]:
+    """Return the (distance_km, id) a cursor from encode_distance_cursor points after.
+
+    Raises:
+        ValueError: the cursor is malformed.
+    """
+    try:
+        distance_km, warehouse_id = _decode(cursor).split("|")
+        return float(distance_km), UUID(warehouse_id)
+    except ValueError as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
 
-router = APIRouter(prefix="/api", tags=["warehouses"])
 
+def nearby_item(row: dict, distance_km: float) -> dict:
+    """Return the NearbyWarehouse payload of a WAREHOUSE_COLUMNS row dict, updated in place."""
+    row["distance_km"] = round(distance_km, 2)
+    return row
 
-@router.get("/warehouses", response_model=WarehouseListResponse)
+
+router = APIRouter(prefix="/api", tags=["warehouses"], dependencies=[Depends(conditional_get)])
+
+
+@router.get(
+    "/warehouses", response_model=WarehouseListResponse, response_class=FastJSONResponse
+)
 async def list_warehouses(
     limit: int = Query(default=20),
     offset: int = Query(default=0),
+    cursor: Optional[str] = Query(
+        default=None, description="next_cursor of the previous page; replaces offset"
+    ),
     department: Optional[str] = Query(default=None),
     min_price: Optional[float] = Query(default=None),
     max_price: Optional[float] = Query(default=None),
@@ -61,70 +135,229 @@ async def list_warehouses(
     date_to: Optional[date] = Query(default=None),
     commune: Optional[str] = Query(default=None),
     session: AsyncSession = Depends(get_db_session),
+    settings: Settings = Depends(get_settings),
 ):
+    """Return a page of warehouses, newest transactions first.
+
+    Pages are walked either by offset or, in constant time per page, by
+    passing the previous page's next_cursor as `cursor`. Both follow the
+    same (transaction_date, id) order, so no row is skipped or repeated.
+    `total` is computed per settings.count_strategy (see app/counting.py).
+    Rows are read as dicts of the response columns and serialized
+    as they are (see app/responses.py).
+    """
     limit = max(1, min(100, limit))
     offset = max(0, offset)
 
-    base_query = select(WarehouseModel)
-    count_query = select(func.count()).select_from(WarehouseModel)
-
-    # Apply filters
-    if department:
-        base_query = base_query.where(WarehouseModel.department == department)
-        count_query = count_query.where(WarehouseModel.department == department)
-    if min_price is not None:
-        base_query = base_query.where(WarehouseModel.price_eur >= min_price)
-        count_query = count_query.where(WarehouseModel.price_eur >= min_price)
-    if max_price is not None:
-        base_query = base_query.where(WarehouseModel.price_eur <= max_price)
-        count_query = count_query.where(WarehouseModel.price_eur <= max_price)
-    if min_surface is not None:
-        base_query = base_query.where(WarehouseModel.surface_m2 >= min_surface)
-        count_query = count_query.where(WarehouseModel.surface_m2 >= min_surface)
-    if max_surface is not None:
-        base_query = base_query.where(WarehouseModel.surface_m2 <= max_surface)
-        count_query = count_query.where(WarehouseModel.surface_m2 <= max_surface)
-    if date_from:
-        base_query = base_query.where(WarehouseModel.transaction_date >= date_from)
-        count_query = count_query.where(WarehouseModel.transaction_date >= date_from)
-    if date_to:
-        base_query = base_query.where(WarehouseModel.transaction_date <= date_to)
-        count_query = count_query.where(WarehouseModel.transaction_date <= date_to)
-    if commune:
-        base_query = base_query.where(WarehouseModel.commune.ilike(f"%{commune}%"))
-        count_query = count_query.where(WarehouseModel.commune.ilike(f"%{commune}%"))
+    filters = dict(
+        department=department,
+        min_price=min_price,
+        max_price=max_price,
+        min_surface=min_surface,
+        max_surface=max_surface,
+        date_from=date_from,
+        date_to=date_to,
+        commune=commune,
+    )
+    conditions = warehouse_filters(**filters)
+    base_query = select(*WAREHOUSE_COLUMNS).where(*conditions)
 
-    count_result = await session.execute(count_query)
-    total = count_result.scalar() or 0
+    if cursor is not None:
+        if offset:
+            raise HTTPException(status_code=400, detail="cursor and offset cannot be combined")
+        try:
+            after_date, after_id = decode_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        base_query = base_query.where(
+            tuple_(WarehouseModel.transaction_date, WarehouseModel.id)
+            < tuple_(after_date, after_id)
+        )
 
-    result = await session.execute(
+    # One extra row tells whether a next page exists
+    page_query = (
         base_query
-        .order_by(WarehouseModel.transaction_date.desc().nulls_last())
-        .limit(limit)
+        .order_by(WarehouseModel.transaction_date.desc().nulls_last(), WarehouseModel.id.desc())
+        .limit(limit + 1)
         .offset(offset)
     )
-    rows = result.scalars().all()
-    items = [Warehouse.model_validate(row) for row in rows]
+    if settings.count_strategy == "window" and cursor is None:
+        result = await session.execute(
+            page_query.add_columns(func.count().over().label("window_total"))
+        )
+        rows = row_dicts(result)
+        if rows:
+            total = rows[0]["window_total"]
+            for row in rows:
+                del row["window_total"]
+        else:
+            # Past the last page there is no row to read the count from
+            total = await exact_count(session, conditions) if offset else 0
+        total_exact = True
+    else:
+        total, total_exact = await count_total(
+            session,
+            settings.count_strategy,
+            conditions,
+            filters,
+            settings.count_estimate_threshold,
+        )
+        result = await session.execute(page_query)
+        rows = row_dicts(result)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["transaction_date"], rows[-1]["id"])
+
+    return FastJSONResponse(dict(
+        items=rows,
+        total=total,
+        total_exact=total_exact,
+        limit=limit,
+        offset=offset,
+        next_cursor=next_cursor,
+    ))
+
 
-    return WarehouseListResponse(
-        items=items, total=total, limit=limit, offset=offset
+# Rows fetched from the server-side cursor and encoded per response chunk
+EXPORT_BATCH_SIZE = 2000
+
+
+@router.get("/warehouses/export", response_class=StreamingResponse)
+async def export_warehouses(
+    export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    department: Optional[str] = Query(default=None),
+    min_price: Optional[float] = Query(default=None),
+    max_price: Optional[float] = Query(default=None),
+    min_surface: Optional[float] = Query(default=None),
+    max_surface: Optional[float] = Query(default=None),
+    date_from: Optional[date] = Query(default=None),
+    date_to: Optional[date] = Query(default=None),
+    commune: Optional[str] = Query(default=None),
+    sessions: async_sessionmaker[AsyncSession] = Depends(get_db_session_factory),
+):
+    """Stream every warehouse matching the list filters, as NDJSON or CSV.
+
+    Rows come in list_warehouses order from a server-side cursor,
+    EXPORT_BATCH_SIZE at a time, and are sent as a chunked response, so
+    memory use does not grow with the result. No count is run. The rows
+    are read on a session the response body opens itself: the request's
+    session may be closed before the body is sent.
+    """
+    conditions = warehouse_filters(
+        department=department,
+        min_price=min_price,
+        max_price=max_price,
+        min_surface=min_surface,
+        max_surface=max_surface,
+        date_from=date_from,
+        date_to=date_to,
+        commune=commune,
+    )
+    query = (
+        select(*WAREHOUSE_COLUMNS)
+        .where(*conditions)
+        .order_by(WarehouseModel.transaction_date.desc().nulls_last(), WarehouseModel.id.desc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    async def chunks():
+        async with sessions() as session:
+            result = await session.stream(query)
+            async for chunk in export_chunks(result, export_format):
+                yield chunk
+
+    return StreamingResponse(
+        chunks(),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="warehouses.{export_format}"'},
     )
 
 
-@router.get("/warehouses/nearby", response_model=NearbyWarehouseListResponse)
+@router.get(
+    "/warehouses/nearby",
+    response_model=NearbyWarehouseListResponse,
+    response_class=FastJSONResponse,
+)
 async def nearby_warehouses(
     lat: float = Query(..., description="Latitude of center point"),
     lng: float = Query(..., description="Longitude of center point"),
     radius_km: float = Query(
         default=50, ge=1, le=500, description="Search radius in km"
     ),
+    k: Optional[int] = Query(
+        default=None, ge=1, le=1000, description="Return only the k closest warehouses"
+    ),
+    limit: Optional[int] = Query(
+        default=None, ge=1, le=500, description="Page size; pages are walked with cursor"
+    ),
+    cursor: Optional[str] = Query(
+        default=None, description="next_cursor of the previous page"
+    ),
     session: AsyncSession = Depends(get_db_session),
+    stamp: DatasetStamp = Depends(conditional_get),
 ):
-    """Return warehouses within radius_km of the given point, sorted by distance."""
+    """Return warehouses within radius_km of the given point, sorted by distance.
+
+    Without k, limit or cursor every match is returned: the spatial index
+    finds the matching ids and only those rows are loaded. With k, or
+    limit/cursor, PostgreSQL computes the distances and returns the k
+    closest, or one page in (distance, id) order. Like list_warehouses,
+    rows are read as dicts and serialized as they are.
+    """
+    if k is not None and (limit is not None or cursor is not None):
+        raise HTTPException(status_code=400, detail="k cannot be combined with limit or cursor")
+    if k is not None or limit is not None or cursor is not None:
+        return await _nearby_by_distance(session, lat, lng, radius_km, k, limit, cursor)
+
+    grid = await spatial_index.get(session, stamp.version)
+    matches = grid.within(lat, lng, radius_km)
+
+    rows = {}
+    if matches:
+        result = await session.execute(
+            select(*WAREHOUSE_COLUMNS).where(
+                WarehouseModel.id == any_(
+                    bindparam("ids", [warehouse_id for _, warehouse_id in matches],
+                              type_=ARRAY(Uuid))
+                )
+            )
+        )
+        rows = {row["id"]: row for row in row_dicts(result)}
+
+    nearby = [
+        nearby_item(rows[warehouse_id], dist)
+        for dist, warehouse_id in matches
+        if warehouse_id in rows  # deleted since the index was built
+    ]
+
+    return FastJSONResponse(dict(
+        items=nearby,
+        total=len(nearby),
+        center_lat=lat,
+        center_lng=lng,
+        radius_km=radius_km,
+        next_cursor=None,
+    ))
+
+
+async def _nearby_by_distance(
+    session: AsyncSession,
+    lat: float,
+    lng: float,
+    radius_km: float,
+    k: Optional[int],
+    limit: Optional[int],
+    cursor: Optional[str],
+) -> FastJSONResponse:
+    """The k-nearest and paginated modes of nearby_warehouses, ordered in SQL."""
     lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+    distance = haversine_sql(lat, lng, WarehouseModel.latitude, WarehouseModel.longitude)
+    page_size = k if k is not None else limit or 20
 
-    result = await session.execute(
-        select(WarehouseModel)
+    query = (
+        select(*WAREHOUSE_COLUMNS, distance.label("distance_km"))
         .where(
             WarehouseModel.latitude.isnot(None),
             WarehouseModel.longitude.isnot(None),
@@ -132,29 +365,87 @@ async def nearby_warehouses(
             WarehouseModel.latitude <= lat_max,
             WarehouseModel.longitude >= lng_min,
             WarehouseModel.longitude <= lng_max,
+            distance <= radius_km,
         )
+        .order_by(distance, WarehouseModel.id)
     )
-    candidates = result.scalars().all()
+    if cursor is not None:
+        try:
+            after_distance, after_id = decode_distance_cursor(cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        query = query.where(tuple_(distance, WarehouseModel.id) > tuple_(after_distance, after_id))
 
-    nearby = []
-    for row in candidates:
-        dist = haversine(lat, lng, row.latitude, row.longitude)
-        if dist <= radius_km:
-            wh = Warehouse.model_validate(row)
-            nearby.append(NearbyWarehouse(**wh.model_dump(), distance_km=round(dist, 2)))
+    # For pages, one extra row tells whether a next page exists
+    result = await session.execute(query.limit(page_size if k is not None else page_size + 1))
+    rows = row_dicts(result)
 
-    nearby.sort(key=lambda w: w.distance_km)
+    next_cursor = None
+    if k is None and len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_distance_cursor(rows[-1]["distance_km"], rows[-1]["id"])
 
-    return NearbyWarehouseListResponse(
+    nearby = [nearby_item(row, row["distance_km"]) for row in rows]
+    return FastJSONResponse(dict(
         items=nearby,
         total=len(nearby),
         center_lat=lat,
         center_lng=lng,
         radius_km=radius_km,
+        next_cursor=next_cursor,
+    ))
+
+
+@router.get(
+    "/warehouses/clusters", response_model=ClusterListResponse, response_class=FastJSONResponse
+)
+async def warehouse_clusters(
+    bbox: str = Query(..., description="Viewport as west,south,east,north"),
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level"),
+    session: AsyncSession = Depends(get_db_session),
+    stamp: DatasetStamp = Depends(conditional_get),
+):
+    """Return the warehouses in a map viewport, clustered up to MAX_CLUSTER_ZOOM.
+
+    Clusters are read from a pyramid precomputed in process. Above
+    MAX_CLUSTER_ZOOM the viewport's warehouses are returned as points, at
+    most MAX_POINTS of them.
+    """
+    try:
+        west, south, east, north = parse_bbox(bbox)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if zoom <= MAX_CLUSTER_ZOOM:
+        pyramid = await cluster_pyramid.get(session, stamp.version)
+        try:
+            clusters = pyramid.clusters((west, south, east, north), zoom)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return ClusterListResponse(zoom=zoom, clusters=clusters, points=[])
+
+    result = await session.execute(
+        select(*WAREHOUSE_COLUMNS)
+        .where(
+            WarehouseModel.latitude >= south,
+            WarehouseModel.latitude <= north,
+            WarehouseModel.longitude >= west,
+            WarehouseModel.longitude <= east,
+        )
+        .order_by(WarehouseModel.transaction_date.desc().nulls_last(), WarehouseModel.id.desc())
+        .limit(MAX_POINTS + 1)
     )
+    rows = row_dicts(result)
+    return FastJSONResponse(dict(
+        zoom=zoom,
+        clusters=[],
+        points=rows[:MAX_POINTS],
+        truncated=len(rows) > MAX_POINTS,
+    ))
 
 
 @router.get("/departments", response_model=list[str])
+@response_cache.cached
 async def list_departments(
     session: AsyncSession = Depends(get_db_session),
 ):
@@ -169,6 +460,7 @@ async def list_departments(
 
 
 @router.get("/stats", response_model=StatsResponse)
+@response_cache.cached
 async def get_stats(
     session: AsyncSession = Depends(get_db_session),
 ):
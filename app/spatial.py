@@ -0,0 +1,226 @@
+"""Distance helpers and the in-process spatial index behind /nearby.
+
+haversine_sql is the SQL twin of haversine, for the k-nearest and
+paginated /nearby modes that order by distance in PostgreSQL, and
+haversine_array its NumPy twin, measuring a batch of points in one call.
+
+GridIndex buckets warehouse coordinates into CELL_DEGREES square cells
+(lat/lng degrees). A radius query visits only the cells overlapping the
+radius' bounding box and measures the points in them with
+haversine_array, so its cost follows the number of nearby warehouses
+rather than the table size.
+
+spatial_index holds the GridIndex of the current dataset_version (see
+VersionedIndex). It is built from an (id, latitude, longitude) projection
+on first use and rebuilt by the first request after an ingest bumps the
+version.
+"""
+
+import asyncio
+import math
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Generic, TypeVar
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.schemas import WarehouseModel
+
+R = TypeVar("R")
+T = TypeVar("T")
+
+EARTH_RADIUS_KM = 6371.0
+
+# About 28 km of latitude: a 50 km radius reads ~16 cells
+CELL_DEGREES = 0.25
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Calculate the great-circle distance between two points in km."""
+    lat1_r, lat2_r = math.radians(lat1), math.radians(lat2)
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+
+    a = (
+        math.sin(dlat / 2) ** 2
+        + math.cos(lat1_r) * math.cos(lat2_r) * math.sin(dlon / 2) ** 2
+    )
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def haversine_array(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """haversine from (lat, lng) to every point of the lats/lngs arrays, in km.
+
+    The same formula, vectorized with NumPy. Its results match haversine to
+    within float rounding (NumPy's sin/cos may differ from libm's in the
+    last bit).
+    """
+    lat1_r, lat2_r = math.radians(lat), np.radians(lats)
+    dlat = np.radians(lats - lat)
+    dlon = np.radians(lngs - lng)
+
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1_r) * np.cos(lat2_r) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_sql(lat: float, lng: float, latitude, longitude):
+    """haversine(lat, lng, latitude, longitude) as a SQL expression.
+
+    The operations are those of haversine, in the same order, so PostgreSQL
+    computes the same floats as Python.
+    """
+    dlat = func.radians(latitude - lat)
+    dlon = func.radians(longitude - lng)
+
+    a = (
+        func.power(func.sin(dlat / 2), 2)
+        + func.cos(func.radians(lat)) * func.cos(func.radians(latitude))
+        * func.power(func.sin(dlon / 2), 2)
+    )
+    return EARTH_RADIUS_KM * 2 * func.atan2(func.sqrt(a), func.sqrt(1 - a))
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float, float]:
+    """Return (lat_min, lat_max, lng_min, lng_max) for a bounding box around the point."""
+    delta_lat = radius_km / 111.0
+    delta_lng = radius_km / (111.0 * max(math.cos(math.radians(lat)), 1e-10))
+    return (
+        lat - delta_lat,
+        lat + delta_lat,
+        lng - delta_lng,
+        lng + delta_lng,
+    )
+
+
+class GridIndex:
+    """Points (id, latitude, longitude) bucketed by grid cell.
+
+    Coordinates are held in NumPy arrays sorted by cell, so a cell is a
+    slice of them and a query measures all its candidates in one
+    haversine_array call.
+    """
+
+    def __init__(
+        self, points: Iterable[tuple[UUID, float, float]], cell_degrees: float = CELL_DEGREES
+    ) -> None:
+        self.cell_degrees = cell_degrees
+        points = list(points)
+        self.size = len(points)
+        ids = np.empty(self.size, dtype=object)
+        ids[:] = [point[0] for point in points]
+        lats = np.fromiter((point[1] for point in points), np.float64, self.size)
+        lngs = np.fromiter((point[2] for point in points), np.float64, self.size)
+        rows = np.floor(lats / cell_degrees).astype(np.int64)
+        cols = np.floor(lngs / cell_degrees).astype(np.int64)
+
+        order = np.lexsort((cols, rows))
+        self.ids, self.lats, self.lngs = ids[order], lats[order], lngs[order]
+        rows, cols = rows[order], cols[order]
+
+        # Cell -> (start, stop) of its points in the sorted arrays
+        new_cell = np.ones(self.size, dtype=bool)
+        new_cell[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        starts = np.flatnonzero(new_cell)
+        stops = np.append(starts[1:], self.size)
+        self._cells: dict[tuple[int, int], tuple[int, int]] = {
+            (int(rows[start]), int(cols[start])): (start, stop)
+            for start, stop in zip(starts.tolist(), stops.tolist())
+        }
+
+    def _cell(self, lat: float, lng: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def _candidates(self, lat_min, lat_max, lng_min, lng_max) -> np.ndarray:
+        """Returns the positions of the points in the cells overlapping the box."""
+        row_min, col_min = self._cell(lat_min, lng_min)
+        row_max, col_max = self._cell(lat_max, lng_max)
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self._cells):
+            # Wide radius: walk the occupied cells rather than the empty ones
+            spans = [
+                span for (row, col), span in self._cells.items()
+                if row_min <= row <= row_max and col_min <= col <= col_max
+            ]
+        else:
+            spans = [
+                self._cells[row, col]
+                for row in range(row_min, row_max + 1)
+                for col in range(col_min, col_max + 1)
+                if (row, col) in self._cells
+            ]
+        if not spans:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(start, stop) for start, stop in spans])
+
+    def within(self, lat: float, lng: float, radius_km: float) -> list[tuple[float, UUID]]:
+        """Returns (distance_km, id) of the points within radius_km, closest first.
+
+        Matches the former SQL bounding box plus haversine filter.
+        """
+        lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+        positions = self._candidates(lat_min, lat_max, lng_min, lng_max)
+        lats, lngs = self.lats[positions], self.lngs[positions]
+        in_box = (lats >= lat_min) & (lats <= lat_max) & (lngs >= lng_min) & (lngs <= lng_max)
+        positions, lats, lngs = positions[in_box], lats[in_box], lngs[in_box]
+
+        distances = haversine_array(lat, lng, lats, lngs)
+        in_radius = distances <= radius_km
+        distances, positions = distances[in_radius], positions[in_radius]
+        order = np.argsort(distances, kind="stable")
+        return list(zip(distances[order].tolist(), self.ids[positions[order]].tolist()))
+
+
+class VersionedIndex(Generic[R, T]):
+    """An in-process index loaded from the database for one dataset_version.
+
+    `query` reads the index's rows on the request's session; `build` turns
+    them into the index in a worker thread, so other requests are served
+    while it runs.
+    """
+
+    def __init__(
+        self, query: Callable[[AsyncSession], Awaitable[R]], build: Callable[[R], T]
+    ) -> None:
+        self._query = query
+        self._build = build
+        self._index: T | None = None
+        self._version: int | None = None
+        self._lock = asyncio.Lock()
+
+    def _stale(self, version: int) -> bool:
+        return self._version is None or self._version < version
+
+    async def get(self, session: AsyncSession, version: int) -> T:
+        """Returns the index, reloading it first if it predates `version`.
+
+        `version` is the request's dataset_version, i.e. the stamp
+        conditional_get already read. Concurrent requests seeing a new
+        version wait for one of them to reload it; if that one is
+        cancelled, the next waiter reloads.
+        """
+        if self._stale(version):
+            async with self._lock:
+                if self._stale(version):
+                    rows = await self._query(session)
+                    index = await asyncio.get_running_loop().run_in_executor(
+                        None, self._build, rows
+                    )
+                    self._index, self._version = index, version
+        return self._index
+
+    def clear(self) -> None:
+        self._index = self._version = None
+        # A lock may be bound to the event loop of the requests that used it
+        self._lock = asyncio.Lock()
+
+
+async def query_grid(session: AsyncSession) -> list[tuple[UUID, float, float]]:
+    result = await session.execute(
+        select(WarehouseModel.id, WarehouseModel.latitude, WarehouseModel.longitude)
+        .where(WarehouseModel.latitude.isnot(None), WarehouseModel.longitude.isnot(None))
+    )
+    return result.all()
+
+
+spatial_index = VersionedIndex(query_grid, GridIndex)
@@ -0,0 +1,106 @@
+"""Load test: a burst of identical requests with and without coalescing.
+
+Sends 200 concurrent GETs of one cached endpoint to the API app in process
+(no server or network), on an empty response cache, as every dashboard tab
+does after a deploy. With coalescing one request runs the endpoint's
+queries and the others await its result or, once it is cached, read the
+cached body. The independent run also holds nothing in the response
+cache, so every request runs them. Reported per mode:
+
+    queries        statements run, besides the reads of the version row
+    peak           most pool connections checked out at once
+    coalesced      requests that awaited another's endpoint call
+    cache hits     requests served from the response cache
+    version reads  reads of the version row, also coalesced
+    seconds        until the last response
+
+Reads the data already in DATABASE_URL and writes nothing.
+
+Usage:
+    python -m benchmarks.bench_coalescing --requests 200 --url /api/stats
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+from sqlalchemy import event
+
+from app.caching import response_cache, stamp_reads
+from app.db import get_engine
+from app.main import app
+
+
+class PoolUsage:
+    """Counts the engine's checked-out connections and its statements."""
+
+    def __init__(self) -> None:
+        self.checked_out = self.peak = self.queries = 0
+
+    def checkout(self, *args) -> None:
+        self.checked_out += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def checkin(self, *args) -> None:
+        self.checked_out -= 1
+
+    def execute(self, conn, cursor, statement, *args) -> None:
+        if not statement.startswith("SELECT dataset_version.version"):
+            self.queries += 1
+
+
+async def _burst(client: httpx.AsyncClient, url: str, requests: int) -> float:
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(client.get(url) for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    for response in responses:
+        response.raise_for_status()
+    if len({response.content for response in responses}) != 1:
+        raise SystemExit("Responses of the burst differ")
+    return elapsed
+
+
+async def _bench(url: str, requests: int) -> None:
+    engine = get_engine().sync_engine
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        pool = engine.pool
+        print(f"{requests} concurrent GET {url}; pool of {pool.size()} + {pool._max_overflow}")
+        print(f"{'mode':<12} {'queries':>8} {'peak':>6} {'coalesced':>10} "
+              f"{'cache hits':>11} {'version reads':>14} {'seconds':>9}")
+        maxsize = response_cache.maxsize
+        for coalesce in (False, True):
+            usage = PoolUsage()
+            event.listen(pool, "checkout", usage.checkout)
+            event.listen(pool, "checkin", usage.checkin)
+            event.listen(engine, "before_cursor_execute", usage.execute)
+            response_cache.clear()
+            response_cache.flights.enabled = stamp_reads.enabled = coalesce
+            # Requests queued for a connection would otherwise hit the body
+            # cached by the first one to finish
+            response_cache.maxsize = maxsize if coalesce else 0
+            stamp_reads.coalesced = 0
+            try:
+                seconds = await _burst(client, url, requests)
+            finally:
+                response_cache.maxsize = maxsize
+                event.remove(pool, "checkout", usage.checkout)
+                event.remove(pool, "checkin", usage.checkin)
+                event.remove(engine, "before_cursor_execute", usage.execute)
+            mode = "coalesced" if coalesce else "independent"
+            stats = response_cache.stats()
+            print(f"{mode:<12} {usage.queries:>8} {usage.peak:>6} {stats['coalesced']:>10} "
+                  f"{stats['hits']:>11} {requests - stamp_reads.coalesced:>14} {seconds:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Burst identical requests at one endpoint.")
+    parser.add_argument("--url", default="/api/stats")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(_bench(args.url, args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Micro-benchmark: scalar haversine loop vs the vectorized haversine_array.
+
+Generates synthetic candidate points around Paris (100,000 by default),
+then filters them to a radius both ways, as /nearby does with the
+candidates of its grid cells:
+
+    scalar  haversine() called per point in a Python loop
+    array   one haversine_array() call over the coordinate arrays
+
+Both must keep the same points. No database needed.
+
+Usage:
+    python -m benchmarks.bench_distance --points 100000 --radius-km 100
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.spatial import haversine, haversine_array
+
+CENTER = (48.8566, 2.3522)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the scalar and array distance kernels.")
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--radius-km", type=float, default=100.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    lats = [CENTER[0] + rng.uniform(-2, 2) for _ in range(args.points)]
+    lngs = [CENTER[1] + rng.uniform(-3, 3) for _ in range(args.points)]
+    lat_array, lng_array = np.array(lats), np.array(lngs)
+
+    def scalar() -> list[int]:
+        kept = []
+        for i, (lat, lng) in enumerate(zip(lats, lngs)):
+            if haversine(*CENTER, lat, lng) <= args.radius_km:
+                kept.append(i)
+        return kept
+
+    def vectorized() -> list[int]:
+        distances = haversine_array(*CENTER, lat_array, lng_array)
+        return np.flatnonzero(distances <= args.radius_km).tolist()
+
+    results = {}
+    print(f"{'kernel':<8} {'ms':>10} {'points/sec':>14} {'kept':>8}")
+    for name, kernel in (("scalar", scalar), ("array", vectorized)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            kept = kernel()
+            best = min(best, time.perf_counter() - started)
+        results[name] = (best, kept)
+        print(f"{name:<8} {best * 1000:>10.2f} {args.points / best:>14,.0f} {len(kept):>8}")
+
+    if results["scalar"][1] != results["array"][1]:
+        raise SystemExit("Parity check failed: kernels kept different points")
+    print(f"Parity check passed; array is {results['scalar'][0] / results['array'][0]:.0f}x faster.")
+
+
+if __name__ == "__main__":
+    main()
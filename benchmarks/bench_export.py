@@ -0,0 +1,120 @@
+"""Benchmark: streaming export vs walking the list endpoint page by page.
+
+For growing date ranges of the data already in DATABASE_URL, reads every
+matching warehouse two ways through the API app in process:
+
+    export  one GET /api/warehouses/export (NDJSON), streamed from a
+            server-side cursor
+    pages   GET /api/warehouses 100 rows at a time, following next_cursor,
+            as the valuation jobs did (each page also counts the total)
+
+and reports the rows, megabytes, seconds and peak Python memory
+(tracemalloc) of each. The export's peak should not grow with the rows.
+
+The app is called directly rather than through an HTTP client, whose ASGI
+transport would buffer the whole body; chunks are counted and dropped.
+
+Usage:
+    python -m benchmarks.bench_export --date-from 2024-12-01 2024-10-01
+    python -m benchmarks.bench_export --date-from 2024-01-01 --skip-pages
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from app.main import app
+
+
+async def _get(path: str, params: dict, keep_body: bool = False) -> tuple[int, int, bytes]:
+    """Runs one GET through the app; returns (bytes, lines, body if keep_body)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "server": ("bench", 80), "client": ("bench", 1),
+        "root_path": "", "path": path, "raw_path": path.encode(),
+        "query_string": urlencode(params).encode(), "headers": [],
+    }
+    size = lines = 0
+    body = []
+    requested, done = False, asyncio.Event()
+
+    async def receive():
+        # The request, then a disconnect once the response is complete
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size, lines
+        if message["type"] == "http.response.start" and message["status"] != 200:
+            raise RuntimeError(f"GET {path} returned {message['status']}")
+        if message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            size, lines = size + len(chunk), lines + chunk.count(b"\n")
+            if keep_body:
+                body.append(chunk)
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return size, lines, b"".join(body)
+
+
+async def _export(date_from: str) -> tuple[int, int]:
+    """Returns (rows, bytes) of one NDJSON export."""
+    size, lines, _ = await _get("/api/warehouses/export", {"date_from": date_from})
+    return lines, size
+
+
+async def _pages(date_from: str) -> tuple[int, int]:
+    """Returns (rows, bytes) of walking the list endpoint by cursor."""
+    params = {"date_from": date_from, "limit": 100}
+    rows = total_size = 0
+    while True:
+        size, _, body = await _get("/api/warehouses", params, keep_body=True)
+        page = json.loads(body)
+        rows, total_size = rows + len(page["items"]), total_size + size
+        if page["next_cursor"] is None:
+            return rows, total_size
+        params["cursor"] = page["next_cursor"]
+
+
+async def _bench(dates: list[str], skip_pages: bool) -> None:
+    modes = {"export": _export} if skip_pages else {"export": _export, "pages": _pages}
+    print(f"{'date_from':<12} {'mode':<7} {'rows':>9} {'MB':>8} {'seconds':>9} {'peak MiB':>9}")
+    tracemalloc.start()
+    try:
+        for date_from in dates:
+            counts = set()
+            for name, read in modes.items():
+                tracemalloc.reset_peak()
+                started = time.perf_counter()
+                rows, size = await read(date_from)
+                seconds = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                counts.add(rows)
+                print(f"{date_from:<12} {name:<7} {rows:>9} {size / 1e6:>8.1f} "
+                      f"{seconds:>9.2f} {peak:>9.1f}")
+            if len(counts) != 1:
+                raise SystemExit(f"Modes read different row counts from {date_from}: {counts}")
+    finally:
+        tracemalloc.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the export with cursor pages.")
+    parser.add_argument("--date-from", nargs="+", default=["2024-12-01", "2024-10-01"])
+    parser.add_argument("--skip-pages", action="store_true", help="measure the export only")
+    args = parser.parse_args()
+    asyncio.run(_bench(args.date_from, args.skip_pages))
+
+
+if __name__ == "__main__":
+    main()
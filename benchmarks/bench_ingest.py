@@ -0,0 +1,205 @@
+"""Benchmark: per-stage throughput of the ingestion pipeline.
+
+Generates a deterministic DVF-shaped .csv.gz of the requested size and
+warehouse ratio, then runs it through the stages of the default
+(buffered) ingest path, timing each one:
+
+    download  download_dvf from a file:// URL, which decompresses the file
+    parse     csv.DictReader over the decompressed CSV
+    filter    filter_warehouses
+    insert    the --loader writer (only with --insert)
+
+Each stage reports wall time, rows/sec and the peak RSS reached while it
+ran. The result is printed as JSON (or written to --output), tagged with
+the current git commit. --baseline compares it with an earlier result
+and exits non-zero if a stage's throughput dropped by more than
+--tolerance.
+
+--insert requires a reachable PostgreSQL via DATABASE_URL. Generated rows
+carry a "bench-ingest-" mutation id and are deleted after each run.
+
+Usage:
+    python -m benchmarks.bench_ingest --rows 500000 --output ingest.json
+    python -m benchmarks.bench_ingest --rows 500000 --baseline ingest.json
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from benchmarks.bench_loaders import _cleanup
+from benchmarks.synthetic import write_dvf_gzip
+from scripts.ingest_dvf import (
+    LOADERS,
+    download_dvf,
+    filter_warehouses,
+    peak_rss_mb,
+    reset_peak_rss,
+)
+
+DEPARTMENT = "77"
+# Mutation id prefix of generated rows, used to delete them after --insert
+PREFIX = "bench-ingest"
+STAGES = ("download", "parse", "filter", "insert")
+
+
+def _timed(fn: Callable, *args) -> tuple[object, float, float]:
+    """Runs fn(*args) and returns (result, seconds, peak RSS in MB while it ran)."""
+    reset_peak_rss()
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started, peak_rss_mb()
+
+
+def _stage(seconds: float, rows: int, peak: float, **extra) -> dict:
+    return {
+        "seconds": round(seconds, 4),
+        "rows": rows,
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else None,
+        "peak_rss_mb": round(peak, 1),
+        **extra,
+    }
+
+
+def _parse(csv_path: Path) -> list[dict]:
+    with open(csv_path, "r", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+async def _load(loader: str, warehouses: list[dict]) -> int:
+    async with LOADERS[loader]() as writer:
+        return await writer.write(warehouses)
+
+
+def run_pipeline(gz_path: Path, loader: str | None = None) -> dict[str, dict]:
+    """Runs each ingest stage once over `gz_path` and returns the per-stage figures.
+
+    The file must be named after DEPARTMENT, e.g. 77.csv.gz, since it is
+    fetched through a file:// URL template. The insert stage only runs if
+    `loader` is given; rows with the PREFIX mutation id are deleted after it.
+    """
+    stages = {}
+    url_template = f"{gz_path.parent.as_uri()}/{{dept}}.csv.gz"
+    csv_path, seconds, peak = _timed(download_dvf, DEPARTMENT, url_template)
+    try:
+        rows, parse_seconds, parse_peak = _timed(_parse, csv_path)
+        stages["download"] = _stage(
+            seconds, len(rows), peak,
+            bytes_in=gz_path.stat().st_size, bytes_out=csv_path.stat().st_size,
+        )
+        stages["parse"] = _stage(parse_seconds, len(rows), parse_peak)
+    finally:
+        csv_path.unlink(missing_ok=True)
+
+    warehouses, seconds, peak = _timed(filter_warehouses, rows)
+    stages["filter"] = _stage(seconds, len(rows), peak, kept=len(warehouses))
+    del rows
+
+    if loader is not None:
+        try:
+            inserted, seconds, peak = _timed(asyncio.run, _load(loader, warehouses))
+        finally:
+            asyncio.run(_cleanup(PREFIX))
+        stages["insert"] = _stage(seconds, len(warehouses), peak, inserted=inserted)
+    return stages
+
+
+def _best(runs: list[dict[str, dict]]) -> dict[str, dict]:
+    """Per stage, the fastest run's figures with the highest peak RSS seen."""
+    best = {}
+    for stage in STAGES:
+        measured = [run[stage] for run in runs if stage in run]
+        if measured:
+            fastest = min(measured, key=lambda m: m["seconds"])
+            best[stage] = {**fastest, "peak_rss_mb": max(m["peak_rss_mb"] for m in measured)}
+    return best
+
+
+def _git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Returns the stages whose rows/sec fell more than `tolerance` below baseline."""
+    regressions = []
+    for stage, current in result["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or not previous.get("rows_per_sec") or not current["rows_per_sec"]:
+            continue
+        ratio = current["rows_per_sec"] / previous["rows_per_sec"]
+        print(f"{stage:<9} {previous['rows_per_sec']:>12,} -> {current['rows_per_sec']:>12,} "
+              f"rows/sec ({ratio - 1:+.1%})", file=sys.stderr)
+        if ratio < 1 - tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time each stage of the ingestion pipeline.")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--warehouse-ratio", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--insert", action="store_true", help="Also time the database insert.")
+    parser.add_argument("--loader", choices=sorted(LOADERS), default="insert")
+    parser.add_argument("--output", type=Path, default=None, help="Write JSON here instead of stdout.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier JSON result to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed rows/sec drop against --baseline. Default: 0.2 (20%%).")
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        gz_path = Path(tmp) / f"{DEPARTMENT}.csv.gz"
+        print(f"Generating {args.rows} rows...", file=sys.stderr)
+        write_dvf_gzip(gz_path, args.rows, args.warehouse_ratio, args.seed, DEPARTMENT, PREFIX)
+        for i in range(args.repeat):
+            print(f"Run {i + 1}/{args.repeat}...", file=sys.stderr)
+            runs.append(run_pipeline(gz_path, args.loader if args.insert else None))
+
+    result = {
+        "benchmark": "ingest",
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "params": {
+            "rows": args.rows,
+            "warehouse_ratio": args.warehouse_ratio,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "loader": args.loader if args.insert else None,
+        },
+        "stages": _best(runs),
+    }
+    output = json.dumps(result, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+
+    if baseline is not None:
+        if baseline.get("params") != result["params"]:
+            print("Warning: baseline was run with different parameters", file=sys.stderr)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            raise SystemExit(f"Throughput regression in: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
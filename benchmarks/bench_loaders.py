@@ -0,0 +1,77 @@
+"""Benchmark: batched INSERT path vs COPY loader.
+
+Loads the same synthetic warehouses through _insert_to_db (the default
+`--loader insert` path) and through CopyWarehouseWriter, and reports
+wall time and rows/sec for each.
+
+Requires a reachable PostgreSQL via DATABASE_URL. Benchmark rows are
+tagged with a per-run prefix and deleted afterwards, so existing data
+is left untouched.
+
+Usage:
+    python -m benchmarks.bench_loaders --rows 50000 --repeat 3
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import get_settings
+from app.models.schemas import WarehouseModel
+from benchmarks.synthetic import make_warehouses
+from scripts.ingest_dvf import CopyWarehouseWriter, _insert_to_db
+from scripts.summaries import refresh_summaries, summary_department
+
+
+async def _cleanup(prefix: str) -> None:
+    """Deletes the rows tagged with `prefix` and re-aggregates their departments."""
+    engine = create_async_engine(get_settings().async_database_url)
+    async with engine.begin() as conn:
+        deleted = await conn.execute(
+            delete(WarehouseModel)
+            .where(WarehouseModel.dvf_mutation_id.like(f"{prefix}-%"))
+            .returning(WarehouseModel.department)
+        )
+        await refresh_summaries(conn, {summary_department(dept) for (dept,) in deleted.all()})
+    await engine.dispose()
+
+
+async def _copy_to_db(warehouses: list[dict]) -> int:
+    async with CopyWarehouseWriter() as writer:
+        return await writer.write(warehouses)
+
+
+async def _bench(rows: int, repeat: int) -> None:
+    loaders = {"insert": _insert_to_db, "copy": _copy_to_db}
+    print(f"Loading {rows} synthetic warehouses, best of {repeat}")
+    print(f"{'loader':<8} {'seconds':>10} {'rows/sec':>12}")
+    for name, load in loaders.items():
+        best = float("inf")
+        for _ in range(repeat):
+            prefix = f"bench-{name}-{uuid.uuid4().hex[:8]}"
+            warehouses = make_warehouses(rows, seed=0, prefix=prefix)
+            try:
+                started = time.perf_counter()
+                inserted = await load(warehouses)
+                best = min(best, time.perf_counter() - started)
+            finally:
+                await _cleanup(prefix)
+            if inserted != rows:
+                raise RuntimeError(f"{name} inserted {inserted} of {rows} rows")
+        print(f"{name:<8} {best:>10.3f} {rows / best:>12,.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the INSERT and COPY loaders.")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(_bench(args.rows, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark: deep page latency of GET /api/warehouses, offset vs cursor.
+
+Loads synthetic warehouses, then requests the same page (page 1000 by
+default) through the API both ways and reports the median latency:
+
+    offset  ?offset=(page - 1) * limit, which reads and discards every
+            earlier row
+    cursor  ?cursor=<next_cursor of the page before>, which seeks the
+            (transaction_date, id) index
+
+Both include the COUNT(*) behind `total`, which costs the same in each
+mode. The cursor is taken from the previous page fetched by offset, so
+no page walk is needed, and both modes must return the same items.
+
+Requires a reachable PostgreSQL via DATABASE_URL. Generated rows carry a
+"bench-pagination-" mutation id and are deleted afterwards.
+
+Usage:
+    python -m benchmarks.bench_pagination --rows 100000 --page 1000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from benchmarks.bench_loaders import _cleanup
+from benchmarks.synthetic import make_warehouses
+from scripts.ingest_dvf import CopyWarehouseWriter
+
+PREFIX = "bench-pagination"
+
+
+async def _seed(rows: int) -> None:
+    async with CopyWarehouseWriter() as writer:
+        await writer.write(make_warehouses(rows, seed=0, prefix=PREFIX))
+
+
+def _median_ms(client: TestClient, params: dict, repeat: int) -> tuple[float, dict]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get("/api/warehouses", params=params)
+        timings.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return statistics.median(timings) * 1000, response.json()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare offset and cursor pagination.")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Loading {args.rows} synthetic warehouses...")
+    asyncio.run(_seed(args.rows))
+    try:
+        with TestClient(app) as client:
+            previous = client.get(
+                "/api/warehouses",
+                params={"limit": args.limit, "offset": (args.page - 2) * args.limit},
+            ).json()
+            if previous["next_cursor"] is None:
+                raise SystemExit(f"Only {previous['total']} rows: page {args.page} is empty")
+
+            offset_ms, by_offset = _median_ms(
+                client, {"limit": args.limit, "offset": (args.page - 1) * args.limit}, args.repeat
+            )
+            cursor_ms, by_cursor = _median_ms(
+                client, {"limit": args.limit, "cursor": previous["next_cursor"]}, args.repeat
+            )
+    finally:
+        asyncio.run(_cleanup(PREFIX))
+
+    if by_offset["items"] != by_cursor["items"]:
+        raise SystemExit("Parity check failed: offset and cursor pages differ")
+    print(f"Page {args.page} of {args.limit} rows, {by_offset['total']} rows in total, "
+          f"median of {args.repeat}")
+    print(f"{'mode':<8} {'ms':>10}")
+    print(f"{'offset':<8} {offset_ms:>10.2f}")
+    print(f"{'cursor':<8} {cursor_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: cold vs warm latency of the endpoints behind the response cache.
+
+Requests every cached endpoint through the API app in process (no server
+or network):
+
+    cold  the response cache is cleared before each request, so the
+          endpoint queries the database and serializes its answer
+    warm  the same request answered from the cache; only the version row
+          is read
+
+Reads the data already in DATABASE_URL and writes nothing, so run it after
+an ingest.
+
+Usage:
+    python -m benchmarks.bench_response_cache --repeat 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.caching import response_cache
+from app.main import app
+
+ENDPOINTS = [
+    "/api/stats",
+    "/api/departments",
+    "/api/analytics/price-per-m2",
+    "/api/analytics/by-department",
+    "/api/analytics/price-trends",
+    "/api/analytics/top-communes",
+    "/api/analytics/department-stats",
+]
+
+
+async def _timed_get(client: httpx.AsyncClient, url: str) -> float:
+    started = time.perf_counter()
+    response = await client.get(url)
+    elapsed = time.perf_counter() - started
+    response.raise_for_status()
+    return elapsed
+
+
+async def _bench(repeat: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/stats")  # open the pool's first connection
+        print(f"Median of {repeat}")
+        print(f"{'endpoint':<34} {'cold ms':>10} {'warm ms':>10} {'speedup':>9}")
+        for url in ENDPOINTS:
+            cold = []
+            for _ in range(repeat):
+                response_cache.clear()
+                cold.append(await _timed_get(client, url))
+            warm = [await _timed_get(client, url) for _ in range(repeat)]
+            cold_ms, warm_ms = statistics.median(cold) * 1000, statistics.median(warm) * 1000
+            print(f"{url:<34} {cold_ms:>10.2f} {warm_ms:>10.2f} {cold_ms / warm_ms:>8.0f}x")
+    print(f"Counters of the last endpoint: {response_cache.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare cold and warm cached endpoints.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(_bench(args.repeat))
+
+
+if __name__ == "__main__":
+    main()
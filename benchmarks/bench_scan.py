@@ -0,0 +1,48 @@
+"""Micro-benchmark: DictReader + filter_warehouses vs the fast scan path.
+
+Generates a DVF-shaped .csv.gz (one million rows by default), then
+times both readers over it and checks they keep the same warehouses.
+
+Usage:
+    python -m benchmarks.bench_scan --rows 1000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import write_dvf_gzip
+from scripts.ingest_dvf import parse_dvf_file
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the DictReader and fast-scan paths.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--warehouse-ratio", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gz_path = Path(tmp) / "dvf.csv.gz"
+        print(f"Generating {args.rows} rows...")
+        write_dvf_gzip(gz_path, args.rows, args.warehouse_ratio)
+
+        results = {}
+        print(f"{'scanner':<8} {'seconds':>10} {'rows/sec':>12} {'kept':>8}")
+        for name, fast_scan in (("dict", False), ("fast", True)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                scanned, warehouses = parse_dvf_file(gz_path, fast_scan=fast_scan)
+                best = min(best, time.perf_counter() - started)
+            results[name] = warehouses
+            print(f"{name:<8} {best:>10.3f} {scanned / best:>12,.0f} {len(warehouses):>8}")
+
+    if results["dict"] != results["fast"]:
+        raise SystemExit("Parity check failed: scanners kept different warehouses")
+    print("Parity check passed.")
+
+
+if __name__ == "__main__":
+    main()
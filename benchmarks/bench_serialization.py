@@ -0,0 +1,118 @@
+"""Benchmark: ORM + Pydantic vs Core projection + orjson for warehouse payloads.
+
+Loads synthetic warehouses, then builds a /nearby-shaped response of 100
+and 5,000 rows both ways and reports the median time of each step:
+
+    orm   full WarehouseModel entities; Warehouse.model_validate,
+          model_dump and NearbyWarehouse per row, then the response model
+          serialized by Pydantic (the former read path)
+    core  the WAREHOUSE_COLUMNS projection read by row_dicts; the plain
+          dicts serialized by FastJSONResponse (orjson), as the endpoints now do
+
+`load` is the query and row construction, `serialize` builds the payload
+and renders the JSON bytes. Both must produce the same JSON document.
+
+Requires a reachable PostgreSQL via DATABASE_URL. Generated rows carry a
+"bench-serialization-" mutation id and are deleted afterwards.
+
+Usage:
+    python -m benchmarks.bench_serialization --sizes 100 5000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.config import get_settings
+from app.models.schemas import (
+    WAREHOUSE_COLUMNS,
+    NearbyWarehouse,
+    NearbyWarehouseListResponse,
+    Warehouse,
+    WarehouseModel,
+)
+from app.responses import FastJSONResponse, row_dicts
+from app.routers.warehouses import nearby_item
+from benchmarks.bench_loaders import _cleanup
+from benchmarks.synthetic import make_warehouses
+from scripts.ingest_dvf import CopyWarehouseWriter
+
+PREFIX = "bench-serialization"
+ENVELOPE = dict(center_lat=48.8566, center_lng=2.3522, radius_km=500.0)
+
+
+async def _seed(rows: int) -> None:
+    async with CopyWarehouseWriter() as writer:
+        await writer.write(make_warehouses(rows, seed=0, prefix=PREFIX))
+
+
+def orm_payload(rows: list[WarehouseModel]) -> bytes:
+    items = [
+        NearbyWarehouse(**Warehouse.model_validate(row).model_dump(), distance_km=1.0)
+        for row in rows
+    ]
+    response = NearbyWarehouseListResponse(items=items, total=len(items), **ENVELOPE)
+    return response.model_dump_json().encode()
+
+
+def core_payload(rows: list[dict]) -> bytes:
+    items = [nearby_item(row, 1.0) for row in rows]
+    return FastJSONResponse(
+        dict(items=items, total=len(items), next_cursor=None, **ENVELOPE)
+    ).body
+
+
+async def _measure(size: int, repeat: int) -> dict[str, tuple[float, float, bytes]]:
+    order = (WarehouseModel.dvf_mutation_id,)
+    where = WarehouseModel.dvf_mutation_id.like(f"{PREFIX}-%")
+    engine = create_async_engine(get_settings().async_database_url)
+    results = {}
+    for name, query, read, build in (
+        ("orm", select(WarehouseModel), lambda r: r.scalars().all(), orm_payload),
+        ("core", select(*WAREHOUSE_COLUMNS), row_dicts, core_payload),
+    ):
+        loads, serializes = [], []
+        for _ in range(repeat):
+            async with AsyncSession(engine) as session:
+                started = time.perf_counter()
+                rows = read(await session.execute(query.where(where).order_by(*order).limit(size)))
+                loaded = time.perf_counter()
+                body = build(rows)
+                loads.append(loaded - started)
+                serializes.append(time.perf_counter() - loaded)
+        results[name] = (statistics.median(loads) * 1000, statistics.median(serializes) * 1000, body)
+    await engine.dispose()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the ORM and Core read paths.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Loading {max(args.sizes)} synthetic warehouses...")
+    asyncio.run(_seed(max(args.sizes)))
+    try:
+        measurements = {size: asyncio.run(_measure(size, args.repeat)) for size in args.sizes}
+    finally:
+        asyncio.run(_cleanup(PREFIX))
+
+    print(f"Median of {args.repeat}")
+    print(f"{'rows':>6} {'path':<6} {'load ms':>10} {'serialize ms':>14} {'total ms':>10}")
+    for size, results in measurements.items():
+        for name, (load_ms, serialize_ms, _) in results.items():
+            print(f"{size:>6} {name:<6} {load_ms:>10.2f} {serialize_ms:>14.2f} "
+                  f"{load_ms + serialize_ms:>10.2f}")
+        if json.loads(results["orm"][2]) != json.loads(results["core"][2]):
+            raise SystemExit(f"Parity check failed: payloads of {size} rows differ")
+    print("Parity check passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Deterministic synthetic data for ingestion benchmarks."""
+
+import csv
+import gzip
+import random
+from collections.abc import Iterator
+from datetime import date, timedelta
+from pathlib import Path
+
+from scripts.ingest_dvf import (
+    ALL_DEPARTMENTS,
+    MIN_SURFACE_M2,
+    WAREHOUSE_TYPE,
+    content_hash,
+)
+
+# Column layout of the geo-dvf per-department CSV files
+DVF_COLUMNS = [
+    "id_mutation", "date_mutation", "numero_disposition", "nature_mutation",
+    "valeur_fonciere", "adresse_numero", "adresse_suffixe", "adresse_nom_voie",
+    "adresse_code_voie", "code_postal", "code_commune", "nom_commune",
+    "code_departement", "ancien_code_commune", "ancien_nom_commune", "id_parcelle",
+    "ancien_id_parcelle", "numero_volume", "lot1_numero", "lot1_surface_carrez",
+    "lot2_numero", "lot2_surface_carrez", "lot3_numero", "lot3_surface_carrez",
+    "lot4_numero", "lot4_surface_carrez", "lot5_numero", "lot5_surface_carrez",
+    "nombre_lots", "code_type_local", "type_local", "surface_reelle_bati",
+    "nombre_pieces_principales", "code_nature_culture", "nature_culture",
+    "code_nature_culture_speciale", "nature_culture_speciale", "surface_terrain",
+    "longitude", "latitude",
+]
+
+# (code_type_local, type_local, share of non-warehouse rows)
+_OTHER_TYPES = [
+    ("1", "Maison", 0.45),
+    ("2", "Appartement", 0.35),
+    ("3", "Dépendance", 0.15),
+    ("4", WAREHOUSE_TYPE, 0.05),  # commercial premises below MIN_SURFACE_M2
+]
+
+
+def make_warehouses(count: int, seed: int = 0, prefix: str = "bench") -> list[dict]:
+    """Returns `count` parsed warehouse records shaped like parse_row output.
+
+    The same seed always yields the same records; `prefix` namespaces the
+    dvf_mutation_id values so benchmark rows can be deleted afterwards.
+    """
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    warehouses = []
+    for i in range(count):
+        department = rng.choice(ALL_DEPARTMENTS)
+        warehouse = {
+            "dvf_mutation_id": f"{prefix}-{i}",
+            "address": f"{rng.randint(1, 200)} Rue de l'Industrie",
+            "postal_code": f"{department[:2]}{rng.randint(0, 999):03d}",
+            "commune": f"Commune {rng.randint(1, 500)}",
+            "department": department,
+            "surface_m2": round(rng.uniform(10_000, 80_000), 1),
+            "price_eur": round(rng.uniform(500_000, 40_000_000), 2),
+            "transaction_date": start + timedelta(days=rng.randint(0, 365)),
+            "latitude": round(rng.uniform(42.3, 51.0), 6),
+            "longitude": round(rng.uniform(-4.8, 8.2), 6),
+            "property_type": WAREHOUSE_TYPE,
+        }
+        warehouse["content_hash"] = content_hash(warehouse)
+        warehouses.append(warehouse)
+    return warehouses
+
+
+def iter_dvf_rows(
+    count: int,
+    warehouse_ratio: float = 0.001,
+    seed: int = 0,
+    department: str = "77",
+    prefix: str = "2024",
+) -> Iterator[list[str]]:
+    """Yields `count` DVF-shaped rows as lists of strings, in DVF_COLUMNS order.
+
+    About `warehouse_ratio` of the rows pass the ingest filters; the rest
+    are houses, flats, outbuildings and small commercial premises.
+    Mutation ids are `{prefix}-{i}`.
+    """
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    codes, types, weights = zip(*_OTHER_TYPES)
+    for i in range(count):
+        if rng.random() < warehouse_ratio:
+            code, type_local = "4", WAREHOUSE_TYPE
+            surface = rng.randint(MIN_SURFACE_M2, 80_000)
+            price = rng.randint(500_000, 40_000_000)
+        else:
+            idx = rng.choices(range(len(codes)), weights)[0]
+            code, type_local = codes[idx], types[idx]
+            surface = rng.randint(15, MIN_SURFACE_M2 - 1) if code == "4" else rng.randint(15, 250)
+            price = rng.randint(50_000, 900_000)
+        row = dict.fromkeys(DVF_COLUMNS, "")
+        row.update({
+            "id_mutation": f"{prefix}-{i}",
+            "date_mutation": (start + timedelta(days=rng.randint(0, 365))).isoformat(),
+            "numero_disposition": "000001",
+            "nature_mutation": "Vente",
+            "valeur_fonciere": f"{price}.00",
+            "adresse_numero": str(rng.randint(1, 200)),
+            "adresse_nom_voie": "RUE DE LA GARE",
+            "adresse_code_voie": f"{rng.randint(0, 9999):04d}",
+            "code_postal": f"{department[:2]}{rng.randint(0, 999):03d}",
+            "code_commune": f"{department[:2]}{rng.randint(1, 500):03d}",
+            "nom_commune": f"Commune {rng.randint(1, 500)}",
+            "code_departement": department,
+            "id_parcelle": f"{department}000AB{rng.randint(1, 9999):04d}",
+            "nombre_lots": "0",
+            "code_type_local": code,
+            "type_local": type_local,
+            "surface_reelle_bati": str(surface),
+            "nombre_pieces_principales": str(rng.randint(0, 8)),
+            "code_nature_culture": "S",
+            "nature_culture": "sols",
+            "surface_terrain": str(rng.randint(50, 5000)),
+            "longitude": f"{rng.uniform(-4.8, 8.2):.6f}",
+            "latitude": f"{rng.uniform(42.3, 51.0):.6f}",
+        })
+        yield [row[col] for col in DVF_COLUMNS]
+
+
+def write_dvf_gzip(
+    path: Path,
+    count: int,
+    warehouse_ratio: float = 0.001,
+    seed: int = 0,
+    department: str = "77",
+    prefix: str = "2024",
+) -> Path:
+    """Writes a deterministic DVF-shaped .csv.gz file and returns its path."""
+    with gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6) as f:
+        writer = csv.writer(f)
+        writer.writerow(DVF_COLUMNS)
+        writer.writerows(iter_dvf_rows(count, warehouse_ratio, seed, department, prefix))
+    return Path(path)
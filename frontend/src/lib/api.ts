@@ -1,6 +1,7 @@
 import {
   WarehouseListResponse,
   NearbyWarehouseListResponse,
+  ClusterListResponse,
   StatsResponse,
   WarehouseFilters,
   DepartmentHeatmapStatsResponse,
@@ -64,6 +65,18 @@ export async function fetchNearbyWarehouses(
   return res.json();
 }
 
+export async function fetchClusters(
+  bbox: string,
+  zoom: number
+): Promise<ClusterListResponse> {
+  const params = new URLSearchParams({ bbox, zoom: String(zoom) });
+  const res = await fetch(`${API_BASE}/api/warehouses/clusters?${params.toString()}`);
+  if (!res.ok) {
+    throw new Error(`Failed to fetch clusters: ${res.status}`);
+  }
+  return res.json();
+}
+
 export async function fetchStats(): Promise<StatsResponse> {
   const res = await fetch(`${API_BASE}/api/stats`);
   if (!res.ok) {
@@ -21,13 +21,30 @@ export interface NearbyWarehouseListResponse {
   center_lat: number;
   center_lng: number;
   radius_km: number;
+  next_cursor: string | null;
 }
 
 export interface WarehouseListResponse {
   items: Warehouse[];
   total: number;
+  total_exact: boolean;
   limit: number;
   offset: number;
+  next_cursor: string | null;
+}
+
+export interface Cluster {
+  count: number;
+  latitude: number;
+  longitude: number;
+  avg_price_per_m2: number | null;
+}
+
+export interface ClusterListResponse {
+  zoom: number;
+  clusters: Cluster[];
+  points: Warehouse[];
+  truncated: boolean;
 }
 
 export interface StatsResponse {
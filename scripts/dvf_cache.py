@@ -0,0 +1,144 @@
+"""Download cache and checkpoint manifest for DVF ingestion.
+
+DvfCache keeps the downloaded .csv.gz files on disk, keyed by URL, and
+revalidates them with conditional requests (ETag / Last-Modified), so an
+unchanged file on data.gouv.fr costs one 304 round trip instead of a
+full download.
+
+Manifest records, per department, the content hash of the file that was
+last ingested and whether that ingestion completed. A re-run skips
+departments whose file is unchanged and already loaded, which also lets
+a failed --all run resume where it stopped.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    """Writes JSON to a temp file and renames it over `path`."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class DvfCache:
+    """On-disk cache of gzipped DVF files, keyed by URL."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def path_for(self, url: str) -> Path:
+        """Returns where the cached file for `url` lives."""
+        return self.directory / f"{self._key(url)}.csv.gz"
+
+    def _meta_path(self, url: str) -> Path:
+        return self.directory / f"{self._key(url)}.json"
+
+    def _load_meta(self, url: str) -> dict | None:
+        meta_path = self._meta_path(url)
+        if not meta_path.exists() or not self.path_for(url).exists():
+            return None
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def fetch(self, url: str) -> tuple[Path, str, bool]:
+        """Returns the cached file for `url`, downloading it if it changed.
+
+        Returns:
+            (path to the .csv.gz, sha256 of its content, True if the cached
+            copy was reused because the server answered 304 Not Modified)
+        """
+        path = self.path_for(url)
+        meta = self._load_meta(url)
+
+        request = Request(url)
+        if meta:
+            if meta.get("etag"):
+                request.add_header("If-None-Match", meta["etag"])
+            if meta.get("last_modified"):
+                request.add_header("If-Modified-Since", meta["last_modified"])
+
+        try:
+            response = urlopen(request)
+        except HTTPError as exc:
+            if exc.code == 304 and meta:
+                return path, meta["sha256"], True
+            raise
+
+        digest = hashlib.sha256()
+        size = 0
+        part = path.with_name(path.name + ".part")
+        try:
+            with response, open(part, "wb") as f:
+                while chunk := response.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+            os.replace(part, path)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+
+        sha256 = digest.hexdigest()
+        _write_json_atomic(self._meta_path(url), {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": sha256,
+            "bytes": size,
+        })
+        return path, sha256, False
+
+
+class Manifest:
+    """Checkpoint of completed departments and the content hash they were loaded from."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+
+    def is_done(self, key: str, sha256: str, limit: int | None = None) -> bool:
+        """True if `key` was fully ingested from a file with this hash and limit."""
+        entry = self.entries.get(key)
+        return bool(
+            entry
+            and entry.get("completed")
+            and entry.get("sha256") == sha256
+            and entry.get("limit") in (None, limit)
+        )
+
+    def mark_done(
+        self, key: str, sha256: str, inserted: int, limit: int | None = None
+    ) -> None:
+        """Records a completed ingestion and persists the manifest immediately."""
+        self.entries[key] = {
+            "sha256": sha256,
+            "completed": True,
+            "inserted": inserted,
+            "limit": limit,
+            "completed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        self.save()
+
+    def save(self) -> None:
+        """Writes the manifest atomically, so a crash never leaves it half-written."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _write_json_atomic(self.path, self.entries)
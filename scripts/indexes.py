@@ -0,0 +1,111 @@
+"""Migration step bringing the warehouses indexes in line with the model.
+
+The managed index set is WAREHOUSE_INDEXES in app/models/schemas.py:
+every index of warehouses named ix_warehouses_*. apply_indexes creates
+the declared indexes a database lacks and drops managed indexes no
+longer declared; other indexes (primary key, unique constraint) are left
+alone. Indexes on the partitioned table cascade to every partition.
+
+The commune trigram index needs the pg_trgm extension. It is installed
+when the server offers it; otherwise the index is skipped, and commune
+searches keep scanning.
+
+The ingest writers run ensure_indexes when they open. To migrate
+without ingesting:
+
+    python -m scripts.indexes
+"""
+
+import asyncio
+
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.config import get_settings
+from app.models.schemas import WAREHOUSE_INDEXES, WarehouseModel
+
+TABLE = WarehouseModel.__tablename__
+MANAGED_PREFIX = f"ix_{TABLE}_"
+
+
+def existing_indexes(sync_conn: Connection) -> set[str]:
+    """Returns the names of the indexes on the warehouses table itself."""
+    result = sync_conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table "
+             "AND schemaname = current_schema()"),
+        {"table": TABLE},
+    )
+    return {name for (name,) in result.all()}
+
+
+def install_extension(sync_conn: Connection, name: str) -> bool:
+    """Installs extension `name` if the server offers it. Returns whether it is installed."""
+    installed = sync_conn.execute(
+        text("SELECT installed_version IS NOT NULL FROM pg_available_extensions "
+             "WHERE name = :name"),
+        {"name": name},
+    ).scalar()
+    if installed is None:
+        return False
+    if not installed:
+        try:
+            with sync_conn.begin_nested():
+                sync_conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {name}"))
+        except DBAPIError as exc:  # e.g. missing privilege
+            print(f"Could not install {name}: {exc.orig}")
+            return False
+    return True
+
+
+def apply_indexes(sync_conn: Connection) -> tuple[list[str], list[str]]:
+    """Creates missing managed indexes and drops obsolete ones.
+
+    Returns:
+        (names created, names dropped)
+    """
+    install_extension(sync_conn, "pg_trgm")
+    existing = existing_indexes(sync_conn)
+    declared = {index.name for index in WAREHOUSE_INDEXES}
+
+    dropped = sorted(
+        name for name in existing if name.startswith(MANAGED_PREFIX) and name not in declared
+    )
+    for name in dropped:
+        sync_conn.execute(text(f'DROP INDEX "{name}"'))
+
+    missing = [index for index in WAREHOUSE_INDEXES if index.name not in existing]
+    for index in missing:
+        # Skipped when its ddl_if condition fails, e.g. pg_trgm is not installed
+        index.create(sync_conn)
+    created = sorted(existing_indexes(sync_conn) & {index.name for index in missing})
+    return created, dropped
+
+
+async def ensure_indexes(conn: AsyncConnection) -> tuple[list[str], list[str]]:
+    """apply_indexes on an async connection."""
+    return await conn.run_sync(apply_indexes)
+
+
+async def _main() -> None:
+    engine = create_async_engine(get_settings().async_database_url)
+    try:
+        async with engine.begin() as conn:
+            created, dropped = await ensure_indexes(conn)
+        for name in created:
+            print(f"Created {name}")
+        for name in dropped:
+            print(f"Dropped {name}")
+        if not created and not dropped:
+            print(f"{TABLE} indexes are up to date.")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    """Applies the managed index set to the warehouses table."""
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
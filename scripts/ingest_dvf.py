@@ -5,31 +5,126 @@ and inserts into PostgreSQL.
 
 Supports processing a single department, a comma-separated list,
 or all French departments at once.
+
+With --stream, the gzipped CSV is decompressed and filtered on the fly
+straight from the HTTP response, keeping memory constant regardless of
+department size.
+
+--years loads several DVF publication years; warehouses is partitioned
+by year (see scripts/partitions.py), with partitions created on demand.
+
+With --workers N, departments are downloaded concurrently on a thread
+pool and parsed on a process pool, with at most N departments in flight.
+--url-template points the downloads at a mirror (including file:// URLs).
+
+All departments of a run share one database engine; rows are upserted
+in --batch-size chunks, one transaction per chunk. --loader copy instead
+streams rows through COPY into an unlogged staging table and merges them
+with a single INSERT ... SELECT.
+
+Each parsed row carries a content hash. Existing rows are only rewritten
+when DVF republishes them with different content, so an unchanged re-run
+produces no writes; the summary reports inserted, updated and unchanged
+rows.
+
+With --cache-dir, downloads are kept on disk and revalidated with
+conditional requests, and a checkpoint manifest lets re-runs skip
+departments whose file is unchanged and already loaded.
+
+--fast-scan replaces DictReader with a positional reader that drops
+lines not containing the warehouse type string before parsing them.
+
+--national ingests the single France-wide file instead: it is
+decompressed once, memory-mapped, split into line-aligned byte ranges
+parsed on a process pool, and the kept rows are routed by department.
+
+--warehouse-cache keeps the filtered warehouses of each department and
+year in a compact columnar file (see scripts/warehouse_cache.py); with
+--load-warehouse-cache the database is loaded from those files alone,
+without downloading or parsing anything.
+
+Every department is instrumented (see scripts/telemetry.py): --report
+writes per-stage times, bytes, row counts, DB round trips and peak
+memory as JSON, and --stats prints the same as one line per department.
 """
 
 import argparse
 import asyncio
 import csv
 import gzip
+import hashlib
+import io
+import mmap
+import resource
+import shutil
 import sys
 import tempfile
+import time
 import uuid
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import date
 from pathlib import Path
-from urllib.request import urlretrieve
+from typing import BinaryIO
+from urllib.request import urlopen, urlretrieve
 
+from sqlalchemy import Delete, delete, text, tuple_
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 from app.config import get_settings
 from app.models.schemas import Base, WarehouseModel
+from scripts.dvf_cache import DvfCache, Manifest
+from scripts.indexes import ensure_indexes
+from scripts.partitions import ensure_partitions, table_kind
+from scripts.summaries import refresh_summaries, summary_department
+from scripts.telemetry import ByteCounter, DepartmentStats, RunReport
+from scripts.warehouse_cache import WarehouseCache
 
 DVF_URL_TEMPLATE = (
-    "https://files.data.gouv.fr/geo-dvf/latest/csv/2024/departements/{dept}.csv.gz"
+    "https://files.data.gouv.fr/geo-dvf/latest/csv/{year}/departements/{dept}.csv.gz"
 )
+DVF_NATIONAL_URL = "https://files.data.gouv.fr/geo-dvf/latest/csv/{year}/full.csv.gz"
+DEFAULT_YEAR = 2024
+
+# Byte ranges per national-file worker; more ranges than workers keeps
+# the pool busy when ranges take uneven time.
+RANGES_PER_WORKER = 4
+
+# PostgreSQL caps a statement at 32,767 bind parameters, i.e. one per
+# column per row in a multi-row INSERT.
+PG_MAX_BIND_PARAMS = 32767
+MAX_BATCH_SIZE = PG_MAX_BIND_PARAMS // len(WarehouseModel.__table__.columns)
+DEFAULT_BATCH_SIZE = 1000
+
+WAREHOUSE_COLUMNS: list[str] = [c.name for c in WarehouseModel.__table__.columns]
+# Unique key of a DVF mutation. It includes transaction_date because
+# PostgreSQL requires the partition key in unique constraints.
+CONFLICT_COLUMNS = ["dvf_mutation_id", "transaction_date"]
+# Columns refreshed when a known mutation comes back with a new content hash
+UPDATE_COLUMNS: list[str] = [
+    c for c in WAREHOUSE_COLUMNS if c != "id" and c not in CONFLICT_COLUMNS
+]
 
 MIN_SURFACE_M2 = 10000
 WAREHOUSE_TYPE = "Local industriel. commercial ou assimilé"
+WAREHOUSE_TYPE_BYTES = WAREHOUSE_TYPE.encode("utf-8")
+
+# DVF columns read by _is_valid_warehouse and parse_row
+ROW_COLUMNS = (
+    "id_mutation",
+    "date_mutation",
+    "valeur_fonciere",
+    "adresse_numero",
+    "adresse_nom_voie",
+    "code_postal",
+    "nom_commune",
+    "code_departement",
+    "type_local",
+    "surface_reelle_bati",
+    "longitude",
+    "latitude",
+)
 
 # All French department codes:
 # - 01 to 19 (mainland)
@@ -44,24 +139,162 @@ ALL_DEPARTMENTS: list[str] = (
 )
 
 
-def download_dvf(department: str) -> Path:
+def dvf_url(
+    department: str, url_template: str = DVF_URL_TEMPLATE, year: int = DEFAULT_YEAR
+) -> str:
+    """Returns the download URL of the gzipped DVF CSV for a department and year."""
+    return url_template.format(dept=department, year=year)
+
+
+def parse_years(value: str) -> list[int]:
+    """Parses a --years value such as "2024", "2019-2024" or "2019,2021,2024"."""
+    years: set[int] = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = (int(bound) for bound in part.split("-", 1))
+            if first > last:
+                raise ValueError(f"invalid year range: {part}")
+            years.update(range(first, last + 1))
+        else:
+            years.add(int(part))
+    if not years:
+        raise ValueError("no years given")
+    return sorted(years)
+
+
+def manifest_key(department: str, year: int) -> str:
+    """Returns the checkpoint manifest key of one department's file for one year."""
+    return f"{year}/{department}"
+
+
+def download_dvf(
+    department: str, url_template: str = DVF_URL_TEMPLATE, year: int = DEFAULT_YEAR
+) -> Path:
     """Downloads gzipped CSV to temp file, returns path to decompressed CSV."""
-    url = DVF_URL_TEMPLATE.format(dept=department)
+    gz_path = fetch_dvf(department, url_template, year)
+    try:
+        return gunzip_file(gz_path)
+    finally:
+        gz_path.unlink(missing_ok=True)
 
-    temp_gz = tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False)
-    urlretrieve(url, temp_gz.name)
 
+def gunzip_file(gz_path: Path) -> Path:
+    """Decompresses a .csv.gz to a temp file, returns path to the CSV."""
     temp_csv = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
-    with gzip.open(temp_gz.name, "rt", encoding="utf-8") as f_in:
-        with open(temp_csv.name, "w", encoding="utf-8") as f_out:
-            f_out.write(f_in.read())
-
-    Path(temp_gz.name).unlink()
+    temp_csv.close()
+    try:
+        with gzip.open(gz_path, "rb") as f_in, open(temp_csv.name, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+    except BaseException:
+        Path(temp_csv.name).unlink(missing_ok=True)
+        raise
     return Path(temp_csv.name)
 
 
+def fetch_dvf(
+    department: str, url_template: str = DVF_URL_TEMPLATE, year: int = DEFAULT_YEAR
+) -> Path:
+    """Downloads the gzipped CSV to a temp file without decompressing it."""
+    temp_gz = tempfile.NamedTemporaryFile(suffix=".csv.gz", delete=False)
+    temp_gz.close()
+    try:
+        urlretrieve(dvf_url(department, url_template, year), temp_gz.name)
+    except BaseException:
+        Path(temp_gz.name).unlink(missing_ok=True)
+        raise
+    return Path(temp_gz.name)
+
+
+class DepartmentSkipped(Exception):
+    """Raised when a department's file is unchanged and was already ingested."""
+
+
+def fetch_dvf_cached(
+    department: str,
+    cache: DvfCache,
+    manifest: Manifest | None = None,
+    limit: int | None = None,
+    url_template: str = DVF_URL_TEMPLATE,
+    year: int = DEFAULT_YEAR,
+) -> tuple[Path, str, bool]:
+    """Fetches a department through the download cache.
+
+    Returns:
+        (path to the cached .csv.gz, sha256 of its content, True if the
+        cached copy was reused without downloading)
+
+    Raises:
+        DepartmentSkipped: the manifest shows this exact file was already loaded.
+    """
+    path, sha256, not_modified = cache.fetch(dvf_url(department, url_template, year))
+    key = manifest_key(department, year)
+    if manifest is not None and manifest.is_done(key, sha256, limit):
+        reason = "not modified" if not_modified else "unchanged content"
+        raise DepartmentSkipped(f"{reason}, already ingested")
+    return path, sha256, not_modified
+
+
+def open_dvf_stream(
+    department: str, url_template: str = DVF_URL_TEMPLATE, year: int = DEFAULT_YEAR
+) -> BinaryIO:
+    """Opens the remote gzipped CSV as a byte stream, without touching disk."""
+    return urlopen(dvf_url(department, url_template, year))
+
+
+def iter_dvf_rows(gz_stream: BinaryIO) -> Iterator[dict]:
+    """Yields DVF rows one by one from a gzipped CSV byte stream.
+
+    Decompression and CSV parsing happen incrementally, so only the
+    current row is held in memory.
+    """
+    with gzip.GzipFile(fileobj=gz_stream, mode="rb") as gz:
+        with io.TextIOWrapper(gz, encoding="utf-8", newline="") as text:
+            yield from csv.DictReader(text)
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process in MB.
+
+    Reads VmHWM on Linux (resettable via reset_peak_rss), and falls back
+    to getrusage elsewhere, where the value is a process-lifetime peak.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def reset_peak_rss() -> None:
+    """Resets the peak RSS watermark so the next reading covers one department.
+
+    Only supported on Linux; a no-op elsewhere.
+    """
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def content_hash(warehouse: dict) -> str:
+    """Fingerprint of a parsed row's values, used to detect DVF corrections."""
+    payload = "\x1f".join("" if v is None else str(v) for v in warehouse.values())
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
 def parse_row(row: dict) -> dict | None:
-    """Extracts and transforms fields per mapping. Returns None if required fields missing."""
+    """Extracts and transforms fields per mapping, plus their content_hash.
+
+    Returns None if required fields missing.
+    """
     if not row.get("id_mutation"):
         return None
 
@@ -82,7 +315,7 @@ def parse_row(row: dict) -> dict | None:
             return None
         return date.fromisoformat(value)
 
-    return {
+    warehouse = {
         "dvf_mutation_id": row.get("id_mutation"),
         "address": address,
         "postal_code": row.get("code_postal") or None,
@@ -95,6 +328,8 @@ def parse_row(row: dict) -> dict | None:
         "longitude": parse_float(row.get("longitude")),
         "property_type": row.get("type_local") or None,
     }
+    warehouse["content_hash"] = content_hash(warehouse)
+    return warehouse
 
 
 def _is_valid_warehouse(row: dict) -> bool:
@@ -112,48 +347,382 @@ def _is_valid_warehouse(row: dict) -> bool:
         return False
 
 
-def filter_warehouses(rows: list[dict], limit: int | None = None) -> list[dict]:
+def iter_warehouses(rows: Iterable[dict], limit: int | None = None) -> Iterator[dict]:
+    """Lazily applies filters, yielding qualifying warehouses up to an optional limit.
+
+    Stops consuming `rows` as soon as the limit is reached.
+
+    Args:
+        rows: Iterable of raw DVF row dictionaries
+        limit: Maximum number of warehouses to yield. None means no limit.
+
+    Yields:
+        Transformed warehouse dictionaries
+    """
+    kept = 0
+    for row in rows:
+        if _is_valid_warehouse(row):
+            parsed = parse_row(row)
+            if parsed:
+                yield parsed
+                kept += 1
+                if limit is not None and kept >= limit:
+                    return
+
+
+def filter_warehouses(rows: Iterable[dict], limit: int | None = None) -> list[dict]:
     """Applies filters, returns qualifying warehouses up to an optional limit.
 
     Args:
-        rows: List of raw DVF row dictionaries
+        rows: Iterable of raw DVF row dictionaries
         limit: Maximum number of warehouses to return. None means no limit.
 
     Returns:
         List of transformed warehouse dictionaries
     """
-    warehouses = []
-    for row in rows:
+    return list(iter_warehouses(rows, limit=limit))
+
+
+def iter_warehouses_fast(
+    lines: Iterable[bytes], header: bytes, limit: int | None = None
+) -> Iterator[dict]:
+    """Fast-path equivalent of iter_warehouses(csv.DictReader(...)).
+
+    Works on raw CSV lines: column positions are resolved once from the
+    header, lines without the WAREHOUSE_TYPE bytes are dropped before any
+    decoding or CSV parsing, and only survivors are turned into the dict
+    that _is_valid_warehouse and parse_row expect. Assumes no quoted field
+    spans several lines, which holds for DVF exports.
+
+    Args:
+        lines: Raw data lines of the CSV, header excluded
+        header: Raw header line
+        limit: Maximum number of warehouses to yield. None means no limit.
+
+    Yields:
+        Transformed warehouse dictionaries
+    """
+    names = next(csv.reader([header.decode("utf-8")]))
+    positions = {name: names.index(name) for name in ROW_COLUMNS if name in names}
+    type_pos = positions.get("type_local")
+    if type_pos is None:
+        return
+
+    kept = 0
+    for line in lines:
+        if WAREHOUSE_TYPE_BYTES not in line:
+            continue
+        fields = next(csv.reader([line.decode("utf-8")]))
+        if type_pos >= len(fields) or fields[type_pos] != WAREHOUSE_TYPE:
+            continue
+        row = {
+            name: fields[pos] if pos < len(fields) else None
+            for name, pos in positions.items()
+        }
         if _is_valid_warehouse(row):
             parsed = parse_row(row)
             if parsed:
-                warehouses.append(parsed)
-                if limit is not None and len(warehouses) >= limit:
-                    break
-    return warehouses
+                yield parsed
+                kept += 1
+                if limit is not None and kept >= limit:
+                    return
 
 
-async def _insert_to_db(warehouses: list[dict]) -> int:
-    """Async implementation: create tables and insert warehouses."""
-    settings = get_settings()
-    engine = create_async_engine(settings.async_database_url)
-
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    async with AsyncSession(engine) as session:
-        for wh in warehouses:
-            wh["id"] = uuid.uuid4()
-        stmt = (
-            pg_insert(WarehouseModel)
-            .values(warehouses)
-            .on_conflict_do_nothing(index_elements=["dvf_mutation_id"])
+def moved_rows(batch: list[dict]) -> Delete:
+    """Deletes the rows of the batch's mutations filed under another transaction_date.
+
+    DVF sometimes corrects a mutation's date. The conflict key includes
+    the date, so the upsert alone would keep the old row next to the new
+    one. Returns (dvf_mutation_id, department) of each deleted row.
+    """
+    mutation_id = WarehouseModel.dvf_mutation_id
+    keys = [tuple(wh[col] for col in CONFLICT_COLUMNS) for wh in batch]
+    return (
+        delete(WarehouseModel)
+        .where(
+            mutation_id.in_(sorted({wh["dvf_mutation_id"] for wh in batch})),
+            tuple_(*(getattr(WarehouseModel, col) for col in CONFLICT_COLUMNS)).not_in(keys),
         )
-        await session.execute(stmt)
-        await session.commit()
+        .returning(mutation_id, WarehouseModel.department)
+    )
+
+
+class WarehouseWriter:
+    """Batched warehouse writer sharing one engine across an ingestion run.
+
+    The engine is created and the schema checked once in open(); each
+    write() then upserts in chunks of `batch_size` rows, one transaction
+    per chunk. A mutation already in the table is only rewritten when its
+    content_hash differs, so re-ingesting unchanged data writes nothing.
+    `rows_written`, `rows_updated` and `rows_unchanged` count the three
+    outcomes; a mutation repeated within one write() keeps its first row
+    and the repeats count as unchanged. A mutation whose transaction_date
+    changed has a new conflict key, so its rows under other dates are
+    deleted in the same transaction and it counts as updated.
+    `round_trips` counts the statements sent for the writes. write() also
+    adds its share of these counters to the DepartmentStats it is given.
+
+    When a write() inserts or updates rows, it then refreshes the summary
+    tables (scripts/summaries.py) of the departments it wrote, including
+    when a later chunk fails after earlier ones were committed.
+
+    Year partitions are created the first time a year shows up. Rows
+    without a transaction_date cannot be partitioned and are counted in
+    `rows_without_date` instead of being written.
+
+    Usage:
+        async with WarehouseWriter(batch_size=500) as writer:
+            await writer.write(warehouses)
+    """
+
+    def __init__(
+        self, database_url: str | None = None, batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> None:
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.database_url = database_url
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.rows_updated = 0
+        self.rows_unchanged = 0
+        self.rows_without_date = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        self._engine: AsyncEngine | None = None
+        self._partition_years: set[int] = set()
+        self._partition_lock = asyncio.Lock()
 
-    await engine.dispose()
-    return len(warehouses)
+    @property
+    def rows_per_second(self) -> float:
+        """Rows merged per second over every write() so far, whatever their outcome."""
+        merged = self.rows_written + self.rows_updated + self.rows_unchanged
+        return merged / self.seconds if self.seconds > 0 else 0.0
+
+    async def open(self) -> None:
+        """Creates the engine and ensures the schema exists."""
+        url = self.database_url or get_settings().async_database_url
+        self._engine = create_async_engine(url)
+        async with self._engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            if await table_kind(conn) != "p":
+                raise RuntimeError(
+                    f"{WarehouseModel.__tablename__} is not partitioned; "
+                    "convert it first with: python -m scripts.partitions"
+                )
+            await ensure_partitions(conn, [])
+            # Tables created before content hashes existed; their rows hash
+            # as NULL and are refreshed once by the next ingest.
+            await conn.execute(text(
+                f"ALTER TABLE {WarehouseModel.__tablename__} "
+                "ADD COLUMN IF NOT EXISTS content_hash VARCHAR"
+            ))
+            await ensure_indexes(conn)
+
+    async def _prepare(
+        self, warehouses: list[dict], stats: DepartmentStats | None = None
+    ) -> list[dict]:
+        """Drops undated and repeated rows, and creates partitions for any new years.
+
+        One upsert statement cannot touch the same row twice, so only the
+        first row per conflict key is kept.
+        """
+        dated = [wh for wh in warehouses if wh.get("transaction_date")]
+        self.rows_without_date += len(warehouses) - len(dated)
+        if stats is not None:
+            stats.rows_without_date += len(warehouses) - len(dated)
+        unique = {}
+        for wh in dated:
+            unique.setdefault(tuple(wh[col] for col in CONFLICT_COLUMNS), wh)
+        self._record(len(dated) - len(unique), 0, 0, stats)
+        dated = list(unique.values())
+        years = {wh["transaction_date"].year for wh in dated}
+        if years - self._partition_years:
+            async with self._partition_lock:
+                missing = years - self._partition_years
+                if missing:
+                    async with self._engine.begin() as conn:
+                        await ensure_partitions(conn, missing)
+                    self._partition_years |= missing
+        return dated
+
+    async def close(self) -> None:
+        """Disposes of the engine's connection pool."""
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+    async def __aenter__(self) -> "WarehouseWriter":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _summarize(
+        self, departments: set[str], stats: DepartmentStats | None = None
+    ) -> None:
+        """Refreshes the summaries of `departments`, the ones whose rows changed, if any."""
+        if not departments:
+            return
+        async with self._engine.begin() as conn:
+            statements = await refresh_summaries(conn, departments)
+        self._record(0, 0, 0, stats, round_trips=statements)
+
+    def _record(
+        self,
+        rows: int,
+        touched: int,
+        inserted: int,
+        stats: DepartmentStats | None = None,
+        round_trips: int = 0,
+    ) -> None:
+        """Counts one merge of `rows` rows, `touched` of them returned by RETURNING."""
+        self.rows_written += inserted
+        self.rows_updated += touched - inserted
+        self.rows_unchanged += rows - touched
+        self.round_trips += round_trips
+        if stats is not None:
+            stats.rows_inserted += inserted
+            stats.rows_updated += touched - inserted
+            stats.rows_unchanged += rows - touched
+            stats.db_round_trips += round_trips
+
+    async def write(
+        self, warehouses: list[dict], stats: DepartmentStats | None = None
+    ) -> int:
+        """Upserts warehouses in batches. Returns count inserted."""
+        if self._engine is None:
+            raise RuntimeError("WarehouseWriter is not open")
+        inserted = 0
+        # Departments of the committed batches that changed rows
+        changed: set[str] = set()
+        started = time.perf_counter()
+        warehouses = await self._prepare(warehouses, stats)
+        try:
+            for start in range(0, len(warehouses), self.batch_size):
+                batch = [
+                    {**wh, "id": uuid.uuid4()}
+                    for wh in warehouses[start:start + self.batch_size]
+                ]
+                stmt = pg_insert(WarehouseModel).values(batch)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=CONFLICT_COLUMNS,
+                    set_={col: stmt.excluded[col] for col in UPDATE_COLUMNS},
+                    where=WarehouseModel.content_hash.is_distinct_from(stmt.excluded.content_hash),
+                ).returning(WarehouseModel.id)
+                async with self._engine.begin() as conn:
+                    moved = (await conn.execute(moved_rows(batch))).all()
+                    result = await conn.execute(stmt)
+                # New rows return the id generated here, updated rows their existing id
+                touched = set(result.scalars().all())
+                moved_mutations = {mutation for mutation, _ in moved}
+                batch_inserted = sum(
+                    1 for wh in batch
+                    if wh["id"] in touched and wh["dvf_mutation_id"] not in moved_mutations
+                )
+                self._record(len(batch), len(touched), batch_inserted, stats, round_trips=2)
+                inserted += batch_inserted
+                if touched:
+                    changed |= {summary_department(wh.get("department")) for wh in batch}
+                changed |= {summary_department(department) for _, department in moved}
+        finally:
+            # Also when a batch failed: the batches before it are committed,
+            # and the API must not keep serving summaries without them
+            await self._summarize(changed, stats)
+        self.seconds += time.perf_counter() - started
+        return inserted
+
+
+class CopyWarehouseWriter(WarehouseWriter):
+    """Warehouse writer using PostgreSQL's COPY protocol.
+
+    Each write() creates its own UNLOGGED staging table, streams the rows
+    into it with asyncpg's copy_records_to_table, deletes the rows of
+    mutations whose date changed, then merges them into
+    warehouses with one INSERT ... SELECT ... ON CONFLICT DO UPDATE on the
+    mutation key, limited to rows whose content_hash changed. Everything
+    happens in one transaction, and the staging table is dropped before
+    commit, so concurrent writes never collide.
+    """
+
+    async def write(
+        self, warehouses: list[dict], stats: DepartmentStats | None = None
+    ) -> int:
+        """Copies and merges warehouses. Returns count inserted."""
+        if self._engine is None:
+            raise RuntimeError("CopyWarehouseWriter is not open")
+        started = time.perf_counter()
+        warehouses = await self._prepare(warehouses, stats)
+        if not warehouses:
+            return 0
+
+        table = WarehouseModel.__tablename__
+        staging = f"warehouses_staging_{uuid.uuid4().hex}"
+        columns = ", ".join(WAREHOUSE_COLUMNS)
+        conflict = ", ".join(CONFLICT_COLUMNS)
+        updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in UPDATE_COLUMNS)
+        records = (
+            tuple(uuid.uuid4() if col == "id" else wh.get(col) for col in WAREHOUSE_COLUMNS)
+            for wh in warehouses
+        )
+
+        async with self._engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            pg = raw.driver_connection
+            async with pg.transaction():
+                await pg.execute(
+                    f"CREATE UNLOGGED TABLE {staging} (LIKE {table} INCLUDING DEFAULTS)"
+                )
+                await pg.copy_records_to_table(
+                    staging, records=records, columns=WAREHOUSE_COLUMNS
+                )
+                # Mutations whose transaction_date changed: see moved_rows
+                moved = await pg.fetch(
+                    f"DELETE FROM {table} "
+                    f"WHERE dvf_mutation_id IN (SELECT dvf_mutation_id FROM {staging}) "
+                    f"AND ({conflict}) NOT IN (SELECT {conflict} FROM {staging}) "
+                    f"RETURNING dvf_mutation_id, department"
+                )
+                moved_mutations = list({row["dvf_mutation_id"] for row in moved})
+                # New rows keep the staging id, so RETURNING tells them apart
+                # from updated ones; a moved mutation's new row counts as updated.
+                counts = await pg.fetchrow(
+                    f"WITH merged AS ("
+                    f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} "
+                    f"ON CONFLICT ({conflict}) DO UPDATE SET {updates} "
+                    f"WHERE {table}.content_hash IS DISTINCT FROM EXCLUDED.content_hash "
+                    f"RETURNING id, dvf_mutation_id) "
+                    f"SELECT count(*) AS touched, "
+                    f"count(*) FILTER (WHERE id IN (SELECT id FROM {staging}) "
+                    f"AND dvf_mutation_id <> ALL($1::text[])) AS inserted "
+                    f"FROM merged",
+                    moved_mutations,
+                )
+                await pg.execute(f"DROP TABLE {staging}")
+
+        # CREATE, COPY, DELETE, merge and DROP
+        self._record(
+            len(warehouses), counts["touched"], counts["inserted"], stats, round_trips=5
+        )
+        changed = {summary_department(row["department"]) for row in moved}
+        if counts["touched"]:
+            changed |= {summary_department(wh.get("department")) for wh in warehouses}
+        await self._summarize(changed, stats)
+        self.seconds += time.perf_counter() - started
+        return counts["inserted"]
+
+
+# Writer class per --loader choice
+LOADERS: dict[str, type[WarehouseWriter]] = {
+    "insert": WarehouseWriter,
+    "copy": CopyWarehouseWriter,
+}
+
+
+async def _insert_to_db(warehouses: list[dict]) -> int:
+    """Async implementation: create tables and insert warehouses."""
+    async with WarehouseWriter() as writer:
+        return await writer.write(warehouses)
 
 
 def insert_to_db(warehouses: list[dict]) -> int:
@@ -163,36 +732,829 @@ def insert_to_db(warehouses: list[dict]) -> int:
     return asyncio.run(_insert_to_db(warehouses))
 
 
-def process_department(department: str, limit: int | None = None) -> int:
+def scan_dvf(
+    gz_stream: BinaryIO, limit: int | None = None, fast_scan: bool = False
+) -> tuple[int, list[dict]]:
+    """Streams a gzipped DVF CSV through the filters with constant memory.
+
+    Args:
+        gz_stream: Gzipped CSV byte stream (file or HTTP response)
+        limit: Maximum number of warehouses to keep. None means no limit.
+        fast_scan: Use iter_warehouses_fast instead of DictReader.
+
+    Returns:
+        (rows scanned, filtered warehouses)
+    """
+    scanned = 0
+
+    def counted(rows: Iterable) -> Iterator:
+        nonlocal scanned
+        for row in rows:
+            scanned += 1
+            yield row
+
+    if not fast_scan:
+        warehouses = list(iter_warehouses(counted(iter_dvf_rows(gz_stream)), limit=limit))
+        return scanned, warehouses
+
+    with gzip.GzipFile(fileobj=gz_stream, mode="rb") as gz:
+        header = gz.readline()
+        warehouses = list(iter_warehouses_fast(counted(gz), header, limit=limit))
+    return scanned, warehouses
+
+
+def parse_dvf_file(
+    gz_path: Path, limit: int | None = None, fast_scan: bool = False
+) -> tuple[int, list[dict]]:
+    """Streams a local gzipped CSV through the filters.
+
+    Runs in a worker process during parallel ingestion, so it only takes
+    and returns picklable values.
+
+    Returns:
+        (rows scanned, filtered warehouses)
+    """
+    with open(gz_path, "rb") as f:
+        return scan_dvf(f, limit, fast_scan)
+
+
+def parse_dvf_file_with_peak(
+    gz_path: Path, limit: int | None = None, fast_scan: bool = False
+) -> tuple[int, list[dict], float]:
+    """parse_dvf_file, plus the worker's peak RSS in MB while parsing.
+
+    Returns:
+        (rows scanned, filtered warehouses, peak RSS)
+    """
+    reset_peak_rss()
+    scanned, warehouses = parse_dvf_file(gz_path, limit, fast_scan)
+    return scanned, warehouses, peak_rss_mb()
+
+
+def decompress_national(
+    source: str, stats: DepartmentStats | None = None
+) -> tuple[Path, bool]:
+    """Makes the national DVF file available as one decompressed CSV on disk.
+
+    Args:
+        source: URL (http(s):// or file://) or local path of full.csv.gz.
+            A local path not ending in .gz is used as-is.
+        stats: Receives the number of compressed bytes read.
+
+    Returns:
+        (path to the CSV, True if it is a temp file the caller must delete)
+    """
+    if "://" not in source and not source.endswith(".gz"):
+        return Path(source), False
+
+    temp_csv = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
+    temp_csv.close()
+    try:
+        stream = ByteCounter(urlopen(source) if "://" in source else open(source, "rb"))
+        with stream, gzip.GzipFile(fileobj=stream, mode="rb") as gz:
+            with open(temp_csv.name, "wb") as f_out:
+                shutil.copyfileobj(gz, f_out, 1024 * 1024)
+    except BaseException:
+        Path(temp_csv.name).unlink(missing_ok=True)
+        raise
+    if stats is not None:
+        stats.bytes_downloaded += stream.bytes
+    return Path(temp_csv.name), True
+
+
+def split_byte_ranges(csv_path: Path, parts: int) -> tuple[bytes, list[tuple[int, int]]]:
+    """Splits a CSV into about `parts` byte ranges, each ending on a line boundary.
+
+    Returns:
+        (raw header line, [(start, end), ...] covering every data line once)
+    """
+    with open(csv_path, "rb") as f:
+        if f.seek(0, io.SEEK_END) == 0:
+            return b"", []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = mm.readline()
+            size = len(mm)
+            data_start = len(header)
+            step = max(1, (size - data_start) // max(1, parts))
+
+            ranges = []
+            start = data_start
+            while start < size:
+                newline = mm.find(b"\n", min(start + step, size) - 1)
+                end = size if newline == -1 else newline + 1
+                ranges.append((start, end))
+                start = end
+    return header, ranges
+
+
+def parse_byte_range(
+    csv_path: Path, header: bytes, start: int, end: int, fast_scan: bool = False
+) -> tuple[int, list[dict]]:
+    """Filters the data lines in [start, end) of a memory-mapped CSV.
+
+    Runs in a worker process during national ingestion.
+
+    Returns:
+        (rows scanned, filtered warehouses)
+    """
+    scanned = 0
+
+    def lines(mm: mmap.mmap) -> Iterator[bytes]:
+        nonlocal scanned
+        mm.seek(start)
+        while mm.tell() < end:
+            scanned += 1
+            yield mm.readline()
+
+    with open(csv_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if fast_scan:
+                warehouses = list(iter_warehouses_fast(lines(mm), header))
+            else:
+                fieldnames = next(csv.reader([header.decode("utf-8")]))
+                rows = csv.DictReader(
+                    (line.decode("utf-8") for line in lines(mm)), fieldnames=fieldnames
+                )
+                warehouses = list(iter_warehouses(rows))
+    return scanned, warehouses
+
+
+def route_by_department(
+    warehouses: Iterable[dict],
+    departments: Iterable[str] | None = None,
+    limit: int | None = None,
+) -> dict[str, list[dict]]:
+    """Groups warehouses by department, keeping input order within each group.
+
+    Args:
+        warehouses: Parsed warehouse dictionaries
+        departments: Only keep these departments. None keeps all of them.
+        limit: Maximum number of warehouses per department. None means no limit.
+    """
+    wanted = set(departments) if departments is not None else None
+    routed: dict[str, list[dict]] = {}
+    for wh in warehouses:
+        dept = wh.get("department")
+        if not dept or (wanted is not None and dept not in wanted):
+            continue
+        group = routed.setdefault(dept, [])
+        if limit is None or len(group) < limit:
+            group.append(wh)
+    return routed
+
+
+def process_department(
+    department: str,
+    limit: int | None = None,
+    stream: bool = False,
+    url_template: str = DVF_URL_TEMPLATE,
+    insert: Callable[[list[dict]], int] | None = None,
+    cache: DvfCache | None = None,
+    manifest: Manifest | None = None,
+    fast_scan: bool = False,
+    year: int = DEFAULT_YEAR,
+    stats: DepartmentStats | None = None,
+    warehouse_cache: WarehouseCache | None = None,
+) -> int:
     """Downloads, filters, and inserts warehouse data for a single department.
 
     Args:
         department: French department code (e.g., "77")
         limit: Maximum number of warehouses to insert. None means no limit.
+        stream: Decompress and filter the download on the fly instead of
+            materialising the CSV on disk and every row in memory.
+        url_template: Download URL with a {dept} and optional {year} placeholder.
+        insert: Callable writing the filtered rows, e.g. a shared
+            WarehouseWriter. Defaults to insert_to_db.
+        cache: Download cache. When set, the cached .csv.gz is streamed
+            from disk and `stream` is ignored.
+        manifest: Checkpoint manifest used to skip and record departments.
+        fast_scan: Use the positional fast-path reader (streamed and cached
+            modes only).
+        year: DVF publication year to ingest.
+        stats: Receives per-stage telemetry for this department.
+        warehouse_cache: Saves the filtered rows before they are inserted.
+            Ignored with `limit`, which would leave a partial file.
 
     Returns:
         Number of records inserted for this department.
+
+    Raises:
+        DepartmentSkipped: the cached file is unchanged and already ingested.
     """
+    insert = insert or insert_to_db
+    stats = stats or DepartmentStats(department, year)
+    if warehouse_cache is not None and limit is None:
+        insert = _caching_insert(insert, warehouse_cache, department, year, stats)
+    reset_peak_rss()
+    try:
+        if cache is not None:
+            count = _process_department_cached(
+                department, limit, url_template, insert, cache, manifest, fast_scan, year, stats
+            )
+        elif stream:
+            count = _process_department_streaming(
+                department, limit, url_template, insert, fast_scan, year, stats
+            )
+        else:
+            count = _process_department_buffered(
+                department, limit, url_template, insert, year, stats
+            )
+    finally:
+        stats.peak_rss_mb = peak_rss_mb()
+    print(f"  Peak RSS for department {department}: {stats.peak_rss_mb:.1f} MB")
+    return count
+
+
+def _caching_insert(
+    insert: Callable[[list[dict]], int],
+    warehouse_cache: WarehouseCache,
+    department: str,
+    year: int,
+    stats: DepartmentStats,
+) -> Callable[[list[dict]], int]:
+    """Wraps `insert` so the rows are saved to the warehouse cache first."""
+    def cache_then_insert(warehouses: list[dict]) -> int:
+        save_to_warehouse_cache(warehouse_cache, department, year, warehouses, stats)
+        return insert(warehouses)
+
+    return cache_then_insert
+
+
+def save_to_warehouse_cache(
+    warehouse_cache: WarehouseCache,
+    department: str,
+    year: int,
+    warehouses: list[dict],
+    stats: DepartmentStats,
+) -> None:
+    """Saves a department's filtered rows, timed as the "cache" stage."""
+    with stats.stage("cache"):
+        warehouse_cache.save(department, year, warehouses)
+
+
+def _process_department_buffered(
+    department: str,
+    limit: int | None,
+    url_template: str,
+    insert: Callable[[list[dict]], int],
+    year: int,
+    stats: DepartmentStats,
+) -> int:
+    """Loads the whole decompressed CSV before filtering it."""
     print(f"  Downloading DVF data for department {department}...")
-    csv_path = download_dvf(department)
+    with stats.stage("download"):
+        gz_path = fetch_dvf(department, url_template, year)
+    try:
+        stats.bytes_downloaded += gz_path.stat().st_size
+        with stats.stage("decompress"):
+            csv_path = gunzip_file(gz_path)
+    finally:
+        gz_path.unlink(missing_ok=True)
 
     try:
         print(f"  Parsing CSV for department {department}...")
-        with open(csv_path, "r", encoding="utf-8") as f:
+        with stats.stage("parse"), open(csv_path, "r", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             rows = list(reader)
+        stats.rows_scanned += len(rows)
         print(f"  Parsed {len(rows)} rows from department {department}")
 
-        warehouses = filter_warehouses(rows, limit=limit)
+        with stats.stage("filter"):
+            warehouses = filter_warehouses(rows, limit=limit)
+        stats.rows_kept += len(warehouses)
         print(f"  Filtered to {len(warehouses)} warehouses in department {department}")
 
-        count = insert_to_db(warehouses)
+        with stats.stage("insert"):
+            count = insert(warehouses)
         print(f"  Inserted {count} records for department {department}")
         return count
     finally:
         csv_path.unlink(missing_ok=True)
 
 
+def _process_department_streaming(
+    department: str,
+    limit: int | None,
+    url_template: str,
+    insert: Callable[[list[dict]], int],
+    fast_scan: bool,
+    year: int,
+    stats: DepartmentStats,
+) -> int:
+    """Filters rows straight off the gzip stream, holding only the kept ones."""
+    print(f"  Streaming DVF data for department {department}...")
+    with stats.stage("scan"):
+        with ByteCounter(open_dvf_stream(department, url_template, year)) as response:
+            scanned, warehouses = scan_dvf(response, limit, fast_scan)
+    stats.bytes_downloaded += response.bytes
+    stats.rows_scanned += scanned
+    stats.rows_kept += len(warehouses)
+    print(f"  Scanned {scanned} rows from department {department}")
+    print(f"  Filtered to {len(warehouses)} warehouses in department {department}")
+
+    with stats.stage("insert"):
+        count = insert(warehouses)
+    print(f"  Inserted {count} records for department {department}")
+    return count
+
+
+def _process_department_cached(
+    department: str,
+    limit: int | None,
+    url_template: str,
+    insert: Callable[[list[dict]], int],
+    cache: DvfCache,
+    manifest: Manifest | None,
+    fast_scan: bool,
+    year: int,
+    stats: DepartmentStats,
+) -> int:
+    """Revalidates the cached download, then streams it from disk."""
+    print(f"  Fetching DVF data for department {department} (cached)...")
+    with stats.stage("download"):
+        gz_path, sha256, not_modified = fetch_dvf_cached(
+            department, cache, manifest, limit, url_template, year
+        )
+    if not not_modified:
+        stats.bytes_downloaded += gz_path.stat().st_size
+
+    with stats.stage("scan"):
+        scanned, warehouses = parse_dvf_file(gz_path, limit, fast_scan)
+    stats.rows_scanned += scanned
+    stats.rows_kept += len(warehouses)
+    print(f"  Scanned {scanned} rows from department {department}")
+    print(f"  Filtered to {len(warehouses)} warehouses in department {department}")
+
+    with stats.stage("insert"):
+        count = insert(warehouses)
+    print(f"  Inserted {count} records for department {department}")
+    if manifest is not None:
+        manifest.mark_done(manifest_key(department, year), sha256, count, limit)
+    return count
+
+
+async def _process_department_parallel(
+    department: str,
+    writer: WarehouseWriter,
+    limit: int | None,
+    url_template: str,
+    semaphore: asyncio.Semaphore,
+    download_pool: Executor,
+    parse_pool: Executor,
+    cache: DvfCache | None = None,
+    manifest: Manifest | None = None,
+    fast_scan: bool = False,
+    year: int = DEFAULT_YEAR,
+    report: RunReport | None = None,
+    warehouse_cache: WarehouseCache | None = None,
+) -> int:
+    """Download on a thread, parse on a worker process, then insert.
+
+    The department's telemetry is registered in `report` and finished with
+    its outcome before this returns or raises.
+    """
+    report = report or RunReport()
+    stats = report.department(department, year)
+    async with semaphore:
+        stats.start()
+        try:
+            count = await _ingest_department_parallel(
+                department, writer, limit, url_template, download_pool, parse_pool,
+                cache, manifest, fast_scan, year, stats, warehouse_cache,
+            )
+        except DepartmentSkipped:
+            report.finish(stats, "skipped")
+            raise
+        except Exception as exc:
+            report.finish(stats, "failed", str(exc) or type(exc).__name__)
+            raise
+        report.finish(stats, "ok")
+        return count
+
+
+async def _ingest_department_parallel(
+    department: str,
+    writer: WarehouseWriter,
+    limit: int | None,
+    url_template: str,
+    download_pool: Executor,
+    parse_pool: Executor,
+    cache: DvfCache | None,
+    manifest: Manifest | None,
+    fast_scan: bool,
+    year: int,
+    stats: DepartmentStats,
+    warehouse_cache: WarehouseCache | None,
+) -> int:
+    """The stages of _process_department_parallel, run once it holds the semaphore."""
+    loop = asyncio.get_running_loop()
+    print(f"  [{department}] Downloading DVF data...")
+    with stats.stage("download"):
+        if cache is not None:
+            gz_path, sha256, not_modified = await loop.run_in_executor(
+                download_pool,
+                fetch_dvf_cached,
+                department,
+                cache,
+                manifest,
+                limit,
+                url_template,
+                year,
+            )
+        else:
+            gz_path = await loop.run_in_executor(
+                download_pool, fetch_dvf, department, url_template, year
+            )
+            not_modified = False
+    try:
+        if not not_modified:
+            stats.bytes_downloaded += gz_path.stat().st_size
+        print(f"  [{department}] Parsing CSV...")
+        with stats.stage("scan"):
+            scanned, warehouses, stats.peak_rss_mb = await loop.run_in_executor(
+                parse_pool, parse_dvf_file_with_peak, gz_path, limit, fast_scan
+            )
+    finally:
+        if cache is None:
+            gz_path.unlink(missing_ok=True)
+    stats.rows_scanned += scanned
+    stats.rows_kept += len(warehouses)
+    print(f"  [{department}] Scanned {scanned} rows, kept {len(warehouses)} warehouses")
+
+    if warehouse_cache is not None and limit is None:
+        save_to_warehouse_cache(warehouse_cache, department, year, warehouses, stats)
+    with stats.stage("insert"):
+        count = await writer.write(warehouses, stats)
+    print(f"  [{department}] Inserted {count} records")
+    if manifest is not None:
+        manifest.mark_done(manifest_key(department, year), sha256, count, limit)
+    return count
+
+
+async def ingest_parallel(
+    departments: list[str],
+    writer: WarehouseWriter,
+    limit: int | None = None,
+    workers: int = 4,
+    url_template: str = DVF_URL_TEMPLATE,
+    cache: DvfCache | None = None,
+    manifest: Manifest | None = None,
+    fast_scan: bool = False,
+    year: int = DEFAULT_YEAR,
+    report: RunReport | None = None,
+    warehouse_cache: WarehouseCache | None = None,
+) -> tuple[int, list[str], list[tuple[str, str]], list[str]]:
+    """Processes departments concurrently, with at most `workers` in flight.
+
+    A failing department is reported and does not affect the others.
+    All departments insert through the same open `writer`, and record
+    their telemetry in `report` if given. With `warehouse_cache`, each
+    department's filtered rows are saved to it before being inserted.
+
+    Returns:
+        (total inserted, succeeded departments, failed (department, error)
+        pairs, departments skipped as unchanged)
+    """
+    semaphore = asyncio.Semaphore(workers)
+    with ThreadPoolExecutor(max_workers=workers) as download_pool, \
+            ProcessPoolExecutor(max_workers=workers) as parse_pool:
+        results = await asyncio.gather(
+            *(
+                _process_department_parallel(
+                    dept,
+                    writer,
+                    limit,
+                    url_template,
+                    semaphore,
+                    download_pool,
+                    parse_pool,
+                    cache,
+                    manifest,
+                    fast_scan,
+                    year,
+                    report,
+                    warehouse_cache,
+                )
+                for dept in departments
+            ),
+            return_exceptions=True,
+        )
+
+    total_inserted = 0
+    succeeded: list[str] = []
+    failed: list[tuple[str, str]] = []
+    skipped: list[str] = []
+    for dept, result in zip(departments, results):
+        if isinstance(result, DepartmentSkipped):
+            print(f"  [{dept}] Skipped: {result}")
+            skipped.append(dept)
+        elif isinstance(result, BaseException):
+            error_msg = str(result) or type(result).__name__
+            print(f"  ERROR processing department {dept}: {error_msg}", file=sys.stderr)
+            failed.append((dept, error_msg))
+        else:
+            total_inserted += result
+            succeeded.append(dept)
+    return total_inserted, succeeded, failed, skipped
+
+
+async def ingest_national(
+    source: str,
+    writer: WarehouseWriter,
+    departments: list[str] | None = None,
+    limit: int | None = None,
+    workers: int = 4,
+    fast_scan: bool = False,
+    year: int = DEFAULT_YEAR,
+    report: RunReport | None = None,
+    warehouse_cache: WarehouseCache | None = None,
+) -> tuple[int, list[str], list[tuple[str, str]]]:
+    """Ingests the France-wide DVF file, parsing byte ranges on a process pool.
+
+    Telemetry goes to `report`: the download, decompression and scan of the
+    whole file under department "national", then one entry per department
+    for its insert.
+
+    Args:
+        source: URL or local path of the national file (see decompress_national)
+        writer: Open writer shared by every department
+        departments: Only ingest these departments. None ingests all of them.
+        limit: Maximum number of warehouses per department. None means no limit.
+        workers: Size of the parsing process pool.
+        fast_scan: Use the positional fast-path reader in each worker.
+        year: DVF year of the file, as recorded in the telemetry.
+        report: Receives the run's telemetry.
+        warehouse_cache: Saves each department's rows before they are inserted.
+
+    Returns:
+        (total inserted, succeeded departments, failed (department, error) pairs)
+    """
+    report = report or RunReport()
+    national = report.department("national", year)
+    loop = asyncio.get_running_loop()
+    print(f"  Decompressing national file {source}...")
+    try:
+        with national.stage("decompress"):
+            csv_path, is_temp = await loop.run_in_executor(
+                None, decompress_national, source, national
+            )
+        try:
+            header, ranges = split_byte_ranges(csv_path, workers * RANGES_PER_WORKER)
+            print(f"  Parsing {len(ranges)} byte ranges on {workers} worker(s)...")
+            with national.stage("scan"), ProcessPoolExecutor(max_workers=workers) as parse_pool:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(
+                        parse_pool, parse_byte_range, csv_path, header, start, end, fast_scan
+                    )
+                    for start, end in ranges
+                ))
+        finally:
+            if is_temp:
+                csv_path.unlink(missing_ok=True)
+    except Exception as exc:
+        report.finish(national, "failed", str(exc) or type(exc).__name__)
+        raise
+
+    scanned = sum(count for count, _ in results)
+    national.rows_scanned = scanned
+    national.peak_rss_mb = peak_rss_mb()
+    routed = route_by_department(
+        (wh for _, warehouses in results for wh in warehouses), departments, limit
+    )
+    report.finish(national, "ok")
+    print(f"  Scanned {scanned} rows, kept warehouses in {len(routed)} department(s)")
+
+    total_inserted = 0
+    succeeded: list[str] = []
+    failed: list[tuple[str, str]] = []
+    for dept in departments if departments is not None else sorted(routed):
+        warehouses = routed.get(dept, [])
+        stats = report.department(dept, year)
+        stats.rows_kept = len(warehouses)
+        try:
+            if warehouse_cache is not None and limit is None:
+                save_to_warehouse_cache(warehouse_cache, dept, year, warehouses, stats)
+            with stats.stage("insert"):
+                count = await writer.write(warehouses, stats)
+        except Exception as exc:
+            error_msg = str(exc)
+            print(f"  ERROR processing department {dept}: {error_msg}", file=sys.stderr)
+            failed.append((dept, error_msg))
+            report.finish(stats, "failed", error_msg)
+            continue
+        report.finish(stats, "ok")
+        print(f"  [{dept}] Kept {len(warehouses)} warehouses, inserted {count} records")
+        total_inserted += count
+        succeeded.append(dept)
+    return total_inserted, succeeded, failed
+
+
+async def ingest_warehouse_cache(
+    warehouse_cache: WarehouseCache,
+    writer: WarehouseWriter,
+    departments: list[str] | None = None,
+    workers: int = 4,
+    year: int = DEFAULT_YEAR,
+    report: RunReport | None = None,
+) -> tuple[int, list[str], list[tuple[str, str]]]:
+    """Loads departments from the warehouse cache, without downloading or parsing.
+
+    Files are read on a thread pool and written through `writer`, with at
+    most `workers` departments in flight.
+
+    Args:
+        departments: Departments to load. None loads every department
+            cached for `year`.
+
+    Returns:
+        (total inserted, succeeded departments, failed (department, error) pairs)
+    """
+    report = report or RunReport()
+    if departments is None:
+        departments = warehouse_cache.departments(year)
+    semaphore = asyncio.Semaphore(workers)
+    loop = asyncio.get_running_loop()
+
+    async def load(department: str) -> int:
+        stats = report.department(department, year)
+        async with semaphore:
+            stats.start()
+            try:
+                with stats.stage("load"):
+                    warehouses = await loop.run_in_executor(
+                        None, warehouse_cache.load, department, year
+                    )
+                stats.rows_kept = len(warehouses)
+                with stats.stage("insert"):
+                    count = await writer.write(warehouses, stats)
+            except FileNotFoundError:
+                report.finish(stats, "failed", "not in the warehouse cache")
+                raise RuntimeError("not in the warehouse cache") from None
+            except Exception as exc:
+                report.finish(stats, "failed", str(exc) or type(exc).__name__)
+                raise
+            report.finish(stats, "ok")
+        print(f"  [{department}] Loaded {len(warehouses)} cached warehouses, "
+              f"inserted {count} records")
+        return count
+
+    results = await asyncio.gather(
+        *(load(dept) for dept in departments), return_exceptions=True
+    )
+
+    total_inserted = 0
+    succeeded: list[str] = []
+    failed: list[tuple[str, str]] = []
+    for dept, result in zip(departments, results):
+        if isinstance(result, BaseException):
+            error_msg = str(result) or type(result).__name__
+            print(f"  ERROR processing department {dept}: {error_msg}", file=sys.stderr)
+            failed.append((dept, error_msg))
+        else:
+            total_inserted += result
+            succeeded.append(dept)
+    return total_inserted, succeeded, failed
+
+
+def _label(department: str, year: int, years: list[int]) -> str:
+    """Names a department in the summary, qualified by year on multi-year runs."""
+    return f"{department}/{year}" if len(years) > 1 else department
+
+
+async def _run_national(
+    departments: list[str] | None,
+    args: argparse.Namespace,
+    report: RunReport,
+    warehouse_cache: WarehouseCache | None,
+) -> tuple[int, list[str], list[tuple[str, str]], WarehouseWriter]:
+    """Runs ingest_national per year with a writer opened for the whole run.
+
+    A source without a {year} placeholder is a single file and is read once.
+    """
+    years = args.years if "{year}" in args.national else args.years[:1]
+    total_inserted = 0
+    succeeded: list[str] = []
+    failed: list[tuple[str, str]] = []
+    async with LOADERS[args.loader](batch_size=args.batch_size) as writer:
+        for year in years:
+            inserted, year_succeeded, year_failed = await ingest_national(
+                args.national.format(year=year),
+                writer,
+                departments=departments,
+                limit=args.limit,
+                workers=args.workers,
+                fast_scan=args.fast_scan,
+                year=year,
+                report=report,
+                warehouse_cache=warehouse_cache,
+            )
+            total_inserted += inserted
+            succeeded += [_label(d, year, years) for d in year_succeeded]
+            failed += [(_label(d, year, years), e) for d, e in year_failed]
+    return total_inserted, succeeded, failed, writer
+
+
+async def _run_warehouse_cache(
+    departments: list[str] | None,
+    args: argparse.Namespace,
+    report: RunReport,
+    warehouse_cache: WarehouseCache,
+) -> tuple[int, list[str], list[tuple[str, str]], WarehouseWriter]:
+    """Runs ingest_warehouse_cache per year with a writer opened for the whole run."""
+    total_inserted = 0
+    succeeded: list[str] = []
+    failed: list[tuple[str, str]] = []
+    async with LOADERS[args.loader](batch_size=args.batch_size) as writer:
+        for year in args.years:
+            inserted, year_succeeded, year_failed = await ingest_warehouse_cache(
+                warehouse_cache,
+                writer,
+                departments=departments,
+                workers=args.workers,
+                year=year,
+                report=report,
+            )
+            total_inserted += inserted
+            succeeded += [_label(d, year, args.years) for d in year_succeeded]
+            failed += [(_label(d, year, args.years), e) for d, e in year_failed]
+    return total_inserted, succeeded, failed, writer
+
+
+async def _run_parallel(
+    departments: list[str],
+    args: argparse.Namespace,
+    cache: DvfCache | None,
+    manifest: Manifest | None,
+    report: RunReport,
+    warehouse_cache: WarehouseCache | None,
+) -> tuple[int, list[str], list[tuple[str, str]], list[str], WarehouseWriter]:
+    """Runs ingest_parallel per year with a writer opened for the whole run."""
+    total_inserted = 0
+    succeeded: list[str] = []
+    failed: list[tuple[str, str]] = []
+    skipped: list[str] = []
+    async with LOADERS[args.loader](batch_size=args.batch_size) as writer:
+        for year in args.years:
+            if len(args.years) > 1:
+                print(f"Year {year}:")
+            inserted, year_succeeded, year_failed, year_skipped = await ingest_parallel(
+                departments,
+                writer,
+                limit=args.limit,
+                workers=args.workers,
+                url_template=args.url_template,
+                cache=cache,
+                manifest=manifest,
+                fast_scan=args.fast_scan,
+                year=year,
+                report=report,
+                warehouse_cache=warehouse_cache,
+            )
+            total_inserted += inserted
+            succeeded += [_label(d, year, args.years) for d in year_succeeded]
+            failed += [(_label(d, year, args.years), e) for d, e in year_failed]
+            skipped += [_label(d, year, args.years) for d in year_skipped]
+    return total_inserted, succeeded, failed, skipped, writer
+
+
+def print_summary(
+    total_departments: int,
+    total_inserted: int,
+    succeeded: list[str],
+    failed: list[tuple[str, str]],
+    writer: WarehouseWriter | None = None,
+    skipped: list[str] | None = None,
+) -> None:
+    """Prints the end-of-run ingestion summary, with the writer's counters if given."""
+    print("=" * 60)
+    print("INGESTION SUMMARY")
+    print("=" * 60)
+    print(f"Total departments processed: {len(succeeded) + len(skipped or [])}/{total_departments}")
+    print(f"Total records inserted:      {total_inserted}")
+    if skipped:
+        print(f"Skipped (already ingested):  {len(skipped)}")
+    if writer is not None:
+        print(f"Total records updated:       {writer.rows_updated}")
+        print(f"Total records unchanged:     {writer.rows_unchanged}")
+        print(f"Skipped (no date):           {writer.rows_without_date}")
+        print(f"Write throughput:            {writer.rows_per_second:,.0f} rows/sec")
+    if failed:
+        print(f"Failed departments ({len(failed)}):")
+        for dept, error in failed:
+            print(f"  - {dept}: {error}")
+    else:
+        print("All departments processed successfully.")
+    print("=" * 60)
+
+
+def write_report(report: RunReport, path: Path | None) -> None:
+    """Saves the JSON run report if --report was given."""
+    if path is not None:
+        report.save(path)
+        print(f"Run report written to {path}")
+
+
 def resolve_departments(args: argparse.Namespace) -> list[str]:
     """Determines which departments to process based on CLI arguments."""
     if args.all:
@@ -224,50 +1586,228 @@ def main() -> None:
         default=None,
         help="Maximum number of warehouses per department. Default: no limit.",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Decompress and filter downloads on the fly with constant memory.",
+    )
+    parser.add_argument(
+        "--fast-scan",
+        action="store_true",
+        help="Pre-filter raw lines and parse survivors positionally "
+        "(applies to --stream, --workers and --cache-dir).",
+    )
+    parser.add_argument(
+        "--years",
+        type=parse_years,
+        default=[DEFAULT_YEAR],
+        help=f'DVF years to ingest, e.g. "2019-2024" or "2022,2024". Default: {DEFAULT_YEAR}.',
+    )
+    parser.add_argument(
+        "--national",
+        nargs="?",
+        const=DVF_NATIONAL_URL,
+        default=None,
+        metavar="URL_OR_PATH",
+        help="Ingest the single France-wide file (default: data.gouv.fr full.csv.gz), "
+        "parsed in parallel with --workers. Without --departments, keeps every department.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Departments to process concurrently. Default: 1 (sequential).",
+    )
+    parser.add_argument(
+        "--url-template",
+        type=str,
+        default=DVF_URL_TEMPLATE,
+        help="Download URL with a {dept} and optional {year} placeholder, "
+        "e.g. a file:// mirror.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Keep downloads here, revalidate them with ETag/Last-Modified, "
+        "and skip departments already ingested from an unchanged file.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --cache-dir, re-ingest departments even if already ingested.",
+    )
+    parser.add_argument(
+        "--loader",
+        choices=sorted(LOADERS),
+        default="insert",
+        help="insert: batched INSERTs (default). copy: COPY into a staging table, then merge.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f"Rows per INSERT statement (max {MAX_BATCH_SIZE}). Default: {DEFAULT_BATCH_SIZE}.",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        default=None,
+        help="Write a JSON run report with per-department, per-stage telemetry here.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print a logfmt stats line as each department finishes.",
+    )
+    parser.add_argument(
+        "--warehouse-cache",
+        type=Path,
+        default=None,
+        metavar="DIR",
+        help="Save each department's filtered warehouses here as a columnar file.",
+    )
+    parser.add_argument(
+        "--load-warehouse-cache",
+        action="store_true",
+        help="Load the database from --warehouse-cache instead of downloading. "
+        "Without --departments or --all, loads every cached department.",
+    )
     args = parser.parse_args()
 
     if args.all and args.departments:
         print("Error: --all and --departments are mutually exclusive.", file=sys.stderr)
         sys.exit(1)
+    if args.workers < 1:
+        print("Error: --workers must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        print(f"Error: --batch-size must be between 1 and {MAX_BATCH_SIZE}.", file=sys.stderr)
+        sys.exit(1)
+    if "{dept}" not in args.url_template:
+        print("Error: --url-template must contain a {dept} placeholder.", file=sys.stderr)
+        sys.exit(1)
+    if args.load_warehouse_cache and args.warehouse_cache is None:
+        print("Error: --load-warehouse-cache requires --warehouse-cache.", file=sys.stderr)
+        sys.exit(1)
+    if args.load_warehouse_cache and args.national is not None:
+        print("Error: --load-warehouse-cache and --national are mutually exclusive.",
+              file=sys.stderr)
+        sys.exit(1)
 
     departments = resolve_departments(args)
-    total_departments = len(departments)
+    total_departments = len(departments) * len(args.years)
     limit = args.limit
 
-    print(f"Starting ingestion for {total_departments} department(s)...")
+    if args.load_warehouse_cache and not (args.departments or args.all):
+        print(f"Loading every cached department from {args.warehouse_cache}...")
+    elif args.national is not None and not (args.departments or args.all):
+        print("Starting national ingestion for all departments...")
+    else:
+        print(f"Starting ingestion for {len(departments)} department(s)...")
+    if len(args.years) > 1:
+        print(f"Years: {', '.join(map(str, args.years))}")
     if limit is not None:
         print(f"Record limit per department: {limit}")
+    if args.workers > 1:
+        print(f"Workers: {args.workers}")
     print()
 
+    report = RunReport(options=vars(args), echo=args.stats)
+    warehouse_cache = None
+    if args.warehouse_cache is not None:
+        warehouse_cache = WarehouseCache(args.warehouse_cache)
+        if limit is not None and not args.load_warehouse_cache:
+            print("Note: --limit keeps departments incomplete, so they are not cached.\n")
+
+    if args.load_warehouse_cache:
+        wanted = departments if (args.departments or args.all) else None
+        total_inserted, succeeded, failed, writer = asyncio.run(
+            _run_warehouse_cache(wanted, args, report, warehouse_cache)
+        )
+        print()
+        write_report(report, args.report)
+        total = len(succeeded) + len(failed)
+        print_summary(total, total_inserted, succeeded, failed, writer)
+        return
+
+    if args.national is not None:
+        wanted = departments if (args.departments or args.all) else None
+        total_inserted, succeeded, failed, writer = asyncio.run(
+            _run_national(wanted, args, report, warehouse_cache)
+        )
+        print()
+        write_report(report, args.report)
+        total = len(succeeded) + len(failed)
+        print_summary(total, total_inserted, succeeded, failed, writer)
+        return
+
+    cache = manifest = None
+    if args.cache_dir is not None:
+        cache = DvfCache(args.cache_dir)
+        manifest = Manifest(args.cache_dir / "manifest.json")
+        if args.force:
+            for year in args.years:
+                for dept in departments:
+                    manifest.entries.pop(manifest_key(dept, year), None)
+
+    if args.workers > 1:
+        total_inserted, succeeded, failed, skipped, writer = asyncio.run(
+            _run_parallel(departments, args, cache, manifest, report, warehouse_cache)
+        )
+        print()
+        write_report(report, args.report)
+        print_summary(total_departments, total_inserted, succeeded, failed, writer, skipped)
+        return
+
     total_inserted = 0
     succeeded: list[str] = []
     failed: list[tuple[str, str]] = []
+    skipped: list[str] = []
 
-    for i, dept in enumerate(departments, start=1):
-        print(f"[{i}/{total_departments}] Processing department {dept}...")
+    # One event loop and one writer for the whole run, so the engine and
+    # schema check are set up once rather than per department.
+    with asyncio.Runner() as runner:
+        writer = LOADERS[args.loader](batch_size=args.batch_size)
+        runner.run(writer.open())
         try:
-            count = process_department(dept, limit=limit)
-            total_inserted += count
-            succeeded.append(dept)
-        except Exception as exc:
-            error_msg = str(exc)
-            print(f"  ERROR processing department {dept}: {error_msg}", file=sys.stderr)
-            failed.append((dept, error_msg))
-        print()
+            jobs = [(year, dept) for year in args.years for dept in departments]
+            for i, (year, dept) in enumerate(jobs, start=1):
+                label = _label(dept, year, args.years)
+                print(f"[{i}/{total_departments}] Processing department {label}...")
+                stats = report.department(dept, year)
+                try:
+                    count = process_department(
+                        dept,
+                        limit=limit,
+                        stream=args.stream,
+                        url_template=args.url_template,
+                        insert=lambda whs: runner.run(writer.write(whs, stats)),
+                        cache=cache,
+                        manifest=manifest,
+                        fast_scan=args.fast_scan,
+                        year=year,
+                        stats=stats,
+                        warehouse_cache=warehouse_cache,
+                    )
+                    total_inserted += count
+                    succeeded.append(label)
+                    report.finish(stats, "ok")
+                except DepartmentSkipped as exc:
+                    print(f"  Skipped department {label}: {exc}")
+                    skipped.append(label)
+                    report.finish(stats, "skipped")
+                except Exception as exc:
+                    error_msg = str(exc)
+                    print(f"  ERROR processing department {label}: {error_msg}", file=sys.stderr)
+                    failed.append((label, error_msg))
+                    report.finish(stats, "failed", error_msg)
+                print()
+        finally:
+            runner.run(writer.close())
 
-    # Summary
-    print("=" * 60)
-    print("INGESTION SUMMARY")
-    print("=" * 60)
-    print(f"Total departments processed: {len(succeeded)}/{total_departments}")
-    print(f"Total records inserted:      {total_inserted}")
-    if failed:
-        print(f"Failed departments ({len(failed)}):")
-        for dept, error in failed:
-            print(f"  - {dept}: {error}")
-    else:
-        print("All departments processed successfully.")
-    print("=" * 60)
+    write_report(report, args.report)
+    print_summary(total_departments, total_inserted, succeeded, failed, writer, skipped)
 
 
 if __name__ == "__main__":
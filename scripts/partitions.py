@@ -0,0 +1,140 @@
+"""Yearly range partitions of the warehouses table.
+
+warehouses is partitioned by RANGE (transaction_date): one partition per
+calendar year plus a DEFAULT partition. The ingest writers create year
+partitions on demand before the first row of that year is written, so
+queries filtering on transaction_date only scan the years they touch.
+
+Databases created before partitioning hold a plain warehouses table.
+Convert them once (in a single transaction) with:
+
+    python -m scripts.partitions
+"""
+
+import asyncio
+from collections.abc import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.config import get_settings
+from app.models.schemas import Base, WarehouseModel
+
+TABLE = WarehouseModel.__tablename__
+LEGACY_TABLE = f"{TABLE}_unpartitioned"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def partition_name(year: int) -> str:
+    """Returns the name of the partition holding `year`."""
+    return f"{TABLE}_{year}"
+
+
+def year_partition_ddl(year: int) -> str:
+    """Returns the DDL creating the partition for one calendar year."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    )
+
+
+DEFAULT_PARTITION_DDL = (
+    f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"
+)
+
+
+async def table_kind(conn: AsyncConnection, table: str = TABLE) -> str | None:
+    """Returns pg_class.relkind of `table` in the current schema.
+
+    "p" for a partitioned table, "r" for a plain one, None if missing.
+    """
+    result = await conn.execute(
+        text(
+            "SELECT c.relkind FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname = :table AND n.nspname = current_schema()"
+        ),
+        {"table": table},
+    )
+    kind = result.scalar()
+    return kind.decode() if isinstance(kind, bytes) else kind
+
+
+async def ensure_partitions(conn: AsyncConnection, years: Iterable[int]) -> None:
+    """Creates the DEFAULT partition and any missing year partitions."""
+    await conn.execute(text(DEFAULT_PARTITION_DDL))
+    for year in sorted(set(years)):
+        await conn.execute(text(year_partition_ddl(year)))
+
+
+async def convert_to_partitioned(conn: AsyncConnection) -> int:
+    """Converts a plain warehouses table into the partitioned layout.
+
+    The old table and its indexes are renamed out of the way, the
+    partitioned table is created with one partition per year present in
+    the data, rows are copied over and the old table is dropped. Rows
+    without a transaction_date cannot be partitioned and are dropped.
+
+    Returns:
+        Number of rows copied, or 0 if there was nothing to convert.
+    """
+    kind = await table_kind(conn)
+    if kind != "r":
+        await conn.run_sync(Base.metadata.create_all)
+        await ensure_partitions(conn, [])
+        return 0
+
+    await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}"))
+    indexes = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :table "
+             "AND schemaname = current_schema()"),
+        {"table": LEGACY_TABLE},
+    )
+    for (index,) in indexes.all():
+        # Renaming a constraint's index renames the constraint too
+        legacy_index = index.replace(TABLE, LEGACY_TABLE, 1)
+        await conn.execute(text(f'ALTER INDEX "{index}" RENAME TO "{legacy_index}"'))
+
+    await conn.run_sync(Base.metadata.create_all)
+    years = await conn.execute(
+        text(f"SELECT DISTINCT extract(year FROM transaction_date)::int "
+             f"FROM {LEGACY_TABLE} WHERE transaction_date IS NOT NULL")
+    )
+    await ensure_partitions(conn, [year for (year,) in years.all()])
+
+    legacy_columns = await conn.execute(
+        text("SELECT column_name FROM information_schema.columns "
+             "WHERE table_name = :table AND table_schema = current_schema()"),
+        {"table": LEGACY_TABLE},
+    )
+    shared = {name for (name,) in legacy_columns.all()}
+    columns = ", ".join(c.name for c in WarehouseModel.__table__.columns if c.name in shared)
+    result = await conn.execute(
+        text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {LEGACY_TABLE} "
+             "WHERE transaction_date IS NOT NULL ON CONFLICT DO NOTHING")
+    )
+    await conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    return result.rowcount
+
+
+async def _main() -> None:
+    engine = create_async_engine(get_settings().async_database_url)
+    try:
+        async with engine.begin() as conn:
+            kind = await table_kind(conn)
+            if kind == "p":
+                print(f"{TABLE} is already partitioned.")
+                return
+            copied = await convert_to_partitioned(conn)
+        print(f"{TABLE} is now partitioned by year ({copied} rows copied).")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    """Converts the warehouses table to yearly partitions."""
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Pre-aggregated summary tables behind the analytics endpoints.
+
+Three tables hold additive aggregates of warehouses (see SummaryColumns):
+
+    department_summary  one row per department
+    commune_summary     one row per (department, commune)
+    monthly_summary     one row per (department, month of transaction_date)
+
+Every table is keyed by department, so the ingest writers refresh a
+department's rows (delete, then re-aggregate it from warehouses) right
+after loading it, and the analytics endpoints read a number of rows that
+depends on the number of groups rather than of transactions. Rows without
+a department are left out of department_summary, as /by-department and
+/department-stats always left them out, but still count in the commune and
+monthly summaries, under the department NO_DEPARTMENT. Writers refresh
+them by passing NO_DEPARTMENT among the departments.
+
+Every refresh also bumps dataset_version, which the API uses to tell
+when results it cached were computed from older data.
+
+Databases populated before these tables existed, or edited by hand, are
+rebuilt with:
+
+    python -m scripts.summaries
+"""
+
+import asyncio
+from collections.abc import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.config import get_settings
+from app.models.schemas import (
+    Base,
+    CommuneSummaryModel,
+    DatasetVersionModel,
+    DepartmentSummaryModel,
+    MonthlySummaryModel,
+    WarehouseModel,
+)
+
+TABLE = WarehouseModel.__tablename__
+
+PRICE_COUNTS = "price_eur IS NOT NULL AND price_eur <> 0"
+SURFACE_COUNTS = "surface_m2 IS NOT NULL AND surface_m2 <> 0"
+PRICE_PER_M2_COUNTS = f"{PRICE_COUNTS} AND surface_m2 > 0"
+
+# SQL aggregate per SummaryColumns column
+AGGREGATES = {
+    "row_count": "count(*)",
+    "price_count": f"count(*) FILTER (WHERE {PRICE_COUNTS})",
+    "price_sum": f"coalesce(sum(price_eur) FILTER (WHERE {PRICE_COUNTS}), 0)",
+    "surface_count": f"count(*) FILTER (WHERE {SURFACE_COUNTS})",
+    "surface_sum": f"coalesce(sum(surface_m2) FILTER (WHERE {SURFACE_COUNTS}), 0)",
+    "price_per_m2_count": f"count(*) FILTER (WHERE {PRICE_PER_M2_COUNTS})",
+    "price_per_m2_sum": (
+        f"coalesce(sum(price_eur / surface_m2) FILTER (WHERE {PRICE_PER_M2_COUNTS}), 0)"
+    ),
+}
+
+SUMMARY_MODELS = (DepartmentSummaryModel, CommuneSummaryModel, MonthlySummaryModel)
+
+VERSION_TABLE = DatasetVersionModel.__tablename__
+BUMP_VERSION = (
+    f"INSERT INTO {VERSION_TABLE} (id, version, updated_at) VALUES (1, 1, now()) "
+    f"ON CONFLICT (id) DO UPDATE SET version = {VERSION_TABLE}.version + 1, updated_at = now()"
+)
+
+# Summary key of rows without a department, which /top-communes reports
+# as the commune's department
+NO_DEPARTMENT = ""
+SUMMARY_DEPARTMENT = f"coalesce(department, '{NO_DEPARTMENT}')"
+
+# (table, {group column: SQL expression}, extra WHERE condition)
+SUMMARIES = (
+    (
+        DepartmentSummaryModel.__tablename__,
+        {"department": "department"},
+        "department IS NOT NULL",
+    ),
+    (
+        CommuneSummaryModel.__tablename__,
+        {"department": SUMMARY_DEPARTMENT, "commune": "commune"},
+        "commune IS NOT NULL",
+    ),
+    (
+        MonthlySummaryModel.__tablename__,
+        {"department": SUMMARY_DEPARTMENT, "month": "date_trunc('month', transaction_date)::date"},
+        "transaction_date IS NOT NULL",
+    ),
+)
+
+
+def summary_department(department: str | None) -> str:
+    """The summary key of a warehouse's department."""
+    return department or NO_DEPARTMENT
+
+
+def refresh_statements(all_departments: bool = False) -> list[str]:
+    """Returns the SQL re-aggregating the summary tables, then bumping the version.
+
+    The statements take a :departments array parameter, unless
+    `all_departments` is set, in which case they rebuild everything.
+    """
+    scope = "TRUE" if all_departments else "department = ANY(:departments)"
+    # Spelled out rather than SUMMARY_DEPARTMENT = ANY(...), which could
+    # not use the department index
+    source_scope = "TRUE" if all_departments else (
+        f"(department = ANY(:departments) "
+        f"OR department IS NULL AND '{NO_DEPARTMENT}' = ANY(:departments))"
+    )
+    statements = []
+    for table, groups, condition in SUMMARIES:
+        where = f"{source_scope} AND {condition}"
+        columns = ", ".join([*groups, *AGGREGATES])
+        expressions = ", ".join(
+            [*(f"{expr} AS {name}" for name, expr in groups.items()),
+             *(f"{expr} AS {name}" for name, expr in AGGREGATES.items())]
+        )
+        statements.append(f"DELETE FROM {table} WHERE {scope}")
+        statements.append(
+            f"INSERT INTO {table} ({columns}) SELECT {expressions} FROM {TABLE} "
+            f"WHERE {where} GROUP BY {', '.join(groups.values())}"
+        )
+    statements.append(BUMP_VERSION)
+    return statements
+
+
+# Serialises refreshes, so two writers summarising the same department
+# cannot both re-insert its rows.
+LOCK_STATEMENT = f"SELECT pg_advisory_xact_lock(hashtext('{TABLE}_summaries'))"
+
+
+async def refresh_summaries(
+    conn: AsyncConnection, departments: Iterable[str] | None = None
+) -> int:
+    """Re-aggregates the summary rows of `departments`, or of every department.
+
+    Must run inside a transaction. Returns the number of statements sent.
+    """
+    if departments is None:
+        statements = refresh_statements(all_departments=True)
+        params = {}
+    else:
+        departments = sorted(set(departments))
+        if not departments:
+            return 0
+        statements = refresh_statements()
+        params = {"departments": departments}
+    await conn.execute(text(LOCK_STATEMENT))
+    for statement in statements:
+        await conn.execute(text(statement), params)
+    return 1 + len(statements)
+
+
+async def _main() -> None:
+    engine = create_async_engine(get_settings().async_database_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(
+                Base.metadata.create_all,
+                tables=[model.__table__ for model in (*SUMMARY_MODELS, DatasetVersionModel)],
+            )
+            await refresh_summaries(conn)
+            result = await conn.execute(
+                text(f"SELECT count(*) FROM {DepartmentSummaryModel.__tablename__}")
+            )
+        print(f"Summaries rebuilt for {result.scalar()} departments.")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    """Rebuilds every summary table from warehouses."""
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
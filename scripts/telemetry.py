@@ -0,0 +1,204 @@
+"""Per-stage telemetry for DVF ingestion runs.
+
+DepartmentStats collects, for one department of one DVF year, the wall
+time of each pipeline stage, bytes downloaded, rows scanned and kept,
+write outcomes, rows skipped for lacking a transaction date, database
+round trips and peak memory. RunReport gathers
+them for a whole run and writes the JSON report behind --report;
+DepartmentStats.stats_line renders the logfmt line behind --stats.
+
+Stages are named after what the code is doing, and a department only
+reports those its ingestion mode runs:
+
+    download    fetching the .csv.gz (or revalidating the cached copy)
+    decompress  gunzipping it to a temporary CSV (buffered mode)
+    parse       reading the CSV into rows (buffered mode)
+    filter      keeping warehouse rows (buffered mode)
+    scan        decompress + parse + filter in one streaming pass
+    cache       saving the kept rows to the warehouse cache
+    load        reading them back from it (--load-warehouse-cache)
+    insert      writing the kept rows to the database
+"""
+
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+STAGES = ("download", "decompress", "parse", "filter", "scan", "cache", "load", "insert")
+
+# Counters summed into the report totals
+COUNTERS = (
+    "bytes_downloaded",
+    "rows_scanned",
+    "rows_kept",
+    "rows_inserted",
+    "rows_updated",
+    "rows_unchanged",
+    "rows_without_date",
+    "db_round_trips",
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _round(value: float | None, digits: int = 3) -> float | None:
+    return None if value is None else round(value, digits)
+
+
+class ByteCounter:
+    """Wraps a binary stream and counts the bytes read through it."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self.stream = stream
+        self.bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+    def __enter__(self) -> "ByteCounter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stream.close()
+
+
+class DepartmentStats:
+    """Measurements for one department of one DVF year.
+
+    `status` is "ok", "skipped" or "failed" once finish() is called.
+    With --workers, stages of different departments overlap, so their
+    times add up to more than the run's wall time; peak_rss_mb is then
+    the peak of the worker process that parsed the department.
+    """
+
+    def __init__(self, department: str, year: int) -> None:
+        self.department = department
+        self.year = year
+        self.status = "running"
+        self.error: str | None = None
+        self.stages: dict[str, float] = {}
+        self.bytes_downloaded = 0
+        self.rows_scanned = 0
+        self.rows_kept = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.rows_unchanged = 0
+        # Kept rows the writer skipped: no partition accepts them
+        self.rows_without_date = 0
+        self.db_round_trips = 0
+        self.peak_rss_mb: float | None = None
+        self.wall_seconds: float | None = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Adds the time spent in the block to stage `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def start(self) -> None:
+        """Restarts the wall clock, e.g. once a queued department gets a worker."""
+        self._started = time.perf_counter()
+
+    def finish(self, status: str, error: str | None = None) -> None:
+        """Records the outcome and the department's total wall time."""
+        self.status = status
+        self.error = error
+        self.wall_seconds = time.perf_counter() - self._started
+
+    def to_dict(self) -> dict:
+        return {
+            "department": self.department,
+            "year": self.year,
+            "status": self.status,
+            "error": self.error,
+            "wall_seconds": _round(self.wall_seconds),
+            "stages": {name: _round(self.stages[name]) for name in STAGES if name in self.stages},
+            **{name: getattr(self, name) for name in COUNTERS},
+            "peak_rss_mb": _round(self.peak_rss_mb, 1),
+        }
+
+    def stats_line(self) -> str:
+        """One logfmt line, e.g. for a log shipper feeding a dashboard."""
+        fields = {
+            "department": self.department,
+            "year": self.year,
+            "status": self.status,
+            "wall_s": _round(self.wall_seconds),
+            **{f"{name}_s": _round(self.stages[name]) for name in STAGES if name in self.stages},
+            **{name: getattr(self, name) for name in COUNTERS},
+            "peak_rss_mb": _round(self.peak_rss_mb, 1),
+        }
+        return "stats " + " ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+
+
+class RunReport:
+    """Every department's DepartmentStats for one ingestion run.
+
+    With `echo`, finish() prints each department's stats line as soon as
+    it completes.
+    """
+
+    def __init__(self, options: dict | None = None, echo: bool = False) -> None:
+        self.options = options or {}
+        self.echo = echo
+        self.started_at = _now()
+        self.departments: list[DepartmentStats] = []
+        self._started = time.perf_counter()
+
+    def department(self, department: str, year: int) -> DepartmentStats:
+        """Starts and registers the stats of one department."""
+        stats = DepartmentStats(department, year)
+        self.departments.append(stats)
+        return stats
+
+    def finish(self, stats: DepartmentStats, status: str, error: str | None = None) -> None:
+        """Finishes a department's stats and echoes its stats line if enabled."""
+        stats.finish(status, error)
+        if self.echo:
+            print(stats.stats_line(), flush=True)
+
+    def to_dict(self) -> dict:
+        stages: dict[str, float] = {}
+        for stats in self.departments:
+            for name, seconds in stats.stages.items():
+                stages[name] = stages.get(name, 0.0) + seconds
+        statuses = [stats.status for stats in self.departments]
+        return {
+            "started_at": self.started_at,
+            "finished_at": _now(),
+            "wall_seconds": _round(time.perf_counter() - self._started),
+            "python": platform.python_version(),
+            "options": self.options,
+            "totals": {
+                "departments": len(self.departments),
+                **{status: statuses.count(status) for status in ("ok", "skipped", "failed")},
+                "stages": {name: _round(stages[name]) for name in STAGES if name in stages},
+                **{name: sum(getattr(s, name) for s in self.departments) for name in COUNTERS},
+                "peak_rss_mb": _round(max(
+                    (s.peak_rss_mb for s in self.departments if s.peak_rss_mb is not None),
+                    default=None,
+                ), 1),
+            },
+            "departments": [stats.to_dict() for stats in self.departments],
+        }
+
+    def save(self, path: Path) -> None:
+        """Writes the report as JSON, atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict(), indent=2, default=str), encoding="utf-8")
+        os.replace(tmp, path)
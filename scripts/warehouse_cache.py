@@ -0,0 +1,199 @@
+"""Columnar on-disk cache of filtered warehouses, one file per department and year.
+
+Only a few thousand rows per department survive the ingest filters, so
+keeping them lets the database be rebuilt (new environment, schema
+change, fixtures) without downloading and re-parsing the DVF files.
+
+Each file stores the parsed rows column by column with typed encodings,
+every column zlib-compressed:
+
+    b"DVFW" + format version (1 byte)
+    header length (uint32, little-endian) + JSON header
+        {"rows", "department", "year", "created_at",
+         "columns": [{"name", "type", "size"}, ...]}
+    one block per column, `size` compressed bytes each:
+        null mask (1 byte per row), then the values:
+        f64   float64 per row
+        date  int32 days since 1970-01-01 per row
+        str   uint32 offsets (rows + 1) into a UTF-8 blob, then the blob
+
+Column types follow WarehouseModel, so new model columns are cached
+without touching this module. Columns missing from an older file load
+as None.
+"""
+
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import Date, Float, String
+
+from app.models.schemas import WarehouseModel
+
+MAGIC = b"DVFW"
+VERSION = 1
+SUFFIX = ".dvfw"
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _column_type(column) -> str:
+    if isinstance(column.type, Float):
+        return "f64"
+    if isinstance(column.type, Date):
+        return "date"
+    if isinstance(column.type, String):
+        return "str"
+    raise TypeError(f"No cache encoding for column {column.name} ({column.type})")
+
+
+# (name, type) of every cached column: the parsed row, i.e. all but the id
+COLUMNS: list[tuple[str, str]] = [
+    (c.name, _column_type(c)) for c in WarehouseModel.__table__.columns if c.name != "id"
+]
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def encode_column(kind: str, values: list) -> bytes:
+    """Encodes one column (null mask + typed values), uncompressed."""
+    mask = bytes(v is None for v in values)
+    if kind == "f64":
+        body = _little_endian(array("d", (0.0 if v is None else v for v in values)))
+    elif kind == "date":
+        body = _little_endian(
+            array("i", (0 if v is None else v.toordinal() - EPOCH_ORDINAL for v in values))
+        )
+    elif kind == "str":
+        encoded = [b"" if v is None else v.encode("utf-8") for v in values]
+        offsets = array("I", [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        body = _little_endian(offsets) + b"".join(encoded)
+    else:
+        raise ValueError(f"Unknown column type {kind!r}")
+    return mask + body
+
+
+def decode_column(kind: str, data: bytes, rows: int) -> list:
+    """Decodes a column written by encode_column."""
+    mask, body = data[:rows], data[rows:]
+    if kind == "f64":
+        values = list(_from_little_endian("d", body))
+    elif kind == "date":
+        values = [date.fromordinal(d + EPOCH_ORDINAL) for d in _from_little_endian("i", body)]
+    elif kind == "str":
+        split = (rows + 1) * array("I").itemsize
+        offsets = _from_little_endian("I", body[:split])
+        blob = body[split:]
+        values = [
+            blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(rows)
+        ]
+    else:
+        raise ValueError(f"Unknown column type {kind!r}")
+    return [None if null else value for null, value in zip(mask, values)]
+
+
+def write_warehouses(path: Path, warehouses: list[dict], **meta) -> None:
+    """Writes parsed warehouses to a columnar file, atomically.
+
+    Extra keyword arguments (department, year) are stored in the header.
+    """
+    blocks = [
+        zlib.compress(encode_column(kind, [wh.get(name) for wh in warehouses]))
+        for name, kind in COLUMNS
+    ]
+    header = json.dumps({
+        **meta,
+        "rows": len(warehouses),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "columns": [
+            {"name": name, "type": kind, "size": len(block)}
+            for (name, kind), block in zip(COLUMNS, blocks)
+        ],
+    }).encode("utf-8")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + bytes([VERSION]) + struct.pack("<I", len(header)) + header)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp, path)
+
+
+def read_header(path: Path) -> dict:
+    """Reads a cache file's JSON header without decoding its columns."""
+    with open(path, "rb") as f:
+        return _read_header(f, path)
+
+
+def _read_header(f, path: Path) -> dict:
+    prefix = f.read(len(MAGIC) + 5)
+    if prefix[:len(MAGIC)] != MAGIC or prefix[len(MAGIC)] != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} warehouse cache file")
+    (length,) = struct.unpack("<I", prefix[len(MAGIC) + 1:])
+    return json.loads(f.read(length))
+
+
+def read_warehouses(path: Path) -> list[dict]:
+    """Reads a columnar file back into parsed warehouse dicts."""
+    with open(path, "rb") as f:
+        header = _read_header(f, path)
+        rows = header["rows"]
+        columns = {}
+        for column in header["columns"]:
+            data = zlib.decompress(f.read(column["size"]))
+            columns[column["name"]] = decode_column(column["type"], data, rows)
+    names = [name for name, _ in COLUMNS]
+    missing = [None] * rows
+    return [
+        dict(zip(names, values))
+        for values in zip(*(columns.get(name, missing) for name in names))
+    ]
+
+
+class WarehouseCache:
+    """Directory of columnar files, laid out as {year}/{department}.dvfw."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+
+    def path_for(self, department: str, year: int) -> Path:
+        return self.directory / str(year) / f"{department}{SUFFIX}"
+
+    def save(self, department: str, year: int, warehouses: list[dict]) -> Path:
+        """Replaces the cached warehouses of one department and year."""
+        path = self.path_for(department, year)
+        write_warehouses(path, warehouses, department=department, year=year)
+        return path
+
+    def load(self, department: str, year: int) -> list[dict]:
+        """Returns the cached warehouses of one department and year.
+
+        Raises:
+            FileNotFoundError: the department was never cached for that year.
+        """
+        return read_warehouses(self.path_for(department, year))
+
+    def departments(self, year: int) -> list[str]:
+        """Departments cached for `year`, sorted."""
+        return sorted(p.stem for p in (self.directory / str(year)).glob(f"*{SUFFIX}"))
@@ -1,3 +1,7 @@
+from datetime import date
+from uuid import UUID
+
+from app.routers.warehouses import decode_cursor, encode_cursor
 from tests.conftest import make_warehouse, mock_list_query, mock_stats_query
 
 
@@ -48,6 +52,48 @@ class TestWarehousesEndpoint:
         assert response.json()["limit"] == 1
 
 
+class TestCursorPagination:
+    def test_full_page_returns_cursor_of_its_last_row(self, client, mock_session):
+        warehouses = [make_warehouse() for _ in range(6)]
+        mock_list_query(mock_session, warehouses, total=20)
+
+        response = client.get("/api/warehouses?limit=5")
+        data = response.json()
+        assert len(data["items"]) == 5
+        last = warehouses[4]
+        assert decode_cursor(data["next_cursor"]) == (last.transaction_date, last.id)
+
+    def test_last_page_has_no_cursor(self, client, mock_session):
+        mock_list_query(mock_session, [make_warehouse() for _ in range(3)])
+
+        response = client.get("/api/warehouses?limit=5")
+        assert response.json()["next_cursor"] is None
+
+    def test_cursor_seeks_past_the_previous_page(self, client, mock_session):
+        mock_list_query(mock_session, [])
+        cursor = encode_cursor(date(2024, 3, 1), UUID(int=7))
+
+        response = client.get(f"/api/warehouses?cursor={cursor}")
+        assert response.status_code == 200
+        page_query = str(mock_session.execute.call_args_list[1].args[0])
+        assert "(warehouses.transaction_date, warehouses.id) <" in page_query
+
+    def test_invalid_cursor_is_rejected(self, client, mock_session):
+        response = client.get("/api/warehouses?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_cursor_and_offset_cannot_be_combined(self, client, mock_session):
+        cursor = encode_cursor(date(2024, 3, 1), UUID(int=7))
+
+        response = client.get(f"/api/warehouses?cursor={cursor}&offset=20")
+        assert response.status_code == 400
+
+    def test_cursor_round_trip(self):
+        assert decode_cursor(encode_cursor(date(2024, 12, 31), UUID(int=1))) == (
+            date(2024, 12, 31), UUID(int=1)
+        )
+
+
 class TestStatsEndpoint:
     def test_stats_returns_200(self, client, mock_session):
         mock_stats_query(mock_session, count=2, avg_price=125000.0, total_surface=1250.0)
@@ -0,0 +1,48 @@
+"""Tests for the synthetic DVF generator and the ingestion benchmark."""
+
+import gzip
+
+from benchmarks.bench_ingest import STAGES, compare, run_pipeline
+from benchmarks.synthetic import write_dvf_gzip
+
+
+class TestSyntheticDvf:
+    """Tests for the deterministic DVF file generator."""
+
+    def test_same_seed_yields_identical_files(self, tmp_path):
+        """Verify the generator is reproducible, so runs are comparable."""
+        first = write_dvf_gzip(tmp_path / "a.csv.gz", 500, seed=3)
+        second = write_dvf_gzip(tmp_path / "b.csv.gz", 500, seed=3)
+
+        assert gzip.decompress(first.read_bytes()) == gzip.decompress(second.read_bytes())
+
+    def test_prefix_namespaces_mutation_ids(self, tmp_path):
+        """Verify generated mutation ids carry the requested prefix."""
+        path = write_dvf_gzip(tmp_path / "77.csv.gz", 10, prefix="bench-x")
+
+        lines = gzip.decompress(path.read_bytes()).decode("utf-8").splitlines()
+        assert all(line.startswith("bench-x-") for line in lines[1:])
+
+
+class TestIngestBenchmark:
+    """Tests for the per-stage ingestion benchmark."""
+
+    def test_pipeline_reports_every_stage_but_insert(self, tmp_path):
+        """Verify each stage reports time, throughput and memory without a database."""
+        gz_path = write_dvf_gzip(tmp_path / "77.csv.gz", 2000, warehouse_ratio=0.05)
+
+        stages = run_pipeline(gz_path)
+
+        assert list(stages) == [s for s in STAGES if s != "insert"]
+        for figures in stages.values():
+            assert figures["rows"] == 2000
+            assert figures["seconds"] >= 0
+            assert figures["peak_rss_mb"] > 0
+        assert 0 < stages["filter"]["kept"] < 2000
+
+    def test_compare_flags_throughput_drops(self):
+        """Verify only stages slower than the tolerance count as regressions."""
+        baseline = {"stages": {"parse": {"rows_per_sec": 1000}, "filter": {"rows_per_sec": 1000}}}
+        result = {"stages": {"parse": {"rows_per_sec": 900}, "filter": {"rows_per_sec": 700}}}
+
+        assert compare(result, baseline, tolerance=0.2) == ["filter"]
@@ -0,0 +1,367 @@
+"""Tests for the HTTP conditional caching of the read endpoints."""
+
+import asyncio
+import inspect
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import Depends, Request
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.caching import DatasetStamp, ResponseCache, get_dataset_stamp, response_cache
+from app.config import Settings, get_settings
+from app.db import get_db_session
+from app.main import app
+from app.models.schemas import Base, WarehouseModel
+from scripts.partitions import ensure_partitions
+from scripts.summaries import refresh_summaries
+from tests.conftest import (
+    is_version_read,
+    mock_list_query,
+    mock_stats_query,
+    requires_postgres,
+    sessions_of,
+)
+
+LAST_MODIFIED = "Sat, 01 Jun 2024 12:00:30 GMT"
+STAMP = DatasetStamp(1, None)
+
+
+class TestCacheHeaders:
+    """The mocked client reads dataset_version 1, bumped at conftest.DATASET_STAMP."""
+
+    def test_reads_carry_the_version(self, client, mock_session):
+        # One endpoint returning a FastJSONResponse, one returning a model
+        mock_list_query(mock_session, [])
+        listing = client.get("/api/warehouses")
+        mock_stats_query(mock_session, 0, None, None)
+        stats = client.get("/api/stats")
+
+        for response in (listing, stats):
+            assert response.status_code == 200
+            assert response.headers["etag"] == 'W/"1"'
+            assert response.headers["last-modified"] == LAST_MODIFIED
+            assert response.headers["cache-control"] == "public, max-age=0, must-revalidate"
+
+    def test_max_age_is_configurable(self, client, mock_session):
+        app.dependency_overrides[get_settings] = lambda: Settings(http_cache_max_age=60)
+        mock_stats_query(mock_session, 0, None, None)
+
+        response = client.get("/api/stats")
+
+        assert response.headers["cache-control"] == "public, max-age=60, must-revalidate"
+
+    def test_errors_and_health_carry_none(self, client):
+        assert "etag" not in client.get("/api/warehouses/nearby?lat=1&lng=1&k=5&limit=5").headers
+        assert "etag" not in client.get("/health").headers
+
+
+class TestNotModified:
+    @pytest.mark.parametrize("if_none_match", ['W/"1"', '"1"', '"0", W/"1"', "*"])
+    def test_current_etag_skips_the_endpoint(self, client, mock_session, if_none_match):
+        response = client.get("/api/warehouses", headers={"If-None-Match": if_none_match})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == 'W/"1"'
+        mock_session.execute.assert_not_awaited()
+
+    def test_stale_etag_gets_the_data(self, client, mock_session):
+        mock_stats_query(mock_session, 3, 100.0, 30.0)
+
+        response = client.get("/api/stats", headers={"If-None-Match": 'W/"0"'})
+
+        assert (response.status_code, response.json()["count"]) == (200, 3)
+
+    @pytest.mark.parametrize(
+        "since, status",
+        [
+            (LAST_MODIFIED, 304),
+            ("Sun, 02 Jun 2024 00:00:00 GMT", 304),
+            ("Sat, 01 Jun 2024 12:00:29 GMT", 200),
+            ("not a date", 200),
+        ],
+    )
+    def test_if_modified_since(self, client, mock_session, since, status):
+        mock_stats_query(mock_session, 0, None, None)
+
+        response = client.get("/api/stats", headers={"If-Modified-Since": since})
+
+        assert response.status_code == status
+
+    def test_if_none_match_takes_precedence(self, client, mock_session):
+        mock_stats_query(mock_session, 0, None, None)
+
+        response = client.get(
+            "/api/stats", headers={"If-None-Match": 'W/"0"', "If-Modified-Since": LAST_MODIFIED}
+        )
+
+        assert response.status_code == 200
+
+
+class TestResponseCache:
+    def test_hit_requires_the_same_version(self):
+        cache = ResponseCache()
+        cache.put(("/a",), 1, b"[]")
+
+        assert cache.get(("/a",), 1) == b"[]"
+        assert cache.get(("/b",), 1) is None
+        assert cache.stats() == dict(hits=1, misses=1, evictions=0, coalesced=0, size=1)
+
+    def test_newer_version_drops_every_entry(self):
+        cache = ResponseCache()
+        cache.put(("/a",), 1, b"1")
+        cache.put(("/b",), 1, b"1")
+
+        assert cache.get(("/a",), 2) is None
+        assert cache.stats()["size"] == 0
+
+    def test_older_version_is_neither_served_nor_stored(self):
+        cache = ResponseCache()
+        cache.put(("/a",), 2, b"2")
+        cache.put(("/a",), 1, b"1")
+
+        assert cache.get(("/a",), 1) is None
+        assert cache.get(("/a",), 2) == b"2"
+
+    def test_entries_expire(self, monkeypatch):
+        cache = ResponseCache(ttl=60)
+        cache.put(("/a",), 1, b"[]")
+        now = time.monotonic()
+        monkeypatch.setattr("app.caching.time.monotonic", lambda: now + 61)
+
+        assert cache.get(("/a",), 1) is None
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ResponseCache(maxsize=2)
+        cache.put(("/a",), 1, b"a")
+        cache.put(("/b",), 1, b"b")
+        cache.get(("/a",), 1)
+        cache.put(("/c",), 1, b"c")
+
+        assert cache.get(("/b",), 1) is None
+        assert (cache.get(("/a",), 1), cache.get(("/c",), 1)) == (b"a", b"c")
+        assert cache.stats()["evictions"] == 1
+
+    def test_size_and_ttl_come_from_the_settings(self, monkeypatch):
+        monkeypatch.setenv("RESPONSE_CACHE_SIZE", "16")
+        monkeypatch.setenv("RESPONSE_CACHE_TTL", "30")
+
+        settings = Settings()
+
+        assert (settings.response_cache_size, settings.response_cache_ttl) == (16, 30.0)
+        assert (response_cache.maxsize, response_cache.ttl) == (
+            get_settings().response_cache_size, get_settings().response_cache_ttl
+        )
+
+
+def cache_request(path: str = "/api/stats") -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "headers": []})
+
+
+class TestCoalescing:
+    """Concurrent misses of one entry share a single call of the endpoint."""
+
+    def test_identical_requests_share_one_call(self):
+        cache = ResponseCache()
+        calls = []
+
+        @cache.cached
+        async def endpoint(department: str | None = None):
+            calls.append(department)
+            await asyncio.sleep(0.01)
+            return {"department": department}
+
+        async def burst():
+            return await asyncio.gather(*(
+                endpoint(department=department, cache_request=cache_request(), cache_stamp=STAMP)
+                for department in ["77"] * 5 + ["91"] * 3
+            ))
+
+        responses = asyncio.run(burst())
+
+        assert sorted(calls) == ["77", "91"]
+        assert {response.body for response in responses} == {
+            b'{"department":"77"}', b'{"department":"91"}'
+        }
+        assert cache.stats()["coalesced"] == 6
+
+    def test_failure_reaches_every_waiter(self):
+        cache = ResponseCache()
+
+        @cache.cached
+        async def endpoint():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("database is down")
+
+        async def burst():
+            return await asyncio.gather(
+                *(endpoint(cache_request=cache_request(), cache_stamp=STAMP) for _ in range(3)),
+                return_exceptions=True,
+            )
+
+        assert [str(error) for error in asyncio.run(burst())] == ["database is down"] * 3
+        assert cache.stats()["size"] == 0
+
+    def test_can_be_disabled(self):
+        cache = ResponseCache(coalesce=False)
+        calls = []
+
+        @cache.cached
+        async def endpoint():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return []
+
+        async def burst():
+            await asyncio.gather(
+                *(endpoint(cache_request=cache_request(), cache_stamp=STAMP) for _ in range(3))
+            )
+
+        asyncio.run(burst())
+
+        assert (len(calls), cache.stats()["coalesced"]) == (3, 0)
+
+    def test_shared_call_owns_its_session(self):
+        cache = ResponseCache()
+        owned = AsyncMock()
+
+        @cache.cached
+        async def endpoint(session: AsyncSession = Depends(get_db_session)):
+            await asyncio.sleep(0.01)
+            return {"owned": session is owned}
+
+        def call():
+            return asyncio.ensure_future(endpoint(
+                cache_request=cache_request(), cache_stamp=STAMP, cache_sessions=sessions_of(owned)
+            ))
+
+        async def burst():
+            first, others = call(), [call() for _ in range(3)]
+            await asyncio.sleep(0)
+            first.cancel()  # its client disconnected
+            return await asyncio.gather(*others)
+
+        assert {response.body for response in asyncio.run(burst())} == {b'{"owned":true}'}
+        assert "session" not in inspect.signature(endpoint).parameters
+
+    def test_version_row_is_read_once_per_burst(self):
+        async def slow_read(statement):
+            await asyncio.sleep(0.01)
+            result = MagicMock()
+            result.first.return_value = (4, None)
+            return result
+
+        sessions = [AsyncMock(execute=AsyncMock(side_effect=slow_read)) for _ in range(5)]
+
+        async def burst():
+            return await asyncio.gather(
+                *(get_dataset_stamp(sessions_of(session)) for session in sessions)
+            )
+
+        assert set(asyncio.run(burst())) == {DatasetStamp(4, None)}
+        assert sum(session.execute.await_count for session in sessions) == 1
+
+
+def mock_trends_query(mock_session):
+    mock_result = MagicMock()
+    mock_result.all.return_value = []
+    mock_session.execute = AsyncMock(return_value=mock_result)
+
+
+class TestCachedEndpoints:
+    def test_second_request_skips_the_queries(self, client, mock_session):
+        mock_stats_query(mock_session, 3, 100.0, 30.0)
+
+        first = client.get("/api/stats")
+        second = client.get("/api/stats")
+
+        assert second.content == first.content
+        assert second.json() == {"count": 3, "avg_price": 100.0, "total_surface": 30.0}
+        assert second.headers["etag"] == 'W/"1"'
+        assert mock_session.execute.await_count == 1
+        assert client.get("/metrics").json()["response_cache"] == dict(
+            hits=1, misses=1, evictions=0, coalesced=0, size=1
+        )
+
+    def test_key_is_the_parsed_parameters(self, client, mock_session):
+        mock_trends_query(mock_session)
+
+        client.get("/api/analytics/price-trends?date_from=2024-01-01&date_to=2024-06-30")
+        client.get("/api/analytics/price-trends?date_to=2024-06-30&date_from=2024-01-01&x=1")
+        client.get("/api/analytics/price-trends?date_from=2024-01-01")
+
+        assert mock_session.execute.await_count == 2
+
+    def test_errors_are_not_cached(self, client, mock_session):
+        assert client.get("/api/analytics/price-trends?date_from=x").status_code == 422
+        assert client.get("/metrics").json()["response_cache"]["size"] == 0
+
+
+@requires_postgres
+class TestVersionFromPostgres:
+    def test_ingest_invalidates_the_etag(self, pg_client):
+        async def create():
+            async with pg_client.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+        async def ingest():
+            async with pg_client.engine.begin() as conn:
+                await refresh_summaries(conn, ["77"])
+
+        asyncio.run(create())
+        before = pg_client.get("/api/analytics/department-stats")
+        assert before.headers["etag"] == 'W/"0"'
+        assert "last-modified" not in before.headers
+
+        asyncio.run(ingest())
+        stale = pg_client.get("/api/analytics/department-stats", headers={"If-None-Match": 'W/"0"'})
+        assert (stale.status_code, stale.headers["etag"]) == (200, 'W/"1"')
+        assert "last-modified" in stale.headers
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(pg_client.engine.sync_engine, "before_cursor_execute", capture)
+        current = pg_client.get(
+            "/api/analytics/department-stats", headers={"If-None-Match": stale.headers["etag"]}
+        )
+        event.remove(pg_client.engine.sync_engine, "before_cursor_execute", capture)
+
+        assert current.status_code == 304
+        assert [is_version_read(statement) for statement in statements] == [True]
+
+    def test_ingest_invalidates_cached_responses(self, pg_client):
+        async def ingest(department):
+            async with pg_client.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await ensure_partitions(conn, [2024])
+                await conn.execute(text(
+                    "INSERT INTO warehouses (id, dvf_mutation_id, department, transaction_date) "
+                    f"VALUES (gen_random_uuid(), 'm-{department}', '{department}', '2024-03-05')"
+                ))
+                await refresh_summaries(conn, [department])
+
+        asyncio.run(ingest("77"))
+        before = pg_client.get("/api/departments").json()
+        asyncio.run(ingest("91"))
+        after = pg_client.get("/api/departments").json()
+
+        assert (before, after) == (["77"], ["77", "91"])
+
+    def test_missing_version_table_reads_as_version_0(self, pg_client):
+        async def create():
+            # A database from before dataset_version existed
+            async with pg_client.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all, tables=[WarehouseModel.__table__])
+
+        asyncio.run(create())
+        stats = pg_client.get("/api/stats")
+        nearby = pg_client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522")
+
+        assert (stats.status_code, stats.headers["etag"]) == (200, 'W/"0"')
+        assert (nearby.status_code, nearby.json()["total"]) == (200, 0)
@@ -0,0 +1,171 @@
+"""Tests for the marker clusters of GET /api/warehouses/clusters."""
+
+import asyncio
+import random
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+from sqlalchemy import text
+
+from app.clusters import MAX_CLUSTER_ZOOM, MAX_POINTS, ClusterPyramid, cell_range, parse_bbox
+from app.models.schemas import Base
+from scripts.partitions import ensure_partitions
+from tests.conftest import make_warehouse, mock_core_result, requires_postgres, warehouse_row
+
+FRANCE = (-5.5, 41.0, 10.0, 51.5)
+
+
+@pytest.fixture(scope="module")
+def france():
+    """(lats, lngs, price_per_m2) of 5000 random warehouses; every tenth has no price."""
+    rng = random.Random(0)
+    lats = np.array([rng.uniform(42.0, 51.0) for _ in range(5000)])
+    lngs = np.array([rng.uniform(-4.5, 8.0) for _ in range(5000)])
+    prices = np.array([np.nan if i % 10 == 0 else rng.uniform(50, 500) for i in range(5000)])
+    return lats, lngs, prices
+
+
+class TestParseBbox:
+    def test_reads_west_south_east_north(self):
+        assert parse_bbox("2.2,48.8,2.5,48.9") == (2.2, 48.8, 2.5, 48.9)
+
+    @pytest.mark.parametrize("bbox", ["2.2,48.8,2.5", "a,b,c,d", "2.5,48.8,2.2,48.9", "0,-91,1,0"])
+    def test_rejects_malformed_boxes(self, bbox):
+        with pytest.raises(ValueError):
+            parse_bbox(bbox)
+
+
+class TestClusterPyramid:
+    """Every level partitions the warehouses into cells."""
+
+    @pytest.mark.parametrize("zoom", range(0, MAX_CLUSTER_ZOOM + 1, 3))
+    def test_clusters_account_for_every_warehouse(self, france, zoom):
+        pyramid = ClusterPyramid(*france)
+        # At high zoom France spans too many cells; count around Paris
+        bbox = FRANCE if zoom < 9 else (2.0, 48.5, 2.3, 48.7)
+        lats, lngs, _ = france
+        inside = (lngs >= bbox[0]) & (lngs <= bbox[2]) & (lats >= bbox[1]) & (lats <= bbox[3])
+
+        clusters = pyramid.clusters(bbox, zoom)
+
+        # Cells on the edge of the box also hold warehouses just outside it
+        assert sum(cluster.count for cluster in clusters) >= inside.sum()
+        if zoom < 9:
+            assert sum(cluster.count for cluster in clusters) == len(lats)
+
+    def test_cluster_summarizes_its_warehouses(self):
+        pyramid = ClusterPyramid(
+            np.array([48.80, 48.82, 48.84]),
+            np.array([2.30, 2.32, 2.34]),
+            np.array([100.0, 300.0, np.nan]),
+        )
+
+        (cluster,) = pyramid.clusters(FRANCE, 0)
+
+        assert cluster.count == 3
+        assert (cluster.latitude, cluster.longitude) == pytest.approx((48.82, 2.32))
+        assert cluster.avg_price_per_m2 == 200.0
+
+    def test_cells_split_as_zoom_grows(self, france):
+        pyramid = ClusterPyramid(*france)
+
+        counts = [len(pyramid.clusters(FRANCE, zoom)) for zoom in range(7)]
+
+        assert counts == sorted(counts)
+        assert counts[0] < 5 < counts[-1]
+
+    def test_unpriced_cells_have_no_average(self):
+        pyramid = ClusterPyramid(np.array([48.8]), np.array([2.3]), np.array([np.nan]))
+
+        assert pyramid.clusters(FRANCE, 5)[0].avg_price_per_m2 is None
+
+    def test_refuses_boxes_spanning_too_many_cells(self, france):
+        with pytest.raises(ValueError, match="more than"):
+            ClusterPyramid(*france).clusters(FRANCE, MAX_CLUSTER_ZOOM)
+
+    def test_cell_range_is_north_to_south(self):
+        x_min, x_max, y_min, y_max = cell_range(FRANCE, 4)
+
+        assert x_min < x_max and y_min < y_max
+
+
+def mock_pyramid_queries(mock_session, rows):
+    """warehouse_clusters runs the pyramid's projection; its version is the request's stamp."""
+    mock_points = MagicMock()
+    mock_points.all.return_value = rows
+    mock_session.execute = AsyncMock(side_effect=[mock_points])
+
+
+class TestClustersEndpoint:
+    def test_low_zoom_returns_clusters(self, client, mock_session):
+        mock_pyramid_queries(mock_session, [
+            (48.85, 2.35, 1_000_000.0, 10_000.0),
+            (48.86, 2.36, None, 12_000.0),
+            (43.30, 5.40, 3_000_000.0, 10_000.0),
+        ])
+
+        data = client.get("/api/warehouses/clusters?bbox=-5.5,41,10,51.5&zoom=6").json()
+
+        assert data["points"] == []
+        assert sorted(
+            (cluster["count"], cluster["avg_price_per_m2"]) for cluster in data["clusters"]
+        ) == [(1, 300.0), (2, 100.0)]
+
+    def test_high_zoom_returns_points(self, client, mock_session):
+        warehouse = make_warehouse()
+        mock_rows = mock_core_result([warehouse_row(warehouse)])
+        mock_session.execute = AsyncMock(return_value=mock_rows)
+
+        data = client.get(
+            f"/api/warehouses/clusters?bbox=2.34,48.85,2.36,48.86&zoom={MAX_CLUSTER_ZOOM + 1}"
+        ).json()
+
+        assert data["clusters"] == []
+        assert [point["id"] for point in data["points"]] == [str(warehouse.id)]
+        assert data["truncated"] is False
+
+    def test_points_are_capped(self, client, mock_session):
+        mock_rows = mock_core_result([
+            warehouse_row(make_warehouse()) for _ in range(MAX_POINTS + 1)
+        ])
+        mock_session.execute = AsyncMock(return_value=mock_rows)
+
+        data = client.get("/api/warehouses/clusters?bbox=2,48,3,49&zoom=16").json()
+
+        assert (len(data["points"]), data["truncated"]) == (MAX_POINTS, True)
+
+    def test_invalid_bbox_is_rejected(self, client):
+        assert client.get("/api/warehouses/clusters?bbox=1,2,3&zoom=5").status_code == 400
+
+    def test_oversized_bbox_is_rejected(self, client, mock_session):
+        mock_pyramid_queries(mock_session, [])
+
+        response = client.get(
+            f"/api/warehouses/clusters?bbox=-180,-85,180,85&zoom={MAX_CLUSTER_ZOOM}"
+        )
+
+        assert response.status_code == 400
+
+
+@requires_postgres
+class TestClustersFromPostgres:
+    def test_clusters_count_the_table(self, pg_client):
+        async def setup():
+            async with pg_client.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await ensure_partitions(conn, [2024])
+                await conn.execute(text(
+                    "INSERT INTO warehouses (id, dvf_mutation_id, transaction_date, latitude, "
+                    "longitude, price_eur, surface_m2) "
+                    "SELECT gen_random_uuid(), 'm-' || n, '2024-05-01', 42 + n % 90 / 10.0, "
+                    "-4 + n % 120 / 10.0, CASE WHEN n % 7 = 0 THEN NULL ELSE 1000000 END, 10000 "
+                    "FROM generate_series(1, 2000) AS n"
+                ))
+
+        asyncio.run(setup())
+
+        data = pg_client.get("/api/warehouses/clusters?bbox=-5.5,41,10,51.5&zoom=5").json()
+
+        assert sum(cluster["count"] for cluster in data["clusters"]) == 2000
+        assert {cluster["avg_price_per_m2"] for cluster in data["clusters"]} == {100.0}
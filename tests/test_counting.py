@@ -0,0 +1,150 @@
+"""Tests for the count strategies behind `total` in GET /api/warehouses."""
+
+import asyncio
+
+import pytest
+from sqlalchemy import event, text
+
+from app.config import Settings, get_settings
+from app.counting import CountCache, count_cache, filters_key
+from app.main import app
+from scripts.summaries import refresh_summaries
+from tests.conftest import (
+    SAME_DAY_ROWS,
+    is_version_read,
+    make_warehouse,
+    mock_list_query,
+    requires_postgres,
+)
+
+
+class TestCountCache:
+    """Tests for the in-process cache of exact counts."""
+
+    def test_hit_requires_the_same_version(self):
+        cache = CountCache()
+        cache.put(("department", "77"), version=3, total=42)
+
+        assert cache.get(("department", "77"), version=3) == 42
+        assert cache.get(("department", "77"), version=4) is None
+
+    def test_least_recently_used_key_is_dropped(self):
+        cache = CountCache(maxsize=2)
+        cache.put("a", 1, 1)
+        cache.put("b", 1, 2)
+        cache.get("a", 1)
+        cache.put("c", 1, 3)
+
+        assert cache.get("b", 1) is None
+        assert (cache.get("a", 1), cache.get("c", 1)) == (1, 3)
+
+    def test_filters_key_ignores_unset_filters_and_commune_case(self):
+        assert filters_key(department="77", commune="Melun", min_price=None) == filters_key(
+            commune="MELUN", department="77"
+        )
+
+
+class TestExactCountResponse:
+    def test_default_total_is_exact(self, client, mock_session):
+        mock_list_query(mock_session, [make_warehouse()], total=12)
+
+        data = client.get("/api/warehouses").json()
+        assert (data["total"], data["total_exact"]) == (12, True)
+
+
+@pytest.fixture
+def strategy(pg_client):
+    """Sets the count strategy (and settings) the API runs with."""
+    def use(count_strategy: str, **settings) -> None:
+        app.dependency_overrides[get_settings] = lambda: Settings(
+            count_strategy=count_strategy, **settings
+        )
+        count_cache.clear()
+
+    return use
+
+
+def get_with_queries(client, **params) -> tuple[dict, list[str]]:
+    """GET /api/warehouses, returning the JSON and the SQL it ran.
+
+    conditional_get's read of the version row is left out.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not is_version_read(statement):
+            statements.append(statement)
+
+    event.listen(client.engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        response = client.get("/api/warehouses", params=params)
+    finally:
+        event.remove(client.engine.sync_engine, "before_cursor_execute", capture)
+    assert response.status_code == 200
+    return response.json(), statements
+
+
+@requires_postgres
+class TestCountStrategies:
+    """Every strategy reports the filtered total; they differ in the queries run."""
+
+    @pytest.mark.parametrize("name", ["exact", "window", "estimated", "cached"])
+    def test_every_strategy_counts_exactly_below_the_threshold(
+        self, same_day_rows, pg_client, strategy, name
+    ):
+        strategy(name)
+
+        data, _ = get_with_queries(pg_client, date_from="2024-03-02", limit=5)
+
+        assert (data["total"], data["total_exact"]) == (30, True)
+
+    def test_window_counts_in_the_page_query(self, same_day_rows, pg_client, strategy):
+        strategy("window")
+
+        data, statements = get_with_queries(pg_client, limit=5)
+
+        assert data["total"] == SAME_DAY_ROWS
+        assert len(statements) == 1
+        assert "count(*) OVER ()" in statements[0]
+
+    def test_window_past_the_last_page_still_counts(self, same_day_rows, pg_client, strategy):
+        strategy("window")
+
+        data, statements = get_with_queries(pg_client, offset=1000)
+
+        assert (data["items"], data["total"]) == ([], SAME_DAY_ROWS)
+        assert len(statements) == 2
+
+    def test_estimated_returns_the_planner_estimate_for_broad_filters(
+        self, same_day_rows, pg_client, strategy
+    ):
+        strategy("estimated", count_estimate_threshold=1)
+
+        data, statements = get_with_queries(pg_client, commune="it's 100%: ok")
+
+        assert data["total_exact"] is False
+        assert data["total"] >= 1
+        assert not any("count(*)" in s for s in statements)
+
+    def test_cached_skips_the_count_until_the_data_changes(
+        self, same_day_rows, pg_client, strategy
+    ):
+        strategy("cached")
+
+        first, _ = get_with_queries(pg_client, department="77")
+        second, statements = get_with_queries(pg_client, department="77")
+        assert first["total"] == second["total"] == SAME_DAY_ROWS
+        assert not any("count(*)" in s for s in statements)
+
+        async def ingest_more():
+            async with pg_client.engine.begin() as conn:
+                await conn.execute(text(
+                    "INSERT INTO warehouses (id, dvf_mutation_id, department, transaction_date) "
+                    "VALUES (gen_random_uuid(), 'late', '77', '2024-03-05')"
+                ))
+                await refresh_summaries(conn, ["77"])
+
+        asyncio.run(ingest_more())
+        third, statements = get_with_queries(pg_client, department="77")
+        assert third["total"] == SAME_DAY_ROWS + 1
+        assert any("count(*)" in s for s in statements)
@@ -0,0 +1,134 @@
+"""Tests for the DVF download cache and checkpoint manifest."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from urllib.error import HTTPError
+
+from scripts.dvf_cache import DvfCache, Manifest
+
+
+class DvfStandIn(BaseHTTPRequestHandler):
+    """Minimal data.gouv.fr stand-in honouring If-None-Match / If-Modified-Since."""
+
+    files: dict[str, bytes] = {}
+    etags: dict[str, str] = {}
+    last_modified = "Mon, 06 Jan 2025 10:00:00 GMT"
+    requests: list[tuple[str, dict]] = []
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        if self.path not in self.files:
+            self.send_error(404)
+            return
+        etag = self.etags[self.path]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = self.files[self.path]
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Serves DvfStandIn.files on a free localhost port."""
+    DvfStandIn.files = {"/77.csv.gz": b"version-1"}
+    DvfStandIn.etags = {"/77.csv.gz": '"v1"'}
+    DvfStandIn.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), DvfStandIn)
+    thread = threading.Thread(
+        target=httpd.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class TestDvfCache:
+    """Tests for conditional downloads through DvfCache."""
+
+    def test_first_fetch_downloads_and_stores(self, server, tmp_path):
+        """Verify a cold cache downloads the file and records its hash."""
+        cache = DvfCache(tmp_path)
+
+        path, sha256, not_modified = cache.fetch(f"{server}/77.csv.gz")
+
+        assert path.read_bytes() == b"version-1"
+        assert len(sha256) == 64
+        assert not_modified is False
+
+    def test_second_fetch_sends_validators_and_reuses_file(self, server, tmp_path):
+        """Verify a warm cache revalidates with ETag and gets a 304."""
+        cache = DvfCache(tmp_path)
+        _, first_sha, _ = cache.fetch(f"{server}/77.csv.gz")
+
+        path, sha256, not_modified = cache.fetch(f"{server}/77.csv.gz")
+
+        headers = DvfStandIn.requests[-1][1]
+        assert headers["If-None-Match"] == '"v1"'
+        assert headers["If-Modified-Since"] == DvfStandIn.last_modified
+        assert not_modified is True
+        assert sha256 == first_sha
+        assert path.read_bytes() == b"version-1"
+
+    def test_changed_file_is_downloaded_again(self, server, tmp_path):
+        """Verify a new ETag on the server replaces the cached copy."""
+        cache = DvfCache(tmp_path)
+        _, first_sha, _ = cache.fetch(f"{server}/77.csv.gz")
+        DvfStandIn.files["/77.csv.gz"] = b"version-2"
+        DvfStandIn.etags["/77.csv.gz"] = '"v2"'
+
+        path, sha256, not_modified = cache.fetch(f"{server}/77.csv.gz")
+
+        assert not_modified is False
+        assert sha256 != first_sha
+        assert path.read_bytes() == b"version-2"
+
+    def test_http_errors_propagate_without_partial_files(self, server, tmp_path):
+        """Verify a missing file raises and leaves nothing in the cache."""
+        cache = DvfCache(tmp_path)
+
+        with pytest.raises(HTTPError):
+            cache.fetch(f"{server}/99.csv.gz")
+
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestManifest:
+    """Tests for the checkpoint manifest."""
+
+    def test_mark_done_persists_across_instances(self, tmp_path):
+        """Verify completion survives a restart."""
+        Manifest(tmp_path / "manifest.json").mark_done("77", "abc", inserted=12)
+
+        manifest = Manifest(tmp_path / "manifest.json")
+
+        assert manifest.is_done("77", "abc")
+        assert manifest.entries["77"]["inserted"] == 12
+
+    def test_changed_hash_is_not_done(self, tmp_path):
+        """Verify a different content hash means the department must be reloaded."""
+        manifest = Manifest(tmp_path / "manifest.json")
+        manifest.mark_done("77", "abc", inserted=12)
+
+        assert not manifest.is_done("77", "def")
+        assert not manifest.is_done("13", "abc")
+
+    def test_limited_run_does_not_satisfy_full_run(self, tmp_path):
+        """Verify a --limit run is not mistaken for a complete load."""
+        manifest = Manifest(tmp_path / "manifest.json")
+        manifest.mark_done("77", "abc", inserted=10, limit=10)
+
+        assert manifest.is_done("77", "abc", limit=10)
+        assert not manifest.is_done("77", "abc", limit=None)
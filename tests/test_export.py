@@ -0,0 +1,100 @@
+"""Tests for the streaming export of GET /api/warehouses/export."""
+
+import csv
+import io
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.db import get_db_session
+from app.main import app
+from app.routers import warehouses
+from tests.conftest import SAME_DAY_ROWS, make_warehouse, requires_postgres, walk, warehouse_row
+
+
+def mock_stream(mock_session, rows: list[dict], batch: int = 2):
+    """session.stream() returns a result yielding `rows` in partitions of `batch`."""
+    async def partitions():
+        for start in range(0, len(rows), batch):
+            yield [tuple(row.values()) for row in rows[start:start + batch]]
+
+    result = MagicMock()
+    result.keys.return_value = list(rows[0]) if rows else []
+    result.partitions.side_effect = partitions
+    mock_session.stream = AsyncMock(return_value=result)
+
+
+class TestExportEndpoint:
+    def test_ndjson_has_one_row_per_line(self, client, mock_session):
+        warehouses = [make_warehouse(), make_warehouse(price_eur=None), make_warehouse()]
+        mock_stream(mock_session, [warehouse_row(w) for w in warehouses])
+
+        response = client.get("/api/warehouses/export")
+
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["id"] for line in lines] == [str(w.id) for w in warehouses]
+        assert lines[1]["price_eur"] is None
+        assert lines[0]["transaction_date"] == "2024-01-15"
+
+    def test_csv_has_a_header_and_empty_nulls(self, client, mock_session):
+        warehouses = [make_warehouse(commune=None), make_warehouse()]
+        mock_stream(mock_session, [warehouse_row(w) for w in warehouses])
+
+        response = client.get("/api/warehouses/export?format=csv")
+
+        assert response.headers["content-type"] == "text/csv; charset=utf-8"
+        assert 'filename="warehouses.csv"' in response.headers["content-disposition"]
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert [row["id"] for row in rows] == [str(w.id) for w in warehouses]
+        assert rows[0]["commune"] == ""
+
+    def test_empty_result(self, client, mock_session):
+        mock_stream(mock_session, [])
+
+        assert client.get("/api/warehouses/export").content == b""
+
+    def test_streams_from_a_session_of_its_own(self, client, mock_session):
+        request_session = AsyncMock()
+
+        async def override():
+            yield request_session
+
+        app.dependency_overrides[get_db_session] = override
+        mock_stream(mock_session, [warehouse_row(make_warehouse())])
+
+        assert len(client.get("/api/warehouses/export").text.splitlines()) == 1
+        request_session.stream.assert_not_awaited()
+
+    def test_unknown_format_is_rejected(self, client):
+        assert client.get("/api/warehouses/export?format=xml").status_code == 422
+
+    def test_query_streams_in_batches_with_the_filters(self, client, mock_session):
+        mock_stream(mock_session, [])
+
+        client.get("/api/warehouses/export?department=77&min_price=1000")
+
+        query = mock_session.stream.await_args.args[0]
+        assert query.get_execution_options()["yield_per"] == warehouses.EXPORT_BATCH_SIZE
+        assert set(query.compile().params.values()) == {"77", 1000.0}
+
+
+@requires_postgres
+class TestExportFromPostgres:
+    @pytest.fixture(autouse=True)
+    def small_batches(self, monkeypatch):
+        monkeypatch.setattr(warehouses, "EXPORT_BATCH_SIZE", 7)
+
+    def test_ndjson_matches_the_list(self, same_day_rows, pg_client):
+        response = pg_client.get("/api/warehouses/export", params={"date_from": "2024-03-02"})
+
+        exported = [json.loads(line) for line in response.text.splitlines()]
+        assert exported == walk(pg_client, date_from="2024-03-02")
+
+    def test_csv_holds_every_row(self, same_day_rows, pg_client):
+        response = pg_client.get("/api/warehouses/export", params={"format": "csv"})
+
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len({row["id"] for row in rows}) == SAME_DAY_ROWS
+        assert {row["department"] for row in rows} == {"77"}
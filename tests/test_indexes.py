@@ -0,0 +1,160 @@
+"""PostgreSQL tests for the managed warehouses indexes.
+
+Run with TEST_DATABASE_URL set; skipped otherwise.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from app.models.schemas import Base, WAREHOUSE_INDEXES
+from scripts.indexes import apply_indexes, existing_indexes, install_extension
+from scripts.partitions import ensure_partitions
+from tests.conftest import explain_requests, requires_postgres
+
+pytestmark = requires_postgres
+
+ROWS = 60_000
+
+# Only built where the server offers pg_trgm
+TRIGRAM_INDEX = "ix_warehouses_commune_trgm"
+
+
+@pytest.fixture
+def indexed(pg_engine_factory):
+    """ROWS generated warehouses over 2023-2024, loaded in date order like an ingest."""
+    async def setup():
+        engine = pg_engine_factory()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await ensure_partitions(conn, [2023, 2024])
+            await conn.execute(text(
+                "INSERT INTO warehouses (id, dvf_mutation_id, department, commune, price_eur, "
+                "surface_m2, transaction_date, latitude, longitude) "
+                "SELECT gen_random_uuid(), 'm-' || n, lpad((n % 95 + 1)::text, 2, '0'), "
+                "'Commune ' || n % 3000, 100000 + (n::bigint * 7919) % 5000000, "
+                "10000 + (n::bigint * 104729) % 90000, date '2023-01-01' + n * 730 / :rows, "
+                "42 + (n * 31) % 9000 / 1000.0, -4 + (n * 17) % 12000 / 1000.0 "
+                "FROM generate_series(1, :rows) AS n"
+            ), {"rows": ROWS})
+            await conn.execute(text("ANALYZE warehouses"))
+        await engine.dispose()
+
+    asyncio.run(setup())
+    return pg_engine_factory
+
+
+def run_sync(engine_factory, fn):
+    """Runs fn(sync_conn) in one transaction and returns its result."""
+    async def run():
+        engine = engine_factory()
+        async with engine.begin() as conn:
+            result = await conn.run_sync(fn)
+        await engine.dispose()
+        return result
+
+    return asyncio.run(run())
+
+
+class TestIndexUse:
+    """EXPLAIN shows the API's filters reading the managed indexes.
+
+    Partitions name their copies of an index after its columns, e.g.
+    warehouses_2024_price_eur_idx for ix_warehouses_price.
+    """
+
+    def test_department_list_reads_the_department_index_in_order(self, indexed, pg_client):
+        plans = explain_requests(pg_client, "/api/warehouses?department=77&limit=20")
+
+        page = plans[-1]
+        assert "department_transaction_date_id_idx" in page
+        assert "Sort" not in page.replace("Sort Key", "")
+
+    def test_price_filter_reads_the_price_index(self, indexed, pg_client):
+        count, _ = explain_requests(pg_client, "/api/warehouses?min_price=5000000")
+
+        assert "price_eur_idx" in count
+
+    def test_surface_filter_reads_the_surface_index(self, indexed, pg_client):
+        count, _ = explain_requests(
+            pg_client, "/api/warehouses?min_surface=20000&max_surface=20100"
+        )
+
+        assert "surface_m2_idx" in count
+
+    def test_nearby_loads_its_matches_by_primary_key(self, indexed, pg_client):
+        plans = explain_requests(
+            pg_client, "/api/warehouses/nearby?lat=48.705&lng=2.35&radius_km=10"
+        )
+
+        rows = plans[-1]
+        assert "warehouses_2023_pkey" in rows
+        assert "Seq Scan" not in rows.replace("Seq Scan on warehouses_default", "")
+
+    def test_nearest_k_reads_the_coordinates_index(self, indexed, pg_client):
+        (plan,) = explain_requests(
+            pg_client, "/api/warehouses/nearby?lat=48.705&lng=2.35&radius_km=10&k=5"
+        )
+
+        assert "latitude_longitude_idx" in plan
+
+    def test_date_range_scan_reads_the_brin_index(self, indexed, pg_client):
+        async def explain():
+            async with pg_client.engine.connect() as conn:
+                result = await conn.execute(text(
+                    "EXPLAIN SELECT avg(price_eur) FROM warehouses "
+                    "WHERE transaction_date BETWEEN '2023-03-01' AND '2023-05-31'"
+                ))
+                return "\n".join(row[0] for row in result)
+
+        plan = asyncio.run(explain())
+
+        assert "Bitmap Index Scan on warehouses_2023_transaction_date_idx" in plan
+
+    def test_commune_search_reads_the_trigram_index(self, indexed, pg_client):
+        installed = run_sync(indexed, lambda c: install_extension(c, "pg_trgm"))
+        if not installed:
+            pytest.skip("pg_trgm is not available on this server")
+        run_sync(indexed, apply_indexes)
+        run_sync(indexed, lambda c: c.execute(text("ANALYZE warehouses")))
+
+        count, _ = explain_requests(pg_client, "/api/warehouses?commune=mune 123")
+
+        assert "commune_idx" in count
+
+
+class TestApplyIndexes:
+    """apply_indexes brings an existing table in line with WAREHOUSE_INDEXES."""
+
+    def test_creates_missing_and_drops_obsolete_indexes(self, pg_engine_factory):
+        def setup(conn):
+            Base.metadata.create_all(conn)
+            conn.execute(text("DROP INDEX ix_warehouses_price"))
+            conn.execute(text("CREATE INDEX ix_warehouses_department ON warehouses (department)"))
+
+        run_sync(pg_engine_factory, setup)
+
+        created, dropped = run_sync(pg_engine_factory, apply_indexes)
+
+        # The trigram index is created too where apply_indexes could install pg_trgm
+        assert [name for name in created if name != TRIGRAM_INDEX] == ["ix_warehouses_price"]
+        assert dropped == ["ix_warehouses_department"]
+        names = run_sync(pg_engine_factory, existing_indexes)
+        assert {index.name for index in WAREHOUSE_INDEXES} - names <= {TRIGRAM_INDEX}
+
+    def test_second_run_changes_nothing(self, pg_engine_factory):
+        run_sync(pg_engine_factory, Base.metadata.create_all)
+        run_sync(pg_engine_factory, apply_indexes)
+
+        assert run_sync(pg_engine_factory, apply_indexes) == ([], [])
+
+    def test_leaves_unmanaged_indexes_alone(self, pg_engine_factory):
+        def setup(conn):
+            Base.metadata.create_all(conn)
+            conn.execute(text("CREATE INDEX adhoc_commune ON warehouses (commune)"))
+
+        run_sync(pg_engine_factory, setup)
+        run_sync(pg_engine_factory, apply_indexes)
+
+        assert "adhoc_commune" in run_sync(pg_engine_factory, existing_indexes)
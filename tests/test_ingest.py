@@ -1,9 +1,157 @@
 """Tests for DVF ingestion script."""
 
+import asyncio
+import csv
+import gzip
+import io
 from datetime import date
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
 
 import pytest
-from scripts.ingest_dvf import parse_row, filter_warehouses
+from sqlalchemy import Delete
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.elements import TextClause
+from app.models.schemas import WarehouseModel
+from scripts import ingest_dvf
+from scripts.dvf_cache import DvfCache, Manifest
+from scripts.partitions import year_partition_ddl
+from scripts.telemetry import DepartmentStats
+from scripts.ingest_dvf import (
+    parse_row,
+    filter_warehouses,
+    iter_dvf_rows,
+    iter_warehouses,
+    peak_rss_mb,
+)
+
+COLUMN_COUNT = len(WarehouseModel.__table__.columns)
+
+DVF_COLUMNS = [
+    "id_mutation",
+    "date_mutation",
+    "valeur_fonciere",
+    "adresse_numero",
+    "adresse_nom_voie",
+    "code_postal",
+    "nom_commune",
+    "code_departement",
+    "type_local",
+    "surface_reelle_bati",
+    "longitude",
+    "latitude",
+]
+
+
+def make_dvf_row(**overrides) -> dict:
+    """Build a full DVF row dict that passes the warehouse filters."""
+    row = {
+        "id_mutation": "2024-1",
+        "date_mutation": "2024-03-15",
+        "valeur_fonciere": "2500000",
+        "adresse_numero": "42",
+        "adresse_nom_voie": "Rue de la Paix",
+        "code_postal": "77000",
+        "nom_commune": "Melun",
+        "code_departement": "77",
+        "type_local": "Local industriel. commercial ou assimilé",
+        "surface_reelle_bati": "15000",
+        "longitude": "2.6553",
+        "latitude": "48.5423",
+    }
+    row.update(overrides)
+    return row
+
+
+def make_dvf_gzip(rows: list[dict]) -> bytes:
+    """Serialise DVF rows to gzipped CSV bytes, as published on data.gouv.fr."""
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=DVF_COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return gzip.compress(text.getvalue().encode("utf-8"))
+
+
+class FakeWriter:
+    """Stands in for an open WarehouseWriter, collecting written rows."""
+
+    def __init__(self):
+        self.rows: list[dict] = []
+
+    async def write(self, warehouses: list[dict], stats=None) -> int:
+        self.rows.extend(warehouses)
+        return len(warehouses)
+
+
+def make_fake_engine(monkeypatch, relkind: str = "p") -> MagicMock:
+    """Patch create_async_engine with a fake recording what the writers execute.
+
+    engine.conn.statements holds INSERT statements, engine.conn.deletes
+    the DELETE statements of moved mutations, engine.conn.ddl the raw SQL
+    of text() statements, and engine.pg is the fake asyncpg connection
+    used by the COPY loader. Every upserted row is reported back as newly
+    inserted, and no mutation as moved.
+    """
+    conn = MagicMock()
+    conn.statements = []
+    conn.deletes = []
+    conn.ddl = []
+    conn.run_sync = AsyncMock()
+
+    async def execute(stmt, params=None):
+        result = MagicMock()
+        if isinstance(stmt, TextClause):
+            conn.ddl.append(stmt.text)
+            result.scalar.return_value = relkind
+            return result
+        if isinstance(stmt, Delete):
+            conn.deletes.append(stmt)
+            result.all.return_value = []
+            return result
+        conn.statements.append(stmt)
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        ids = [v for k, v in compiled.params.items() if k.startswith("id_m")]
+        result.scalars.return_value.all.return_value = ids
+        return result
+
+    conn.execute = execute
+
+    pg = MagicMock()
+    pg.execute = AsyncMock()
+    pg.fetch = AsyncMock(return_value=[])
+    pg.fetchrow = AsyncMock(return_value={"touched": 2, "inserted": 2})
+    pg.copied = []
+
+    async def copy_records_to_table(table, records, columns):
+        pg.copied.append((table, list(records), columns))
+
+    pg.copy_records_to_table = copy_records_to_table
+    pg.transaction.return_value.__aenter__ = AsyncMock()
+    pg.transaction.return_value.__aexit__ = AsyncMock(return_value=False)
+    conn.get_raw_connection = AsyncMock(return_value=MagicMock(driver_connection=pg))
+
+    engine = MagicMock()
+    engine.conn = conn
+    engine.pg = pg
+    for ctx in (engine.begin.return_value, engine.connect.return_value):
+        ctx.__aenter__ = AsyncMock(return_value=conn)
+        ctx.__aexit__ = AsyncMock(return_value=False)
+    engine.dispose = AsyncMock()
+    monkeypatch.setattr(ingest_dvf, "create_async_engine", lambda url: engine)
+    return engine
+
+
+def make_dvf_sample() -> list[dict]:
+    """A small department: mostly houses, a few warehouses of varying size."""
+    rows = []
+    for i in range(200):
+        if i % 20 == 0:
+            rows.append(make_dvf_row(id_mutation=f"2024-{i}"))
+        elif i % 20 == 1:
+            rows.append(make_dvf_row(id_mutation=f"2024-{i}", surface_reelle_bati="900"))
+        else:
+            rows.append(make_dvf_row(id_mutation=f"2024-{i}", type_local="Maison"))
+    return rows
 
 
 class TestParseRow:
@@ -84,6 +232,16 @@ class TestParseRow:
 
         assert result is None
 
+    def test_parse_row_hash_tracks_content(self):
+        """Verify the content hash is stable and changes with a corrected field."""
+        original = parse_row(make_dvf_row())
+        again = parse_row(make_dvf_row())
+        corrected = parse_row(make_dvf_row(valeur_fonciere="2600000"))
+
+        assert len(original["content_hash"]) == 32
+        assert original["content_hash"] == again["content_hash"]
+        assert original["content_hash"] != corrected["content_hash"]
+
 
 class TestFilterWarehouses:
     """Tests for filter_warehouses function."""
@@ -296,3 +454,459 @@ class TestTransformDate:
 
         assert result is not None
         assert result["transaction_date"] is None
+
+
+class TestStreaming:
+    """Tests for the streaming gzip -> CSV -> filter pipeline."""
+
+    def test_iter_dvf_rows_reads_gzip_stream(self):
+        """Verify rows are decoded straight from the gzipped bytes."""
+        rows = [make_dvf_row(id_mutation="a"), make_dvf_row(id_mutation="b")]
+
+        result = list(iter_dvf_rows(io.BytesIO(make_dvf_gzip(rows))))
+
+        assert [r["id_mutation"] for r in result] == ["a", "b"]
+        assert result[0]["type_local"] == "Local industriel. commercial ou assimilé"
+
+    def test_iter_warehouses_matches_filter_warehouses(self):
+        """Verify the generator yields exactly what filter_warehouses returns."""
+        rows = make_dvf_sample()
+
+        assert list(iter_warehouses(iter(rows))) == filter_warehouses(rows)
+
+    def test_iter_warehouses_stops_consuming_at_limit(self):
+        """Verify the source iterator is not drained past the limit."""
+        rows = iter([make_dvf_row(id_mutation=str(i)) for i in range(10)])
+
+        result = list(iter_warehouses(rows, limit=3))
+
+        assert len(result) == 3
+        assert next(rows)["id_mutation"] == "3"
+
+    def test_process_department_streaming_uses_no_temp_file(self, monkeypatch):
+        """Verify stream mode never calls download_dvf and inserts the kept rows."""
+        payload = make_dvf_gzip(make_dvf_sample())
+        inserted: list[dict] = []
+
+        def fail_download(department):
+            raise AssertionError("download_dvf must not be used in stream mode")
+
+        monkeypatch.setattr(ingest_dvf, "download_dvf", fail_download)
+        monkeypatch.setattr(
+            ingest_dvf, "open_dvf_stream", lambda dept, url_template, year: io.BytesIO(payload)
+        )
+        monkeypatch.setattr(
+            ingest_dvf, "insert_to_db", lambda whs: inserted.extend(whs) or len(whs)
+        )
+
+        count = ingest_dvf.process_department("77", stream=True)
+
+        assert count == 10
+        assert [w["dvf_mutation_id"] for w in inserted] == [f"2024-{i}" for i in range(0, 200, 20)]
+
+    def test_peak_rss_mb_is_positive(self):
+        """Verify peak RSS can be read on this platform."""
+        assert peak_rss_mb() > 0
+
+
+class TestParallelIngest:
+    """Tests for --workers ingestion against a file:// mirror."""
+
+    @pytest.fixture
+    def mirror(self, tmp_path):
+        """A local DVF mirror with departments 01 and 02; 03 is missing."""
+        for dept in ("01", "02"):
+            rows = [
+                make_dvf_row(id_mutation=f"{dept}-{i}", code_departement=dept)
+                for i in range(5)
+            ]
+            (tmp_path / f"{dept}.csv.gz").write_bytes(make_dvf_gzip(rows))
+        return f"{tmp_path.as_uri()}/{{dept}}.csv.gz"
+
+    def test_ingest_parallel_processes_all_departments(self, mirror):
+        """Verify every department is downloaded, parsed and inserted."""
+        writer = FakeWriter()
+        total, succeeded, failed, skipped = asyncio.run(
+            ingest_dvf.ingest_parallel(["01", "02"], writer, workers=2, url_template=mirror)
+        )
+
+        assert total == 10
+        assert succeeded == ["01", "02"]
+        assert failed == []
+        assert sorted(w["department"] for w in writer.rows) == ["01"] * 5 + ["02"] * 5
+
+    def test_ingest_parallel_isolates_failures(self, mirror):
+        """Verify a missing department file does not abort the others."""
+        total, succeeded, failed, skipped = asyncio.run(
+            ingest_dvf.ingest_parallel(
+                ["01", "03", "02"], FakeWriter(), limit=2, workers=2, url_template=mirror
+            )
+        )
+
+        assert total == 4
+        assert succeeded == ["01", "02"]
+        assert [dept for dept, _ in failed] == ["03"]
+
+    def test_parse_dvf_file_counts_scanned_rows(self, tmp_path):
+        """Verify the worker-side parser reports rows scanned and kept."""
+        gz_path = tmp_path / "77.csv.gz"
+        gz_path.write_bytes(make_dvf_gzip(make_dvf_sample()))
+
+        scanned, warehouses = ingest_dvf.parse_dvf_file(gz_path)
+
+        assert scanned == 200
+        assert len(warehouses) == 10
+
+
+class TestWarehouseWriter:
+    """Tests for the batched, shared-engine writer."""
+
+    @pytest.fixture
+    def engine(self, monkeypatch):
+        return make_fake_engine(monkeypatch)
+
+    def test_write_splits_rows_into_batches(self, engine):
+        """Verify one INSERT per batch and the schema check runs once."""
+        warehouses = [parse_row(make_dvf_row(id_mutation=str(i))) for i in range(25)]
+
+        async def run():
+            async with ingest_dvf.WarehouseWriter("postgresql+asyncpg://x", batch_size=10) as writer:
+                first = await writer.write(warehouses)
+                second = await writer.write(warehouses[:5])
+            return writer, first, second
+
+        writer, first, second = asyncio.run(run())
+
+        assert (first, second) == (25, 5)
+        assert writer.rows_written == 30
+        assert len(engine.conn.statements) == 4
+        assert engine.conn.ddl.count(year_partition_ddl(2024)) == 1
+        # create_all, then the index migration, once for both writes
+        assert engine.conn.run_sync.await_count == 2
+        engine.dispose.assert_awaited_once()
+
+    def test_write_updates_only_changed_rows(self, engine):
+        """Verify the upsert rewrites an existing mutation only if its hash differs."""
+        warehouses = [parse_row(make_dvf_row())]
+
+        async def run():
+            async with ingest_dvf.WarehouseWriter("postgresql+asyncpg://x") as writer:
+                await writer.write(warehouses)
+
+        asyncio.run(run())
+
+        sql = str(engine.conn.statements[0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (dvf_mutation_id, transaction_date) DO UPDATE SET" in sql
+        assert "price_eur = excluded.price_eur" in sql
+        assert "WHERE warehouses.content_hash IS DISTINCT FROM excluded.content_hash" in sql
+        assert "RETURNING warehouses.id" in sql
+
+    def test_write_counts_inserted_updated_unchanged(self, engine):
+        """Verify RETURNING ids split rows into new, updated and untouched."""
+        warehouses = [parse_row(make_dvf_row(id_mutation=m)) for m in ("a", "b", "c", "a")]
+        existing = uuid4()
+
+        async def execute(stmt, params=None):
+            result = MagicMock()
+            result.scalar.return_value = "p"
+            result.all.return_value = []
+            if not isinstance(stmt, (TextClause, Delete)):
+                params = stmt.compile(dialect=postgresql.dialect()).params
+                # "a" is new, "b" was corrected, "c" is identical
+                result.scalars.return_value.all.return_value = [params["id_m0"], existing]
+            return result
+
+        engine.conn.execute = execute
+
+        async def run():
+            async with ingest_dvf.WarehouseWriter("postgresql+asyncpg://x") as writer:
+                return writer, await writer.write(warehouses)
+
+        writer, inserted = asyncio.run(run())
+
+        assert inserted == 1
+        assert (writer.rows_written, writer.rows_updated, writer.rows_unchanged) == (1, 1, 2)
+
+    def test_write_skips_rows_without_date(self, engine):
+        """Verify undated rows, which no partition accepts, are counted and skipped."""
+        warehouses = [
+            parse_row(make_dvf_row(id_mutation="a", date_mutation="")),
+            parse_row(make_dvf_row(id_mutation="b")),
+        ]
+
+        stats = DepartmentStats("77", 2024)
+
+        async def run():
+            async with ingest_dvf.WarehouseWriter("postgresql+asyncpg://x") as writer:
+                return writer, await writer.write(warehouses, stats)
+
+        writer, inserted = asyncio.run(run())
+
+        assert inserted == 1
+        assert writer.rows_without_date == stats.rows_without_date == 1
+
+    def test_summary_shows_rows_without_date(self, capsys):
+        """Verify the end-of-run summary reports the undated rows it skipped."""
+        writer = ingest_dvf.WarehouseWriter("postgresql+asyncpg://x")
+        writer.rows_without_date = 3
+
+        ingest_dvf.print_summary(1, 0, ["77"], [], writer)
+
+        assert "Skipped (no date):           3" in capsys.readouterr().out
+
+    def test_open_refuses_unpartitioned_table(self, monkeypatch):
+        """Verify a legacy flat table must be converted before ingesting."""
+        make_fake_engine(monkeypatch, relkind="r")
+
+        async def run():
+            async with ingest_dvf.WarehouseWriter("postgresql+asyncpg://x"):
+                pass
+
+        with pytest.raises(RuntimeError, match="scripts.partitions"):
+            asyncio.run(run())
+
+    def test_batch_size_respects_bind_parameter_limit(self):
+        """Verify batches that would exceed PostgreSQL's parameter cap are rejected."""
+        assert ingest_dvf.MAX_BATCH_SIZE * COLUMN_COUNT <= 32767
+        with pytest.raises(ValueError):
+            ingest_dvf.WarehouseWriter(batch_size=ingest_dvf.MAX_BATCH_SIZE + 1)
+
+
+class TestCopyWarehouseWriter:
+    """Tests for the COPY + staging-table loader."""
+
+    @pytest.fixture
+    def pg(self, monkeypatch):
+        return make_fake_engine(monkeypatch).pg
+
+    def write(self, warehouses):
+        async def run():
+            async with ingest_dvf.CopyWarehouseWriter("postgresql+asyncpg://x") as writer:
+                return await writer.write(warehouses)
+
+        return asyncio.run(run())
+
+    def test_copy_streams_records_in_table_column_order(self, pg):
+        """Verify COPY receives one tuple per warehouse, columns in table order."""
+        warehouses = [parse_row(make_dvf_row(id_mutation=m)) for m in ("a", "b", "c")]
+
+        inserted = self.write(warehouses)
+
+        assert inserted == 2
+        table, records, columns = pg.copied[0]
+        assert table.startswith("warehouses_staging_")
+        assert columns == ingest_dvf.WAREHOUSE_COLUMNS
+        mutation_idx = columns.index("dvf_mutation_id")
+        assert [r[mutation_idx] for r in records] == ["a", "b", "c"]
+
+    def test_copy_merges_changed_rows_only(self, pg):
+        """Verify staging is created unlogged, merged once, then dropped."""
+        self.write([parse_row(make_dvf_row())])
+
+        statements = [call.args[0] for call in pg.execute.await_args_list]
+        assert statements[0].startswith("CREATE UNLOGGED TABLE warehouses_staging_")
+        assert statements[1].startswith("DROP TABLE warehouses_staging_")
+        (merge,) = [call.args[0] for call in pg.fetchrow.await_args_list]
+        assert "INSERT INTO warehouses (" in merge
+        assert "ON CONFLICT (dvf_mutation_id, transaction_date) DO UPDATE SET" in merge
+        assert "WHERE warehouses.content_hash IS DISTINCT FROM EXCLUDED.content_hash" in merge
+
+    def test_copy_skips_empty_writes(self, pg):
+        """Verify no staging table is created when there is nothing to load."""
+        assert self.write([]) == 0
+        pg.execute.assert_not_awaited()
+        pg.fetchrow.assert_not_awaited()
+
+
+class TestResumableIngest:
+    """Tests for cache + manifest driven skipping of finished departments."""
+
+    def test_parallel_rerun_skips_unchanged_departments(self, tmp_path):
+        """Verify a second run only re-ingests the department whose file changed."""
+        mirror = tmp_path / "mirror"
+        mirror.mkdir()
+        for dept in ("01", "02"):
+            rows = [make_dvf_row(id_mutation=f"{dept}-1", code_departement=dept)]
+            (mirror / f"{dept}.csv.gz").write_bytes(make_dvf_gzip(rows))
+        url_template = f"{mirror.as_uri()}/{{dept}}.csv.gz"
+        cache = DvfCache(tmp_path / "cache")
+
+        def run():
+            manifest = Manifest(tmp_path / "cache" / "manifest.json")
+            return asyncio.run(
+                ingest_dvf.ingest_parallel(
+                    ["01", "02"],
+                    FakeWriter(),
+                    workers=2,
+                    url_template=url_template,
+                    cache=cache,
+                    manifest=manifest,
+                )
+            )
+
+        first = run()
+        rows = [make_dvf_row(id_mutation="02-2", code_departement="02")]
+        (mirror / "02.csv.gz").write_bytes(make_dvf_gzip(rows))
+        second = run()
+
+        assert first == (2, ["01", "02"], [], [])
+        assert second == (1, ["02"], [], ["01"])
+
+    def test_failed_department_is_not_checkpointed(self, tmp_path, monkeypatch):
+        """Verify a department whose insert failed is retried on the next run."""
+        mirror = tmp_path / "mirror"
+        mirror.mkdir()
+        (mirror / "77.csv.gz").write_bytes(make_dvf_gzip([make_dvf_row()]))
+        url_template = f"{mirror.as_uri()}/{{dept}}.csv.gz"
+        cache = DvfCache(tmp_path / "cache")
+        manifest = Manifest(tmp_path / "cache" / "manifest.json")
+
+        def failing_insert(warehouses):
+            raise RuntimeError("connection lost")
+
+        with pytest.raises(RuntimeError):
+            ingest_dvf.process_department(
+                "77", url_template=url_template, insert=failing_insert,
+                cache=cache, manifest=manifest,
+            )
+        count = ingest_dvf.process_department(
+            "77", url_template=url_template, insert=len, cache=cache, manifest=manifest,
+        )
+
+        assert count == 1
+        with pytest.raises(ingest_dvf.DepartmentSkipped):
+            ingest_dvf.process_department(
+                "77", url_template=url_template, insert=len, cache=cache, manifest=manifest,
+            )
+
+
+class TestFastScan:
+    """Parity tests: the fast scan path must keep exactly what filter_warehouses keeps."""
+
+    def tricky_rows(self) -> list[dict]:
+        rows = make_dvf_sample()
+        rows += [
+            make_dvf_row(id_mutation="quoted", adresse_nom_voie='Quai "Nord", Bât. B'),
+            make_dvf_row(id_mutation="bad-surface", surface_reelle_bati="n/a"),
+            make_dvf_row(id_mutation="no-price", valeur_fonciere=""),
+            make_dvf_row(id_mutation="", type_local="Local industriel. commercial ou assimilé"),
+            make_dvf_row(
+                id_mutation="in-commune",
+                nom_commune="Local industriel. commercial ou assimilé",
+                type_local="Maison",
+            ),
+            make_dvf_row(id_mutation="no-coords", latitude="", longitude=""),
+            make_dvf_row(id_mutation="accents", nom_commune="Évry-Courcouronnes"),
+        ]
+        return rows
+
+    def scan(self, rows, columns=DVF_COLUMNS, limit=None):
+        text = io.StringIO()
+        writer = csv.DictWriter(text, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+        payload = gzip.compress(text.getvalue().encode("utf-8"))
+        return ingest_dvf.scan_dvf(io.BytesIO(payload), limit=limit, fast_scan=True)
+
+    def test_fast_scan_matches_filter_warehouses(self):
+        """Verify identical output on regular and edge-case rows."""
+        rows = self.tricky_rows()
+
+        scanned, warehouses = self.scan(rows)
+
+        assert scanned == len(rows)
+        assert warehouses == filter_warehouses(rows)
+
+    def test_fast_scan_resolves_columns_from_header(self):
+        """Verify column order and extra columns do not matter."""
+        rows = [dict(row, nature_mutation="Vente") for row in self.tricky_rows()]
+        columns = ["nature_mutation"] + list(reversed(DVF_COLUMNS))
+
+        _, warehouses = self.scan(rows, columns=columns)
+
+        assert warehouses == filter_warehouses(rows)
+
+    def test_fast_scan_respects_limit(self):
+        """Verify the limit behaves like filter_warehouses."""
+        rows = self.tricky_rows()
+
+        _, warehouses = self.scan(rows, limit=3)
+
+        assert warehouses == filter_warehouses(rows, limit=3)
+
+    def test_parse_dvf_file_fast_matches_default(self, tmp_path):
+        """Verify both scanners agree end to end on a gzipped file."""
+        gz_path = tmp_path / "77.csv.gz"
+        gz_path.write_bytes(make_dvf_gzip(self.tricky_rows()))
+
+        fast = ingest_dvf.parse_dvf_file(gz_path, fast_scan=True)
+
+        assert fast == ingest_dvf.parse_dvf_file(gz_path)
+
+
+class TestNationalIngest:
+    """Tests for the single national file, parsed as byte ranges."""
+
+    def national_rows(self) -> list[dict]:
+        rows = []
+        for dept in ("01", "13", "2A", "77"):
+            for row in make_dvf_sample():
+                rows.append(dict(
+                    row, id_mutation=f"{dept}-{row['id_mutation']}", code_departement=dept
+                ))
+        return rows
+
+    def write_csv(self, path, rows):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=DVF_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_split_byte_ranges_covers_every_line_once(self, tmp_path):
+        """Verify ranges are contiguous, line-aligned and skip the header."""
+        csv_path = self.write_csv(tmp_path / "full.csv", self.national_rows())
+        data = csv_path.read_bytes()
+
+        header, ranges = ingest_dvf.split_byte_ranges(csv_path, parts=7)
+
+        assert data.startswith(header)
+        assert ranges[0][0] == len(header)
+        assert ranges[-1][1] == len(data)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert data[end - 1:end] == b"\n"
+        assert b"".join(data[s:e] for s, e in ranges) == data[len(header):]
+
+    @pytest.mark.parametrize("fast_scan", [False, True])
+    def test_byte_ranges_match_filter_warehouses(self, tmp_path, fast_scan):
+        """Verify parsing range by range keeps exactly the same warehouses."""
+        rows = self.national_rows()
+        csv_path = self.write_csv(tmp_path / "full.csv", rows)
+        header, ranges = ingest_dvf.split_byte_ranges(csv_path, parts=5)
+
+        results = [
+            ingest_dvf.parse_byte_range(csv_path, header, start, end, fast_scan)
+            for start, end in ranges
+        ]
+
+        assert sum(scanned for scanned, _ in results) == len(rows)
+        assert [wh for _, whs in results for wh in whs] == filter_warehouses(rows)
+
+    def test_ingest_national_routes_by_department(self, tmp_path):
+        """Verify a gzipped national file is split per department on a process pool."""
+        rows = self.national_rows()
+        gz_path = tmp_path / "full.csv.gz"
+        gz_path.write_bytes(make_dvf_gzip(rows))
+        writer = FakeWriter()
+
+        total, succeeded, failed = asyncio.run(
+            ingest_dvf.ingest_national(
+                str(gz_path), writer, departments=["13", "77", "971"], limit=4, workers=2
+            )
+        )
+
+        assert total == 8
+        assert succeeded == ["13", "77", "971"]
+        assert failed == []
+        assert [w["department"] for w in writer.rows] == ["13"] * 4 + ["77"] * 4
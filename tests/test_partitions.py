@@ -0,0 +1,127 @@
+"""PostgreSQL tests for the yearly partitioning of warehouses.
+
+Run with TEST_DATABASE_URL set; skipped otherwise.
+"""
+
+import asyncio
+from datetime import date
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.schemas import Base, WarehouseModel
+from scripts.partitions import convert_to_partitioned, ensure_partitions, table_kind
+from tests.conftest import explain_requests, requires_postgres
+
+pytestmark = requires_postgres
+
+YEARS = (2022, 2023, 2024)
+
+
+def warehouse_rows(year: int, count: int = 3) -> list[dict]:
+    return [
+        dict(
+            id=uuid4(),
+            dvf_mutation_id=f"{year}-{i}",
+            commune="Melun",
+            department="77",
+            surface_m2=12000.0,
+            price_eur=1_500_000.0,
+            transaction_date=date(year, 3, i + 1),
+            latitude=48.54,
+            longitude=2.65,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def partitioned(pg_engine_factory):
+    """A partitioned warehouses table with a few rows in 2022, 2023 and 2024."""
+    async def setup():
+        engine = pg_engine_factory()
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await ensure_partitions(conn, YEARS)
+            for year in YEARS:
+                await conn.execute(pg_insert(WarehouseModel).values(warehouse_rows(year)))
+            await conn.execute(text("ANALYZE warehouses"))
+        await engine.dispose()
+
+    asyncio.run(setup())
+    return pg_engine_factory
+
+
+class TestPartitionPruning:
+    """EXPLAIN shows only the partitions a date range touches."""
+
+    def test_list_warehouses_prunes_other_years(self, partitioned, pg_client):
+        plans = explain_requests(
+            pg_client, "/api/warehouses?date_from=2024-01-01&date_to=2024-12-31"
+        )
+
+        assert len(plans) == 2  # count + page
+        for plan in plans:
+            assert "warehouses_2024" in plan
+            assert "warehouses_2022" not in plan
+            assert "warehouses_2023" not in plan
+            assert "warehouses_default" not in plan
+
+    def test_price_trends_reads_monthly_summaries_only(self, partitioned, pg_client):
+        (plan,) = explain_requests(
+            pg_client, "/api/analytics/price-trends?date_from=2023-01-01&date_to=2023-06-30"
+        )
+
+        assert "monthly_summary" in plan
+        assert "warehouses" not in plan
+
+    def test_unfiltered_list_scans_every_year(self, partitioned, pg_client):
+        plans = explain_requests(pg_client, "/api/warehouses")
+
+        for year in YEARS:
+            assert f"warehouses_{year}" in plans[1]
+
+
+class TestConvertToPartitioned:
+    """Migrating a plain warehouses table to the partitioned layout."""
+
+    def test_convert_moves_rows_into_year_partitions(self, pg_engine_factory):
+        async def run():
+            engine = pg_engine_factory()
+            async with engine.begin() as conn:
+                await conn.execute(text(
+                    "CREATE TABLE warehouses (id uuid PRIMARY KEY, "
+                    "dvf_mutation_id varchar UNIQUE NOT NULL, address varchar, "
+                    "postal_code varchar, commune varchar, department varchar, "
+                    "surface_m2 float, price_eur float, transaction_date date, "
+                    "latitude float, longitude float, property_type varchar)"
+                ))
+                for year in (2023, 2024):
+                    rows = warehouse_rows(year, count=2)
+                    for row in rows:
+                        await conn.execute(
+                            text("INSERT INTO warehouses (id, dvf_mutation_id, transaction_date) "
+                                 "VALUES (:id, :dvf_mutation_id, :transaction_date)"),
+                            row,
+                        )
+                await conn.execute(text(
+                    "INSERT INTO warehouses (id, dvf_mutation_id) VALUES (gen_random_uuid(), 'undated')"
+                ))
+            async with engine.begin() as conn:
+                copied = await convert_to_partitioned(conn)
+            async with engine.connect() as conn:
+                kind = await table_kind(conn)
+                per_year = await conn.execute(text(
+                    "SELECT tableoid::regclass::text, count(*) FROM warehouses GROUP BY 1 ORDER BY 1"
+                ))
+                result = (copied, kind, per_year.all())
+            await engine.dispose()
+            return result
+
+        copied, kind, per_year = asyncio.run(run())
+
+        assert copied == 4
+        assert kind == "p"
+        assert per_year == [("warehouses_2023", 2), ("warehouses_2024", 2)]
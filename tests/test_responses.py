@@ -0,0 +1,43 @@
+"""Tests for the orjson responses of the read endpoints."""
+
+import json
+from datetime import date
+from uuid import UUID, uuid4
+
+import pytest
+
+from app.models.schemas import WarehouseListResponse
+from app.responses import FastJSONResponse
+from tests.conftest import make_warehouse, mock_list_query
+
+
+class DriverUUID(UUID):
+    """Stands in for asyncpg's UUID subclass."""
+
+
+class TestFastJSONResponse:
+    def test_serializes_uuids_dates_and_nulls(self):
+        value = uuid4()
+
+        body = FastJSONResponse(
+            {"id": DriverUUID(str(value)), "day": date(2024, 1, 15), "price": None}
+        ).body
+
+        assert json.loads(body) == {"id": str(value), "day": "2024-01-15", "price": None}
+
+    def test_rejects_unknown_types(self):
+        with pytest.raises(TypeError):
+            FastJSONResponse({"value": object()})
+
+
+class TestListPayload:
+    def test_matches_the_response_model(self, client, mock_session):
+        warehouses = [make_warehouse(), make_warehouse(price_eur=None, commune=None)]
+        mock_list_query(mock_session, warehouses)
+
+        response = client.get("/api/warehouses")
+
+        assert response.headers["content-type"] == "application/json"
+        page = WarehouseListResponse.model_validate_json(response.content)
+        assert [item.id for item in page.items] == [w.id for w in warehouses]
+        assert page.items[1].price_eur is None
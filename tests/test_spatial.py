@@ -0,0 +1,333 @@
+"""Tests for the spatial index behind GET /api/warehouses/nearby."""
+
+import asyncio
+import random
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from sqlalchemy import Float, literal, select, text
+
+from app.caching import DatasetStamp, get_dataset_stamp
+from app.main import app
+from app.models.schemas import Base
+from app.routers.warehouses import decode_distance_cursor, encode_distance_cursor
+from app.spatial import (
+    GridIndex,
+    VersionedIndex,
+    bounding_box,
+    haversine,
+    haversine_array,
+    haversine_sql,
+)
+from scripts.partitions import ensure_partitions
+from scripts.summaries import refresh_summaries
+from tests.conftest import (
+    DATASET_STAMP,
+    make_warehouse,
+    mock_core_result,
+    requires_postgres,
+    warehouse_row,
+)
+
+
+def brute_force(points, lat, lng, radius_km):
+    """The former /nearby filter: bounding box, then haversine."""
+    lat_min, lat_max, lng_min, lng_max = bounding_box(lat, lng, radius_km)
+    return sorted(
+        (haversine(lat, lng, p_lat, p_lng), p_id)
+        for p_id, p_lat, p_lng in points
+        if lat_min <= p_lat <= lat_max and lng_min <= p_lng <= lng_max
+        and haversine(lat, lng, p_lat, p_lng) <= radius_km
+    )
+
+
+@pytest.fixture(scope="module")
+def points():
+    """5000 random points over mainland France."""
+    rng = random.Random(0)
+    return [(uuid4(), rng.uniform(41.3, 51.1), rng.uniform(-5.2, 9.6)) for _ in range(5000)]
+
+
+class TestHaversineArray:
+    def test_matches_the_scalar_haversine(self, points):
+        lats = np.array([lat for _, lat, _ in points])
+        lngs = np.array([lng for _, _, lng in points])
+
+        distances = haversine_array(48.8566, 2.3522, lats, lngs)
+
+        assert distances.tolist() == pytest.approx(
+            [haversine(48.8566, 2.3522, lat, lng) for _, lat, lng in points], rel=1e-12
+        )
+
+    def test_zero_distance_to_the_centre(self):
+        assert haversine_array(48.8566, 2.3522, np.array([48.8566]), np.array([2.3522])).tolist() == [0.0]
+
+
+class TestGridIndex:
+    """Radius queries on the grid match a scan of every point."""
+
+    @pytest.mark.parametrize("radius_km", [1, 20, 50, 200, 500])
+    def test_matches_brute_force(self, points, radius_km):
+        grid = GridIndex(points)
+
+        for lat, lng in [(48.8566, 2.3522), (43.3, 5.4), (47.0, -5.0)]:
+            found = grid.within(lat, lng, radius_km)
+            expected = brute_force(points, lat, lng, radius_km)
+            assert [point_id for _, point_id in found] == [point_id for _, point_id in expected]
+            assert [dist for dist, _ in found] == pytest.approx(
+                [dist for dist, _ in expected], rel=1e-12
+            )
+
+    def test_points_across_cell_edges_are_found(self):
+        # Centre on a cell corner, with one point in each of the four cells around it
+        points = [(uuid4(), 48.0 + dlat, 2.0 + dlng)
+                  for dlat in (-0.001, 0.001) for dlng in (-0.001, 0.001)]
+
+        assert len(GridIndex(points).within(48.0, 2.0, 1)) == 4
+
+    def test_results_are_closest_first(self, points):
+        distances = [dist for dist, _ in GridIndex(points).within(48.8566, 2.3522, 200)]
+
+        assert distances == sorted(distances)
+
+    def test_empty_grid(self):
+        assert GridIndex([]).within(48.8566, 2.3522, 50) == []
+
+
+class TestVersionedIndex:
+    def test_concurrent_requests_load_a_new_version_once(self):
+        queries, builds = [], []
+
+        async def query(session):
+            queries.append(session)
+            await asyncio.sleep(0.01)
+            return [session]
+
+        def build(rows):
+            builds.append(rows)
+            return rows
+
+        index = VersionedIndex(query, build)
+        sessions = [AsyncMock() for _ in range(5)]
+
+        async def burst():
+            return await asyncio.gather(*(index.get(session, 2) for session in sessions))
+
+        assert asyncio.run(burst()) == [[sessions[0]]] * 5
+        assert (queries, len(builds)) == ([sessions[0]], 1)
+
+    def test_next_waiter_loads_when_the_loader_is_cancelled(self):
+        async def query(session):
+            await asyncio.sleep(0.01)
+            return [session]
+
+        index = VersionedIndex(query, list)
+        sessions = [AsyncMock() for _ in range(2)]
+
+        async def burst():
+            first = asyncio.ensure_future(index.get(sessions[0], 1))
+            second = asyncio.ensure_future(index.get(sessions[1], 1))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        assert asyncio.run(burst()) == [sessions[1]]
+
+
+def mock_nearby_queries(mock_session, warehouses):
+    """nearby_warehouses runs: the grid's projection, then the matched rows.
+
+    The grid's dataset_version is the stamp conditional_get read, not a query.
+    """
+    mock_points = MagicMock()
+    mock_points.all.return_value = [(w.id, w.latitude, w.longitude) for w in warehouses]
+    mock_rows = mock_core_result([warehouse_row(w) for w in warehouses])
+    mock_session.execute = AsyncMock(side_effect=[mock_points, mock_rows])
+
+
+class TestNearbyEndpoint:
+    def test_returns_matches_closest_first(self, client, mock_session):
+        far = make_warehouse(latitude=48.95, longitude=2.35)
+        close = make_warehouse(latitude=48.86, longitude=2.35)
+        outside = make_warehouse(latitude=45.0, longitude=2.35)
+        mock_nearby_queries(mock_session, [far, close, outside])
+
+        data = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522&radius_km=20").json()
+
+        assert [item["id"] for item in data["items"]] == [str(close.id), str(far.id)]
+        assert data["total"] == 2
+        assert data["items"][0]["distance_km"] == round(
+            haversine(48.8566, 2.3522, 48.86, 2.35), 2
+        )
+
+    def test_grid_is_reused_while_the_version_holds(self, client, mock_session):
+        warehouse = make_warehouse()
+        mock_nearby_queries(mock_session, [warehouse])
+        client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522")
+
+        mock_rows = mock_core_result([warehouse_row(warehouse)])
+        mock_session.execute = AsyncMock(side_effect=[mock_rows])
+
+        data = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522").json()
+
+        assert data["total"] == 1
+        assert mock_session.execute.await_count == 1
+
+    def test_grid_is_rebuilt_for_a_new_version(self, client, mock_session):
+        old, new = make_warehouse(latitude=48.86), make_warehouse(latitude=48.87)
+        mock_nearby_queries(mock_session, [old])
+        client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522")
+
+        mock_nearby_queries(mock_session, [new])
+        app.dependency_overrides[get_dataset_stamp] = lambda: DatasetStamp(
+            2, DATASET_STAMP.updated_at
+        )
+        data = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522").json()
+
+        assert [item["id"] for item in data["items"]] == [str(new.id)]
+
+    def test_no_match_skips_the_row_query(self, client, mock_session):
+        mock_nearby_queries(mock_session, [make_warehouse(latitude=45.0)])
+
+        data = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522").json()
+
+        assert data == {
+            "items": [], "total": 0, "center_lat": 48.8566, "center_lng": 2.3522,
+            "radius_km": 50.0, "next_cursor": None,
+        }
+        assert mock_session.execute.await_count == 1
+
+    def test_k_returns_the_rows_postgres_ordered(self, client, mock_session):
+        close = make_warehouse(latitude=48.86, longitude=2.35)
+        far = make_warehouse(latitude=48.95, longitude=2.35)
+        mock_result = mock_core_result([
+            warehouse_row(close, distance_km=0.45), warehouse_row(far, distance_km=10.5)
+        ])
+        mock_session.execute = AsyncMock(return_value=mock_result)
+
+        data = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522&k=2").json()
+
+        assert [(item["id"], item["distance_km"]) for item in data["items"]] == [
+            (str(close.id), 0.45), (str(far.id), 10.5)
+        ]
+        assert data["next_cursor"] is None
+        assert mock_session.execute.await_count == 1
+
+    def test_k_cannot_be_combined_with_pages(self, client):
+        response = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522&k=5&limit=5")
+
+        assert response.status_code == 400
+
+    def test_invalid_cursor_is_rejected(self, client):
+        response = client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522&cursor=nope")
+
+        assert response.status_code == 400
+
+    def test_distance_cursor_round_trips_every_digit(self):
+        warehouse_id = uuid4()
+
+        assert decode_distance_cursor(encode_distance_cursor(0.1 + 0.2, warehouse_id)) == (
+            0.1 + 0.2, warehouse_id
+        )
+
+
+@pytest.fixture
+def scattered(pg_client):
+    """500 random warehouses within ~60 km of Paris."""
+    rng = random.Random(0)
+
+    async def setup():
+        async with pg_client.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await ensure_partitions(conn, [2024])
+            await conn.execute(
+                text(
+                    "INSERT INTO warehouses (id, dvf_mutation_id, transaction_date, latitude, "
+                    "longitude) VALUES (:id, :mutation, '2024-05-01', :latitude, :longitude)"
+                ),
+                [
+                    dict(id=uuid4(), mutation=f"m-{i}", latitude=rng.uniform(48.3, 49.4),
+                         longitude=rng.uniform(1.6, 3.1))
+                    for i in range(500)
+                ],
+            )
+            await conn.execute(text("ANALYZE warehouses"))
+
+    asyncio.run(setup())
+
+
+def nearby_url(**params) -> str:
+    query = "&".join(f"{name}={value}" for name, value in params.items())
+    return f"/api/warehouses/nearby?lat=48.8566&lng=2.3522&radius_km=30&{query}"
+
+
+@requires_postgres
+class TestNearbyInSql:
+    """k and limit/cursor order by distance in PostgreSQL, matching the grid mode."""
+
+    def test_sql_distance_equals_haversine(self, pg_client):
+        rng = random.Random(1)
+        pairs = [(rng.uniform(41, 51), rng.uniform(-5, 9)) for _ in range(200)]
+
+        async def distances():
+            async with pg_client.engine.connect() as conn:
+                return [
+                    (await conn.execute(select(haversine_sql(
+                        48.8566, 2.3522, literal(lat, Float), literal(lng, Float)
+                    )))).scalar()
+                    for lat, lng in pairs
+                ]
+
+        assert asyncio.run(distances()) == [haversine(48.8566, 2.3522, *pair) for pair in pairs]
+
+    def test_k_returns_the_closest_matches(self, scattered, pg_client):
+        everything = pg_client.get(nearby_url()).json()["items"]
+
+        closest = pg_client.get(nearby_url(k=10)).json()
+
+        assert closest["total"] == 10
+        assert closest["items"] == everything[:10]
+
+    def test_pages_walk_every_match_once_in_order(self, scattered, pg_client):
+        everything = pg_client.get(nearby_url()).json()["items"]
+
+        items, page = [], pg_client.get(nearby_url(limit=25)).json()
+        while True:
+            items.extend(page["items"])
+            if page["next_cursor"] is None:
+                break
+            page = pg_client.get(nearby_url(limit=25, cursor=page["next_cursor"])).json()
+
+        assert len(everything) > 25
+        assert [item["id"] for item in items] == [item["id"] for item in everything]
+        assert items == everything
+
+
+@requires_postgres
+class TestNearbyRebuild:
+    def test_ingest_rebuilds_the_grid(self, pg_client):
+        async def setup():
+            async with pg_client.engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await ensure_partitions(conn, [2024])
+
+        async def ingest(latitude):
+            async with pg_client.engine.begin() as conn:
+                await conn.execute(text(
+                    "INSERT INTO warehouses (id, dvf_mutation_id, department, transaction_date, "
+                    "latitude, longitude) VALUES "
+                    "(gen_random_uuid(), :mutation, '75', '2024-05-01', :latitude, 2.35)"
+                ), {"mutation": f"m-{latitude}", "latitude": latitude})
+                await refresh_summaries(conn, ["75"])
+
+        def nearby():
+            return pg_client.get("/api/warehouses/nearby?lat=48.8566&lng=2.3522&radius_km=10").json()
+
+        asyncio.run(setup())
+        asyncio.run(ingest(48.86))
+        assert nearby()["total"] == 1
+
+        asyncio.run(ingest(48.87))
+        assert nearby()["total"] == 2
@@ -0,0 +1,220 @@
+"""PostgreSQL tests for the summary tables and the analytics endpoints reading them.
+
+Run with TEST_DATABASE_URL set; skipped otherwise.
+"""
+
+import asyncio
+from collections import defaultdict
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from scripts import ingest_dvf
+from scripts.ingest_dvf import parse_row
+from scripts.summaries import SUMMARIES, refresh_summaries
+from tests.conftest import ingest, requires_postgres
+from tests.test_ingest import make_dvf_row
+
+pytestmark = requires_postgres
+
+
+def sample_rows(correct_91: bool = False) -> list[dict]:
+    """Two departments, several communes and months, and rows missing a surface.
+
+    With `correct_91`, prices in department 91 are doubled, as if DVF
+    republished them.
+    """
+    rows = []
+    for i in range(24):
+        department = "77" if i % 3 else "91"
+        price = 100_000 + 37_000 * i
+        if correct_91 and department == "91":
+            price *= 2
+        rows.append(make_dvf_row(
+            id_mutation=f"m-{i}",
+            code_departement=department,
+            nom_commune=("Melun", "Meaux", "Évry")[i % 3],
+            date_mutation=f"2024-{i % 5 + 1:02d}-{i % 27 + 1:02d}",
+            valeur_fonciere=str(price),
+            surface_reelle_bati="" if i % 7 == 0 else str(800 + 90 * i),
+        ))
+    return [parse_row(row) for row in rows]
+
+
+def expected_by_department(warehouses: list[dict]) -> list[dict]:
+    """What /by-department returned when it aggregated warehouses in Python."""
+    groups = defaultdict(lambda: {"prices": [], "surfaces": [], "count": 0})
+    for wh in warehouses:
+        g = groups[wh["department"]]
+        g["count"] += 1
+        if wh["price_eur"]:
+            g["prices"].append(wh["price_eur"])
+        if wh["surface_m2"]:
+            g["surfaces"].append(wh["surface_m2"])
+    result = []
+    for dept, g in sorted(groups.items()):
+        avg_price = sum(g["prices"]) / len(g["prices"])
+        avg_surface = sum(g["surfaces"]) / len(g["surfaces"])
+        result.append({
+            "department": dept,
+            "avg_price": round(avg_price, 2),
+            "avg_surface": round(avg_surface, 2),
+            "avg_price_per_m2": round(avg_price / avg_surface, 2),
+            "count": g["count"],
+        })
+    return result
+
+
+def price_per_m2_groups(warehouses: list[dict], key) -> dict:
+    groups = defaultdict(list)
+    for wh in warehouses:
+        if wh["price_eur"] and wh["surface_m2"] and wh["surface_m2"] > 0:
+            groups[key(wh)].append(wh["price_eur"] / wh["surface_m2"])
+    return groups
+
+
+def summary_rows(engine) -> dict[str, list[tuple]]:
+    """Every summary table's rows, floats rounded as summation order varies."""
+    def rounded(row) -> tuple:
+        return tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+
+    async def run():
+        async with engine.connect() as conn:
+            return {
+                table: sorted(rounded(row) for row in await conn.execute(text(f"SELECT * FROM {table}")))
+                for table, _, _ in SUMMARIES
+            }
+
+    return asyncio.run(run())
+
+
+class TestSummaryTables:
+    """The analytics endpoints answer from the summaries like they did from warehouses."""
+
+    def test_by_department_matches_python_aggregation(self, writer_class, pg_client):
+        warehouses = sample_rows()
+        ingest(writer_class, warehouses)
+
+        response = pg_client.get("/api/analytics/by-department")
+
+        assert response.json()["departments"] == pytest.approx(expected_by_department(warehouses))
+
+    def test_department_stats_and_top_communes(self, writer_class, pg_client):
+        warehouses = sample_rows()
+        ingest(writer_class, warehouses)
+        by_department = price_per_m2_groups(warehouses, lambda wh: wh["department"])
+        by_commune = price_per_m2_groups(warehouses, lambda wh: (wh["commune"], wh["department"]))
+
+        items = pg_client.get("/api/analytics/department-stats").json()["items"]
+        communes = pg_client.get("/api/analytics/top-communes").json()
+
+        assert items == [
+            {"department": dept, "avg_price_per_m2": round(sum(v) / len(v), 2), "total_count": len(v)}
+            for dept, v in sorted(by_department.items())
+        ]
+        ranked = sorted(by_commune, key=lambda k: sum(by_commune[k]) / len(by_commune[k]))
+        assert [(c["commune"], c["department"]) for c in communes["cheapest"]] == ranked
+        assert [(c["commune"], c["department"]) for c in communes["most_expensive"]] == ranked[::-1]
+
+    def test_price_trends_by_month(self, writer_class, pg_client):
+        warehouses = sample_rows()
+        ingest(writer_class, warehouses)
+
+        trends = pg_client.get(
+            "/api/analytics/price-trends", params={"date_from": "2024-02-15", "date_to": "2024-04-30"}
+        ).json()["trends"]
+
+        assert [t["period"] for t in trends] == ["2024-02", "2024-03", "2024-04"]
+        march = [wh for wh in warehouses if wh["transaction_date"].month == 3]
+        assert trends[1]["count"] == len(march)
+        assert trends[1]["avg_price"] == pytest.approx(
+            round(sum(wh["price_eur"] for wh in march) / len(march), 2)
+        )
+
+    def test_rows_without_department_count_outside_department_summaries(
+        self, writer_class, pg_client
+    ):
+        def orly(price: int) -> list[dict]:
+            return [parse_row(make_dvf_row(
+                id_mutation=f"orly-{i}",
+                code_departement="",
+                nom_commune="Orly",
+                date_mutation="2024-03-10",
+                valeur_fonciere=str(price),
+            )) for i in range(2)]
+
+        ingest(writer_class, sample_rows() + orly(1_000_000))
+        # Corrections of rows without a department refresh their summaries too
+        warehouses = sample_rows() + orly(9_000_000)
+        ingest(writer_class, warehouses)
+
+        departments = pg_client.get("/api/analytics/by-department").json()["departments"]
+        trends = pg_client.get("/api/analytics/price-trends").json()["trends"]
+        communes = pg_client.get("/api/analytics/top-communes").json()
+
+        assert [d["department"] for d in departments] == ["77", "91"]
+        march = [wh for wh in warehouses if wh["transaction_date"].month == 3]
+        assert trends[2]["count"] == len(march)
+        assert trends[2]["avg_price"] == pytest.approx(
+            round(sum(wh["price_eur"] for wh in march) / len(march), 2)
+        )
+        assert communes["most_expensive"][0] == {
+            "commune": "Orly", "department": "", "avg_price_per_m2": 600.0, "count": 2,
+        }
+
+    def test_corrections_refresh_only_changed_departments(self, writer_class, pg_client):
+        ingest(writer_class, sample_rows())
+        before = summary_rows(pg_client.engine)
+
+        corrected = sample_rows(correct_91=True)
+        ingest(writer_class, corrected)
+
+        after = summary_rows(pg_client.engine)
+        response = pg_client.get("/api/analytics/by-department")
+        assert response.json()["departments"] == pytest.approx(expected_by_department(corrected))
+        for table, rows in after.items():
+            assert [r for r in rows if r[0] == "77"] == [r for r in before[table] if r[0] == "77"]
+            assert [r for r in rows if r[0] == "91"] != [r for r in before[table] if r[0] == "91"]
+
+    def test_unchanged_rerun_skips_the_refresh(self, writer_class, pg_client):
+        warehouses = sample_rows()
+        ingest(writer_class, warehouses)
+
+        writer = ingest(writer_class, warehouses)
+
+        assert writer.rows_unchanged == len(warehouses)
+        assert writer.round_trips == (2 if writer_class is ingest_dvf.WarehouseWriter else 5)
+
+    def test_full_rebuild_matches_incremental_refreshes(self, writer_class, pg_client):
+        ingest(writer_class, sample_rows())
+        incremental = summary_rows(pg_client.engine)
+
+        async def rebuild():
+            async with pg_client.engine.begin() as conn:
+                for table, _, _ in SUMMARIES:
+                    await conn.execute(text(f"DELETE FROM {table}"))
+                await refresh_summaries(conn)
+
+        asyncio.run(rebuild())
+
+        assert summary_rows(pg_client.engine) == incremental
+
+    def test_failed_batch_still_refreshes_the_committed_ones(
+        self, monkeypatch, pg_engine_factory, pg_client
+    ):
+        monkeypatch.setattr(ingest_dvf, "create_async_engine", lambda url: pg_engine_factory())
+        warehouses = sample_rows()[1:3]
+        broken = {**sample_rows()[4], "surface_m2": "not a number"}
+
+        async def run():
+            writer = ingest_dvf.WarehouseWriter("postgresql+asyncpg://unused", batch_size=2)
+            async with writer:
+                with pytest.raises(DBAPIError):
+                    await writer.write([*warehouses, broken])
+
+        asyncio.run(run())
+
+        response = pg_client.get("/api/analytics/by-department")
+        assert response.headers["etag"] == 'W/"1"'
+        assert response.json()["departments"] == pytest.approx(expected_by_department(warehouses))
@@ -0,0 +1,182 @@
+"""Tests for ingestion telemetry and the JSON run report."""
+
+import asyncio
+import io
+import json
+
+from scripts import ingest_dvf
+from scripts.summaries import refresh_statements
+from scripts.telemetry import ByteCounter, DepartmentStats, RunReport
+from tests.test_ingest import (
+    FakeWriter,
+    make_dvf_gzip,
+    make_dvf_row,
+    make_dvf_sample,
+    make_fake_engine,
+)
+
+
+class TestDepartmentStats:
+    """Tests for per-department stage timing and counters."""
+
+    def test_stage_accumulates_time_across_blocks(self):
+        """Verify re-entering a stage adds to its time rather than replacing it."""
+        stats = DepartmentStats("77", 2024)
+
+        with stats.stage("insert"):
+            pass
+        first = stats.stages["insert"]
+        with stats.stage("insert"):
+            pass
+
+        assert stats.stages["insert"] >= first
+        assert list(stats.stages) == ["insert"]
+
+    def test_stage_is_recorded_when_it_raises(self):
+        """Verify a failing stage still reports the time it took."""
+        stats = DepartmentStats("77", 2024)
+
+        try:
+            with stats.stage("download"):
+                raise OSError("unreachable")
+        except OSError:
+            pass
+
+        assert "download" in stats.stages
+
+    def test_stats_line_is_logfmt(self):
+        """Verify the stats line carries outcome, stage times and counters."""
+        stats = DepartmentStats("2A", 2023)
+        with stats.stage("scan"):
+            pass
+        stats.rows_scanned = 120
+        stats.finish("ok")
+
+        line = stats.stats_line()
+
+        assert line.startswith("stats department=2A year=2023 status=ok wall_s=")
+        assert "scan_s=" in line
+        assert "rows_scanned=120" in line
+        assert "peak_rss_mb" not in line  # not measured, so omitted
+
+    def test_byte_counter_counts_reads(self):
+        """Verify bytes read through the wrapper are counted."""
+        with ByteCounter(io.BytesIO(b"x" * 100)) as stream:
+            stream.read(60)
+            stream.read()
+
+        assert stream.bytes == 100
+
+
+class TestRunReport:
+    """Tests for the run-level JSON report."""
+
+    def test_report_totals_sum_departments(self, tmp_path):
+        """Verify totals add up counters and stage times, and the file is JSON."""
+        report = RunReport(options={"workers": 2})
+        for dept, status in (("01", "ok"), ("02", "ok"), ("03", "failed")):
+            stats = report.department(dept, 2024)
+            stats.rows_scanned = 10
+            stats.rows_without_date = 1
+            stats.db_round_trips = 2
+            stats.peak_rss_mb = 50.0 if dept == "02" else 40.0
+            with stats.stage("download"):
+                pass
+            report.finish(stats, status, "boom" if status == "failed" else None)
+
+        report.save(tmp_path / "run.json")
+        data = json.loads((tmp_path / "run.json").read_text())
+
+        totals = data["totals"]
+        assert (totals["departments"], totals["ok"], totals["failed"]) == (3, 2, 1)
+        assert totals["rows_scanned"] == 30
+        assert totals["rows_without_date"] == 3
+        assert data["departments"][0]["rows_without_date"] == 1
+        assert totals["db_round_trips"] == 6
+        assert totals["peak_rss_mb"] == 50.0
+        assert "download" in totals["stages"]
+        assert data["options"] == {"workers": 2}
+        assert data["departments"][2]["error"] == "boom"
+
+    def test_echo_prints_stats_line_on_finish(self, capsys):
+        """Verify --stats prints one line per finished department."""
+        report = RunReport(echo=True)
+        report.finish(report.department("77", 2024), "skipped")
+
+        assert capsys.readouterr().out.startswith("stats department=77 year=2024 status=skipped")
+
+
+class TestIngestTelemetry:
+    """Tests for the telemetry recorded by each ingestion mode."""
+
+    def test_buffered_department_times_every_stage(self, tmp_path):
+        """Verify buffered mode reports download, decompress, parse, filter and insert."""
+        (tmp_path / "77.csv.gz").write_bytes(make_dvf_gzip(make_dvf_sample()))
+        stats = DepartmentStats("77", 2024)
+
+        count = ingest_dvf.process_department(
+            "77",
+            url_template=f"{tmp_path.as_uri()}/{{dept}}.csv.gz",
+            insert=len,
+            stats=stats,
+        )
+
+        assert count == 10
+        assert list(stats.stages) == ["download", "decompress", "parse", "filter", "insert"]
+        assert stats.bytes_downloaded == (tmp_path / "77.csv.gz").stat().st_size
+        assert (stats.rows_scanned, stats.rows_kept) == (200, 10)
+        assert stats.peak_rss_mb > 0
+
+    def test_streaming_department_counts_compressed_bytes(self, monkeypatch):
+        """Verify stream mode reports one scan stage and the bytes it read."""
+        payload = make_dvf_gzip(make_dvf_sample())
+        monkeypatch.setattr(
+            ingest_dvf, "open_dvf_stream", lambda dept, url_template, year: io.BytesIO(payload)
+        )
+        stats = DepartmentStats("77", 2024)
+
+        ingest_dvf.process_department("77", stream=True, insert=len, stats=stats)
+
+        assert list(stats.stages) == ["scan", "insert"]
+        assert stats.bytes_downloaded == len(payload)
+        assert (stats.rows_scanned, stats.rows_kept) == (200, 10)
+
+    def test_parallel_ingest_reports_each_department(self, tmp_path):
+        """Verify --workers runs record stats, worker peak RSS and failures."""
+        rows = [make_dvf_row(id_mutation=f"01-{i}", code_departement="01") for i in range(3)]
+        (tmp_path / "01.csv.gz").write_bytes(make_dvf_gzip(rows))
+        report = RunReport()
+
+        asyncio.run(ingest_dvf.ingest_parallel(
+            ["01", "02"],
+            FakeWriter(),
+            workers=2,
+            url_template=f"{tmp_path.as_uri()}/{{dept}}.csv.gz",
+            report=report,
+        ))
+
+        ok, failed = report.departments
+        assert (ok.department, ok.status, failed.department, failed.status) == (
+            "01", "ok", "02", "failed"
+        )
+        assert list(ok.stages) == ["download", "scan", "insert"]
+        assert (ok.rows_scanned, ok.rows_kept) == (3, 3)
+        assert ok.peak_rss_mb > 0
+        assert failed.error
+
+    def test_writer_counts_round_trips_per_department(self, monkeypatch):
+        """Verify each batch's DELETE and INSERT, and each summary refresh, are round trips."""
+        make_fake_engine(monkeypatch)
+        warehouses = [ingest_dvf.parse_row(make_dvf_row(id_mutation=str(i))) for i in range(25)]
+        stats = DepartmentStats("77", 2024)
+
+        async def run():
+            async with ingest_dvf.WarehouseWriter("postgresql+asyncpg://x", batch_size=10) as writer:
+                await writer.write(warehouses, stats)
+            return writer
+
+        writer = asyncio.run(run())
+
+        summary_statements = 1 + len(refresh_statements())
+        assert stats.db_round_trips == writer.round_trips == 2 * 3 + summary_statements
+        assert stats.rows_inserted == 25
@@ -0,0 +1,147 @@
+"""Tests for the columnar warehouse cache and loading the database from it."""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from scripts import ingest_dvf
+from scripts.ingest_dvf import parse_row
+from scripts.telemetry import DepartmentStats, RunReport
+from scripts.warehouse_cache import (
+    COLUMNS,
+    WarehouseCache,
+    read_header,
+    read_warehouses,
+    write_warehouses,
+)
+from tests.test_ingest import FakeWriter, make_dvf_gzip, make_dvf_row, make_dvf_sample
+
+
+def sample_warehouses() -> list[dict]:
+    warehouses = [parse_row(make_dvf_row(id_mutation=f"2024-{i}")) for i in range(5)]
+    warehouses[1]["address"] = None
+    warehouses[2]["price_eur"] = None
+    warehouses[3]["transaction_date"] = None
+    warehouses[4]["commune"] = "Évry-Courcouronnes"
+    return warehouses
+
+
+class TestColumnarFormat:
+    """Tests for the on-disk encoding."""
+
+    def test_round_trip_preserves_types_and_nulls(self, tmp_path):
+        """Verify every column comes back with its type, including None and non-ASCII."""
+        warehouses = sample_warehouses()
+
+        write_warehouses(tmp_path / "77.dvfw", warehouses)
+        loaded = read_warehouses(tmp_path / "77.dvfw")
+
+        assert loaded == warehouses
+        assert isinstance(loaded[0]["transaction_date"], date)
+        assert isinstance(loaded[0]["surface_m2"], float)
+
+    def test_columns_follow_the_model(self):
+        """Verify every model column but the id is cached, with a typed encoding."""
+        assert dict(COLUMNS)["surface_m2"] == "f64"
+        assert dict(COLUMNS)["transaction_date"] == "date"
+        assert dict(COLUMNS)["content_hash"] == "str"
+        assert "id" not in dict(COLUMNS)
+
+    def test_header_describes_the_file(self, tmp_path):
+        """Verify the header records row count, metadata and column layout."""
+        write_warehouses(tmp_path / "77.dvfw", sample_warehouses(), department="77", year=2024)
+
+        header = read_header(tmp_path / "77.dvfw")
+
+        assert (header["rows"], header["department"], header["year"]) == (5, "77", 2024)
+        assert [c["name"] for c in header["columns"]] == [name for name, _ in COLUMNS]
+
+    def test_empty_department_round_trips(self, tmp_path):
+        """Verify a department without warehouses is cached as an empty file."""
+        write_warehouses(tmp_path / "48.dvfw", [])
+
+        assert read_warehouses(tmp_path / "48.dvfw") == []
+
+    def test_rejects_foreign_files(self, tmp_path):
+        """Verify a file that is not a cache file is refused."""
+        (tmp_path / "77.dvfw").write_bytes(b"not a cache file")
+
+        with pytest.raises(ValueError):
+            read_warehouses(tmp_path / "77.dvfw")
+
+    def test_cache_lists_departments_per_year(self, tmp_path):
+        """Verify files are laid out per year and listed sorted."""
+        cache = WarehouseCache(tmp_path)
+        for dept in ("78", "2A", "01"):
+            cache.save(dept, 2024, [])
+        cache.save("75", 2023, [])
+
+        assert cache.departments(2024) == ["01", "2A", "78"]
+        assert cache.departments(2022) == []
+
+
+class TestWarehouseCacheIngest:
+    """Tests for populating the cache during ingestion and loading from it."""
+
+    def test_process_department_saves_filtered_rows(self, tmp_path):
+        """Verify the rows that are inserted are also cached, and timed."""
+        (tmp_path / "77.csv.gz").write_bytes(make_dvf_gzip(make_dvf_sample()))
+        cache = WarehouseCache(tmp_path / "cache")
+        inserted: list[dict] = []
+        stats = DepartmentStats("77", 2024)
+
+        ingest_dvf.process_department(
+            "77",
+            url_template=f"{tmp_path.as_uri()}/{{dept}}.csv.gz",
+            insert=lambda whs: inserted.extend(whs) or len(whs),
+            stats=stats,
+            warehouse_cache=cache,
+        )
+
+        assert cache.load("77", 2024) == inserted
+        assert len(inserted) == 10
+        assert "cache" in stats.stages
+
+    def test_limited_runs_are_not_cached(self, tmp_path):
+        """Verify --limit output, which is incomplete, never reaches the cache."""
+        (tmp_path / "77.csv.gz").write_bytes(make_dvf_gzip(make_dvf_sample()))
+        cache = WarehouseCache(tmp_path / "cache")
+
+        ingest_dvf.process_department(
+            "77",
+            limit=2,
+            url_template=f"{tmp_path.as_uri()}/{{dept}}.csv.gz",
+            insert=len,
+            warehouse_cache=cache,
+        )
+
+        assert cache.departments(2024) == []
+
+    def test_ingest_warehouse_cache_loads_every_cached_department(self, tmp_path):
+        """Verify a cache-only load writes each department without downloading."""
+        cache = WarehouseCache(tmp_path)
+        cache.save("01", 2024, sample_warehouses()[:2])
+        cache.save("02", 2024, sample_warehouses()[2:])
+        writer = FakeWriter()
+        report = RunReport()
+
+        total, succeeded, failed = asyncio.run(
+            ingest_dvf.ingest_warehouse_cache(cache, writer, workers=2, report=report)
+        )
+
+        assert (total, succeeded, failed) == (5, ["01", "02"], [])
+        assert writer.rows == sample_warehouses()
+        assert [list(s.stages) for s in report.departments] == [["load", "insert"]] * 2
+
+    def test_ingest_warehouse_cache_reports_missing_departments(self, tmp_path):
+        """Verify asking for an uncached department fails only that department."""
+        cache = WarehouseCache(tmp_path)
+        cache.save("01", 2024, sample_warehouses())
+
+        total, succeeded, failed = asyncio.run(
+            ingest_dvf.ingest_warehouse_cache(cache, FakeWriter(), departments=["01", "99"])
+        )
+
+        assert (total, succeeded) == (5, ["01"])
+        assert failed == [("99", "not in the warehouse cache")]